@@ -13,6 +13,15 @@ const PRIVATE = {
   pull: process.env.BUNNY_PRIVATE_PULL_ZONE || 'https://vz-c69f4e3f-963.b-cdn.net'
 };
 
+// Catalogue précalculé par le pipeline (pipeline_v2/catalog_publish.py), déposé sur Bunny Storage.
+// Sans CATALOG_URL (ou si le fichier est injoignable au premier appel) : listing Bunny Stream comme avant.
+const CATALOG_URL = process.env.CATALOG_URL ||
+  (process.env.BUNNY_STORAGE_PULL_ZONE ? `${process.env.BUNNY_STORAGE_PULL_ZONE}/catalog/catalog.json` : null);
+const CATALOG_TTL_MS = 60 * 1000; // Relecture du catalogue au plus 1x/min par instance
+
+let catalogCache = null; // { fetchedAt, version, videos }
+let signedCache = null;  // { key, videos } : miniatures privées signées une fois par version et par jour
+
 // Fonction helper pour récupérer une librairie
 async function fetchLibrary(config, isPrivate = false) {
   try {
@@ -38,10 +47,10 @@ async function fetchLibrary(config, isPrivate = false) {
 }
 
 // Helper de signature (dupliqué de get-secure-url pour éviter les dépendances croisées)
-function signUrl(url, securityKey, expirationSeconds = 3600) {
+function signUrl(url, securityKey, expirationSeconds = 3600, expiresAt = null) {
     if (!securityKey) return url;
     try {
-        const expires = Math.floor(Date.now() / 1000) + expirationSeconds;
+        const expires = expiresAt || Math.floor(Date.now() / 1000) + expirationSeconds;
         const urlObj = new URL(url);
         const path = urlObj.pathname;
         
@@ -56,11 +65,53 @@ function signUrl(url, securityKey, expirationSeconds = 3600) {
     }
 }
 
-export default async function handler(req, res) {
-  res.setHeader('Access-Control-Allow-Credentials', true);
-  res.setHeader('Access-Control-Allow-Origin', '*');
+function privateSigningKey() {
+  // Use Token Key if available, else Access Key (old logic fallback)
+  const signingKey = process.env.BUNNY_TOKEN_KEY || process.env.BUNNY_PRIVATE_ACCESS_KEY;
+  // Clean key of spaces
+  return signingKey ? signingKey.trim() : null;
+}
 
+// Dernière version du catalogue publié (cache mémoire de l'instance ; dernière version connue si erreur)
+async function loadCatalog() {
+  if (!CATALOG_URL) return null;
+  if (catalogCache && Date.now() - catalogCache.fetchedAt < CATALOG_TTL_MS) return catalogCache;
   try {
+    const response = await fetch(CATALOG_URL, { cache: 'no-store' });
+    if (!response.ok) {
+      console.error(`Erreur fetch catalogue: ${response.status}`);
+      return catalogCache;
+    }
+    const data = await response.json();
+    if (!data.version || !Array.isArray(data.videos)) return catalogCache;
+    catalogCache = { fetchedAt: Date.now(), version: data.version, videos: data.videos };
+  } catch (e) {
+    console.error('Exception fetch catalogue:', e);
+  }
+  return catalogCache;
+}
+
+// Miniatures privées signées jusqu'à la fin du lendemain : même réponse (et même ETag) toute la journée
+function signedVideos(catalog, day) {
+  const key = `${catalog.version}-${day}`;
+  if (signedCache && signedCache.key === key) return signedCache;
+
+  const expiresAt = (day + 2) * 86400;
+  const cleanKey = privateSigningKey();
+  const videos = catalog.videos.map(v => {
+    if (!v.locked) return v;
+    const thumbnails = {};
+    Object.entries(v.thumbnails || {}).forEach(([format, url]) => {
+      thumbnails[format] = signUrl(url, cleanKey, 0, expiresAt);
+    });
+    return { ...v, thumbnails };
+  });
+  signedCache = { key, videos };
+  return signedCache;
+}
+
+// Ancien chemin : listing des deux librairies Bunny Stream à chaque appel
+async function listFromBunny() {
     // 1. Fetch Parallèle
     const [publicItems, privateItems] = await Promise.all([
       fetchLibrary(PUBLIC, false),
@@ -102,12 +153,8 @@ export default async function handler(req, res) {
       
       // SIGN THUMBNAILS FOR PRIVATE VIDEOS
       if (v._isPrivate) {
-          // Use Token Key if available, else Access Key (old logic fallback)
-          const signingKey = process.env.BUNNY_TOKEN_KEY || process.env.BUNNY_PRIVATE_ACCESS_KEY;
-          // Clean key of spaces
-          const cleanKey = signingKey ? signingKey.trim() : null;
           // Sign for 24h validity (thumbnails shouldn't expire too fast for caching)
-          thumbUrl = signUrl(thumbUrl, cleanKey, 86400);
+          thumbUrl = signUrl(thumbUrl, privateSigningKey(), 86400);
       }
 
       projects[id].thumbnails[format] = thumbUrl;
@@ -121,11 +168,35 @@ export default async function handler(req, res) {
       }
     });
 
-    const videosList = Object.values(projects).sort((a, b) => 
+    return Object.values(projects).sort((a, b) => 
       new Date(b.updated_at) - new Date(a.updated_at)
     );
+}
+
+export default async function handler(req, res) {
+  res.setHeader('Access-Control-Allow-Credentials', true);
+  res.setHeader('Access-Control-Allow-Origin', '*');
+
+  try {
+    // 1. Catalogue publié par le pipeline : aucun appel à l'API Bunny
+    const catalog = await loadCatalog();
+    if (catalog) {
+      const day = Math.floor(Date.now() / 86400000);
+      const signed = signedVideos(catalog, day);
+      const etag = `"${signed.key}"`;
+      res.setHeader('ETag', etag);
+      res.setHeader('Cache-Control', 'public, max-age=0, s-maxage=60, stale-while-revalidate=300');
+      res.setHeader('X-Catalog-Version', catalog.version);
+      if (req.headers['if-none-match'] === etag) {
+        res.status(304).end();
+        return;
+      }
+      res.status(200).json(signed.videos);
+      return;
+    }
 
-    res.status(200).json(videosList);
+    // 2. Fallback : listing Bunny Stream
+    res.status(200).json(await listFromBunny());
   } catch (error) {
     console.error('Erreur:', error);
     res.status(500).json({ error: error.message });
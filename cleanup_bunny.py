@@ -3,61 +3,51 @@
 Script de nettoyage pour Bunny Stream.
 Permet de lister, supprimer les doublons ou tout supprimer.
 """
-import os
+import sys
 import requests
 import argparse
-from dotenv import load_dotenv
+from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-load_dotenv()
+# Client Bunny partagé (identifiants dans pipeline_v2/config.py / .env)
+sys.path.insert(0, str(Path(__file__).parent / "pipeline_v2"))
+import bunny_client
+from bunny_client import BunnyClient
+from bunny_index import get_index
 
-LIBRARY_ID = os.getenv("BUNNY_LIBRARY_ID")
-ACCESS_KEY = os.getenv("BUNNY_ACCESS_KEY")
+CLIENT = BunnyClient.for_library(is_private=False)
 
-if not LIBRARY_ID or not ACCESS_KEY:
-    print("❌ Erreur: Identifiants Bunny manquants dans .env")
-    exit(1)
-
-BASE_URL = f"https://video.bunnycdn.com/library/{LIBRARY_ID}/videos"
-HEADERS = {
-    "AccessKey": ACCESS_KEY,
-    "accept": "application/json"
-}
-
-def get_all_videos():
-    print("🔍 Récupération de la liste des vidéos...")
-    videos = []
-    page = 1
-    while True:
-        url = f"{BASE_URL}?page={page}&itemsPerPage=100&orderBy=date"
-        resp = requests.get(url, headers=HEADERS)
-        if not resp.ok:
-            print(f"❌ Erreur API: {resp.status_code} - {resp.text}")
-            break
-        
-        data = resp.json()
-        items = data.get("items", [])
-        if not items:
-            break
-            
-        videos.extend(items)
-        if len(items) < 100:
-            break
-        page += 1
+def get_all_videos(full_sync=False):
+    """Vidéos de la librairie via l'index local (synchro incrémentale, ou complète si demandé)."""
+    print("🔍 Synchronisation de l'index local...")
+    index = get_index(client=CLIENT)
+    try:
+        index.sync(full=full_sync)
+    except requests.RequestException as e:
+        print(f"❌ Erreur API: {e}")
+        return []
+    videos = index.all()
     
     print(f"✅ {len(videos)} vidéos trouvées.")
     return videos
 
 def delete_video(video_id, title):
-    url = f"{BASE_URL}/{video_id}"
-    resp = requests.delete(url, headers=HEADERS)
+    resp = CLIENT.delete_video(video_id)
     if resp.ok:
+        get_index(client=CLIENT).remove(video_id)
         print(f"🗑️  Supprimé: {title} ({video_id})")
         return True
     else:
         print(f"❌ Échec suppression {title}: {resp.text}")
         return False
 
+def delete_many(videos, workers=4):
+    """Suppressions en parallèle sur les connexions keep-alive du client partagé."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda v: delete_video(v['guid'], v['title']), videos))
+    bunny_client.log_metrics()
+
 def analyze_duplicates(videos):
     groups = defaultdict(list)
     for v in videos:
@@ -78,10 +68,16 @@ def main():
     parser.add_argument("--delete-all", action="store_true", help="Delete ALL videos")
     parser.add_argument("--delete-duplicates", action="store_true", help="Delete duplicate titles (keep newest)")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be done without doing it")
+    parser.add_argument("--private", action="store_true", help="Work on the private library")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel delete requests")
+    parser.add_argument("--full-sync", action="store_true", help="Re-download the whole library into the local index")
     
     args = parser.parse_args()
+
+    global CLIENT
+    CLIENT = BunnyClient.for_library(is_private=args.private)
     
-    videos = get_all_videos()
+    videos = get_all_videos(full_sync=args.full_sync)
     
     if not videos:
         print("Rien à nettoyer.")
@@ -95,21 +91,21 @@ def main():
                 print("Annulé.")
                 return
 
-        for v in videos:
-            if args.dry_run:
+        if args.dry_run:
+            for v in videos:
                 print(f"Would delete: {v['title']} ({v['guid']})")
-            else:
-                delete_video(v['guid'], v['title'])
+        else:
+            delete_many(videos, args.workers)
                 
     elif args.delete_duplicates:
         duplicates = analyze_duplicates(videos)
         print(f"⚠️  Trouvé {len(duplicates)} doublons à supprimer.")
         
-        for v in duplicates:
-            if args.dry_run:
+        if args.dry_run:
+            for v in duplicates:
                 print(f"Would delete (older duplicate): {v['title']} ({v['guid']}) - Date: {v['dateUploaded']}")
-            else:
-                delete_video(v['guid'], v['title'])
+        else:
+            delete_many(duplicates, args.workers)
     else:
         print("\n📊 Analyse de la bibliothèque:")
         groups = defaultdict(list)
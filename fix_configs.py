@@ -4,6 +4,7 @@ from pathlib import Path
 
 BASE = Path(__file__).parent
 PROD = BASE / "production"
+PROD_AREAS = [PROD / "public", PROD / "private"]
 DEFAULT_CFG = BASE / "config.default.json"
 
 def main():
@@ -15,7 +16,8 @@ def main():
 
     default_data = json.loads(DEFAULT_CFG.read_text())
     
-    for project_dir in PROD.iterdir():
+    project_dirs = [d for area in PROD_AREAS if area.exists() for d in area.iterdir()]
+    for project_dir in project_dirs:
         if not project_dir.is_dir() or project_dir.name.startswith("."):
             continue
             
@@ -40,26 +42,16 @@ def main():
         cfg_file.write_text(json.dumps(project_data, indent=2))
         print(f"✅ Config mise à jour pour : {project_dir.name}")
         
-        # 2. Reset Status (Pour forcer le re-upload)
-        # On supprime la section "bunny_urls" pour être sûr
+        # 2. Demande de relance
+        # On ne supprime plus rien du status : le pipeline compare les empreintes
+        # (entrées + config) de chaque étape et ne relance que celles qui ont changé
+        # (ex: nouvelle clé Bunny -> upload seulement, pas de Whisper ni d'encodage).
         if status_file.exists():
             try:
                 st = json.loads(status_file.read_text())
-                if "bunny_urls" in st:
-                    del st["bunny_urls"]
-                
-                # On force aussi le re-check des formats pour déclencher l'upload loop
-                # Si on laisse "done", le script process.py va skipper TOUT le bloc.
-                # Donc on va supprimer "formats" du status.
-                if "formats" in st:
-                    del st["formats"]
-                
-                # Force audio regen
-                if "audio" in st:
-                    del st["audio"]
-                    
+                st["needs_rerun"] = True
                 status_file.write_text(json.dumps(st, indent=2))
-                print(f"🔄 Status réinitialisé pour : {project_dir.name}")
+                print(f"🔄 Relance demandée pour : {project_dir.name}")
             except:
                 pass
 
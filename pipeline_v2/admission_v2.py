@@ -0,0 +1,204 @@
+"""
+Contrôle d'admission des étapes (scheduler et pipeline séquentiel).
+
+Whisper, libx264 et le débruitage se disputent les cœurs et la RAM : lancer plus
+de jobs en parallèle fait soit swapper la machine, soit la laisse à moitié vide.
+Avant de démarrer une étape, admit() vérifie :
+- la mémoire disponible (moins ce que les étapes admises depuis peu vont allouer),
+  avec une estimation par étape et par worker Whisper pour les sous-titres ;
+- la charge CPU (load average par cœur) pour les étapes ffmpeg ;
+- l'espace disque libre pour les fichiers intermédiaires et les masters encodés.
+
+L'étape attend tant qu'une ressource manque (au plus ADMISSION_MAX_WAIT), puis
+reçoit un budget de threads (job["threads"]) : les cœurs libres (hors Whisper)
+partagés entre les étapes ffmpeg en cours. Chaque décision est loggée et ajoutée
+à ADMISSION_LOG (JSONL) pour régler les limites sur des données réelles.
+
+Usage :
+    with admission_v2.admit(job, "encode") as granted:
+        if granted:
+            ...  # ffmpeg -filter_complex_threads N ... -threads N
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+import config
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_cond = threading.Condition()
+_running = {}  # étape -> nombre d'étapes admises en cours
+_recent = []   # [(t_admission, mb)] : mémoire pas encore visible dans MemAvailable
+_memory_warned = False
+
+# --- MESURES ---
+
+def _vm_stat_mb():
+    """macOS : pages libres + inactives + spéculatives (vm_stat), en Mo."""
+    try:
+        out = subprocess.run(["vm_stat"], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"page size of (\d+) bytes", out)
+    pages = dict(re.findall(r"^Pages (free|inactive|speculative):\s+(\d+)\.", out, re.M))
+    if not match or not pages:
+        return None
+    return sum(int(n) for n in pages.values()) * int(match.group(1)) // (1024 * 1024)
+
+def available_memory_mb():
+    """Mémoire disponible (Mo), ou None si inconnue (l'admission ne bloque alors pas sur la mémoire)."""
+    global _memory_warned
+    if psutil is not None:
+        return psutil.virtual_memory().available // (1024 * 1024)
+    if sys.platform == "darwin":
+        memory = _vm_stat_mb()
+    else:
+        memory = None
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        memory = int(line.split()[1]) // 1024
+                        break
+        except OSError:
+            pass
+    if memory is None and not _memory_warned:
+        logging.warning("   ⚠️ Available memory unknown (install psutil): memory admission disabled")
+        _memory_warned = True
+    return memory
+
+def cpu_load():
+    """Load average (1 min) par cœur, ou None."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        return None
+
+def free_disk_mb(path):
+    try:
+        return shutil.disk_usage(path).free // (1024 * 1024)
+    except OSError:
+        return None
+
+def stage_needs(job, stage):
+    """Estimation des ressources d'une étape : {"memory_mb", "disk_mb", "cpu"}."""
+    memory = config.ADMISSION_STAGE_MEMORY_MB.get(stage, 0)
+    if stage == "captions":
+        workers = config.TRANSCRIBE_WORKERS if config.TRANSCRIBE_MODE == "vad" else 1
+        memory += config.WHISPER_MEMORY_MB * max(1, workers)
+    try:
+        master_mb = job["video_path"].stat().st_size / (1024 * 1024)
+    except OSError:
+        master_mb = 0
+    return {
+        "memory_mb": int(memory),
+        "disk_mb": int(master_mb * config.ADMISSION_DISK_FACTOR.get(stage, 0)),
+        "cpu": stage in config.ADMISSION_CPU_STAGES,
+    }
+
+def thread_budget():
+    """Threads par process ffmpeg : cœurs (hors Whisper en cours) / étapes CPU admises."""
+    cores = os.cpu_count() or 1
+    if _running.get("captions"):
+        cores -= config.WHISPER_THREADS
+    busy = sum(_running.get(s, 0) for s in config.ADMISSION_CPU_STAGES)
+    return max(1, cores // max(1, busy))
+
+# --- DÉCISION ---
+
+def _reserved_mb():
+    cutoff = time.time() - config.ADMISSION_RAMP_SECONDS
+    _recent[:] = [(t, mb) for t, mb in _recent if t > cutoff]
+    return sum(mb for _, mb in _recent)
+
+def _blocker(job, needs):
+    """Raison pour laquelle l'étape ne peut pas encore démarrer, ou None (avec _cond tenu)."""
+    if needs["disk_mb"]:
+        disk = free_disk_mb(job["prod_dir"])
+        if disk is not None and disk < needs["disk_mb"]:
+            return "disk", f"{disk} MB free < {needs['disk_mb']} MB"
+    memory = available_memory_mb()
+    if memory is not None and needs["memory_mb"]:
+        headroom = memory - _reserved_mb() - config.ADMISSION_MEMORY_RESERVE_MB
+        if headroom < needs["memory_mb"]:
+            return "memory", f"{headroom} MB free < {needs['memory_mb']} MB"
+    if needs["cpu"] and any(_running.get(s) for s in config.ADMISSION_CPU_STAGES):
+        # Machine seule (aucune étape CPU à nous en cours) : on démarre quelle que soit la charge externe
+        load = cpu_load()
+        if load is not None and load > config.ADMISSION_MAX_LOAD:
+            return "cpu", f"load {load:.2f}/core > {config.ADMISSION_MAX_LOAD}"
+    return None
+
+def _record(job, stage, decision):
+    job.setdefault("admission", {})[stage] = decision
+    line = {"ts": datetime.utcnow().isoformat() + "Z", "project": job["project_id"], "stage": stage, **decision}
+    try:
+        with open(config.ADMISSION_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line) + "\n")
+    except OSError as e:
+        logging.warning(f"   ⚠️ Admission log write failed: {e}")
+
+@contextmanager
+def admit(job, stage):
+    """
+    Attend que l'étape puisse démarrer. Donne True (job["threads"] renseigné), ou False si refusée
+    (disque insuffisant après ADMISSION_MAX_WAIT, ou job annulé pendant l'attente).
+    """
+    if not config.ADMISSION:
+        job["threads"] = None
+        yield True
+        return
+
+    needs = stage_needs(job, stage)
+    t = time.time()
+    blocker = logged = None
+    with _cond:
+        while True:
+            blocker = _blocker(job, needs)
+            if blocker is None or job["cancel"].is_set() or time.time() - t >= config.ADMISSION_MAX_WAIT:
+                break
+            if blocker[0] != logged: # Un log par changement de raison, pas un par poll
+                logging.info(f"   🚦 [{stage}] {job['project_id']} held back: {blocker[0]} ({blocker[1]})")
+                logged = blocker[0]
+            _cond.wait(config.ADMISSION_POLL_INTERVAL)
+
+        granted = not job["cancel"].is_set() and (blocker is None or blocker[0] != "disk")
+        if granted:
+            _running[stage] = _running.get(stage, 0) + 1
+            _recent.append((time.time(), needs["memory_mb"]))
+            job["threads"] = thread_budget()
+
+        decision = {
+            "granted": granted, "waited_s": round(time.time() - t, 2),
+            "forced": granted and blocker is not None,
+            "blocker": blocker[0] if blocker else None, "detail": blocker[1] if blocker else None,
+            "threads": job.get("threads") if granted else None,
+            "memory_mb": available_memory_mb(), "load": cpu_load(), "needs": needs,
+            "running": dict(_running),
+        }
+    _record(job, stage, decision)
+
+    if not granted:
+        logging.error(f"   🚦 [{stage}] {job['project_id']} refused: {blocker[1] if blocker else 'cancelled'}")
+        yield False
+        return
+    if blocker or decision["waited_s"] >= 1:
+        logging.info(f"   🚦 [{stage}] {job['project_id']} admitted after {decision['waited_s']}s"
+                     f"{' (forced: ' + blocker[1] + ')' if blocker else ''} | {job['threads']} threads")
+    try:
+        yield True
+    finally:
+        with _cond:
+            _running[stage] -= 1
+            _cond.notify_all()
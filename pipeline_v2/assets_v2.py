@@ -0,0 +1,214 @@
+"""
+Visuels dérivés du master : posters, boucle de preview, planches de vignettes (sprites) + index WebVTT.
+
+Pas de seconde lecture du master : branches() ajoute ces sorties au filter_complex
+de l'encodage (une sortie de plus sur le split du décodage). En encodage par
+segments, chaque process ne produit que les visuels de sa fenêtre du master.
+collect() assemble ensuite les planches à partir des petites vignettes (pas du
+master), choisit le poster et nomme chaque fichier avec un hash de son contenu
+(cache CDN longue durée sans risque de version périmée).
+
+upload() envoie les fichiers sur Bunny Storage ; les URLs sont gardées dans
+status.json et référencées dans l'entrée du catalogue ("assets").
+"""
+import math
+import shutil
+import hashlib
+import logging
+import mimetypes
+import config
+import runner_v2
+import bunny_client
+
+KEYS = ("poster", "preview", "sprites", "sprite_vtt")
+# Tailles (octets) des fichiers intermédiaires, pour la réservation dans le scratch
+POSTER_BYTES = 600_000
+PREVIEW_BYTES_PER_S = 200_000
+THUMB_BYTES = 15_000  # Vignette + sa place dans la planche
+mimetypes.add_type("text/vtt", ".vtt")
+
+def enabled(job):
+    return config.ASSETS and (config.ASSETS_PRIVATE or not job["is_private"])
+
+def empty():
+    """Sorties "pas de visuels" (dict non vide : l'étape encode reste enregistrable dans le DAG)."""
+    return {"poster": None, "preview": None, "sprites": [], "sprite_vtt": None}
+
+def plan(duration):
+    """Instants (s, temps du master) des posters et de la preview, intervalle des vignettes."""
+    n = config.POSTER_COUNT
+    length = min(config.PREVIEW_SECONDS, duration)
+    return {
+        "posters": [round(duration * (i + 1) / (n + 1), 3) for i in range(n)],
+        "preview": (round(max(0.0, min(duration * config.PREVIEW_AT, duration - length)), 3), length),
+        "interval": config.SPRITE_INTERVAL,
+    }
+
+def scratch_bytes(duration):
+    """Octets (estimés) écrits dans le dossier de travail : candidats poster, preview, vignettes et planches."""
+    thumbs = math.ceil(duration / config.SPRITE_INTERVAL) + 1
+    preview_s = min(config.PREVIEW_SECONDS, duration)
+    return POSTER_BYTES * config.POSTER_COUNT + int(PREVIEW_BYTES_PER_S * preview_s) + THUMB_BYTES * thumbs
+
+# --- BRANCHES FFMPEG ---
+
+def branches(label, plan, work_dir, start=0.0, end=None, idx=0):
+    """
+    Branches filter_complex + arguments de sortie pour les visuels de la fenêtre [start, end[ du master.
+    `label` : sortie du split du décodage (ex: "[va]"). Les temps sont relatifs au début de la fenêtre.
+    """
+    stop = end if end is not None else math.inf
+    posters = [(i, t - start) for i, t in enumerate(plan["posters"]) if start <= t < stop]
+    pv_start, pv_length = plan["preview"]
+    preview = pv_length > 0 and start <= pv_start < stop
+
+    names = [f"ap{i}" for i, _ in posters] + (["apv"] if preview else []) + ["asp"]
+    if len(names) > 1:
+        graph = [f"{label}split={len(names)}" + "".join(f"[{n}]" for n in names)]
+    else:
+        graph = [f"{label}null[asp]"]
+    outputs = []
+
+    for i, rel in posters:
+        graph.append(f"[ap{i}]trim=start={rel:.3f},scale={config.POSTER_WIDTH}:-2,setsar=1[apo{i}]")
+        outputs.extend(["-map", f"[apo{i}]", "-frames:v", "1", "-q:v", "2", str(work_dir / f"poster_{i}.jpg")])
+
+    if preview:
+        length = min(pv_length, stop - pv_start)
+        graph.append(
+            f"[apv]trim=start={pv_start - start:.3f}:duration={length:.3f},setpts=PTS-STARTPTS,"
+            f"fps={config.PREVIEW_FPS},scale={config.PREVIEW_WIDTH}:-2,setsar=1[apvo]"
+        )
+        outputs.extend([
+            "-map", "[apvo]", "-an", "-c:v", "libx264", "-preset", "veryfast", "-crf", str(config.PREVIEW_CRF),
+            "-pix_fmt", "yuv420p", "-movflags", "+faststart", str(work_dir / "preview.mp4")
+        ])
+
+    graph.append(f"[asp]fps=1/{plan['interval']},scale={config.SPRITE_WIDTH}:-2,setsar=1[aspo]")
+    outputs.extend(["-map", "[aspo]", "-q:v", "5", "-start_number", "0", "-f", "image2",
+                    str(work_dir / f"thumb_{idx:03d}_%05d.jpg")])
+    return ";".join(graph), outputs
+
+# --- ASSEMBLAGE ---
+
+def _hashed(src, dest_dir, name):
+    """Copie `src` dans dest_dir sous <name>.<hash8><ext>."""
+    digest = hashlib.sha256(src.read_bytes()).hexdigest()[:8]
+    dest = dest_dir / f"{name}.{digest}{src.suffix}"
+    shutil.copyfile(src, dest)
+    return dest
+
+def _timestamp(seconds):
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:06.3f}"
+
+def _image_size(path):
+    out = runner_v2.run([
+        config.FFPROBE, "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=width,height", "-of", "csv=p=0", str(path)
+    ], capture_stdout=True)
+    w, h = out.decode().strip().split(",")[:2]
+    return int(w), int(h)
+
+def _sprites(work_dir, plan, starts, duration, dest_dir):
+    """Planches SPRITE_COLUMNS x SPRITE_ROWS + index WebVTT (#xywh). Retourne (planches, vtt) ou ([], None)."""
+    thumbs = []  # (temps du master, fichier)
+    for idx, start in enumerate(starts):
+        files = sorted(work_dir.glob(f"thumb_{idx:03d}_*.jpg"))
+        thumbs.extend((start + k * plan["interval"], f) for k, f in enumerate(files))
+    thumbs = [(t, f) for t, f in thumbs if t < duration]
+    if not thumbs:
+        return [], None
+
+    seq_dir = work_dir / "sprite_seq"
+    seq_dir.mkdir(exist_ok=True)
+    for n, (_, f) in enumerate(thumbs):
+        f.replace(seq_dir / f"{n:05d}.jpg")
+    cols, rows = config.SPRITE_COLUMNS, config.SPRITE_ROWS
+    runner_v2.run([
+        config.FFMPEG, "-y", "-v", "error", "-framerate", "1", "-start_number", "0",
+        "-i", str(seq_dir / "%05d.jpg"), "-vf", f"tile={cols}x{rows}", "-q:v", "5",
+        "-start_number", "0", str(work_dir / "sprite_%02d.jpg")
+    ])
+    sheets = [_hashed(f, dest_dir, f"sprite_{i:02d}") for i, f in enumerate(sorted(work_dir.glob("sprite_*.jpg")))]
+    if not sheets:
+        return [], None
+
+    w, h = _image_size(seq_dir / "00000.jpg")
+    lines = ["WEBVTT", ""]
+    for n, (t, _) in enumerate(thumbs):
+        end = thumbs[n + 1][0] if n + 1 < len(thumbs) else duration
+        sheet, pos = divmod(n, cols * rows)
+        x, y = (pos % cols) * w, (pos // cols) * h
+        lines += [f"{_timestamp(t)} --> {_timestamp(end)}", f"{sheets[sheet].name}#xywh={x},{y},{w},{h}", ""]
+    vtt = work_dir / "sprites.vtt"
+    vtt.write_text("\n".join(lines), encoding="utf-8")
+    return sheets, _hashed(vtt, dest_dir, "sprites")
+
+def collect(work_dir, plan, starts, duration, dest_dir):
+    """
+    Visuels finaux (noms hashés) dans dest_dir : {"poster", "preview", "sprites", "sprite_vtt"}.
+    starts : début (s) de chaque fenêtre encodée (un seul 0.0 sans segments). Un visuel raté vaut None.
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    for old in dest_dir.iterdir():
+        old.unlink()
+    assets = empty()
+
+    # Poster : le candidat le plus lourd en JPEG = le plus détaillé (évite les plans noirs / fondus)
+    posters = [p for p in work_dir.glob("poster_*.jpg") if p.stat().st_size]
+    if posters:
+        assets["poster"] = _hashed(max(posters, key=lambda p: p.stat().st_size), dest_dir, "poster")
+    preview = work_dir / "preview.mp4"
+    if preview.exists() and preview.stat().st_size:
+        assets["preview"] = _hashed(preview, dest_dir, "preview")
+    try:
+        assets["sprites"], assets["sprite_vtt"] = _sprites(work_dir, plan, starts, duration, dest_dir)
+    except (runner_v2.CommandError, FileNotFoundError, ValueError) as e:
+        logging.warning(f"   ⚠️ Sprite sheet failed: {e}")
+
+    missing = [k for k in KEYS if not assets[k]]
+    logging.info(f"   🖼️ Assets: {len(posters)} poster candidates, {len(assets['sprites'])} sprite sheet(s)"
+                 f"{', missing ' + ', '.join(missing) if missing else ''}")
+    return assets
+
+# --- UPLOAD ---
+
+def _url(job, name):
+    return f"{config.STORAGE_PULL_ZONE}/{config.STORAGE_PREFIX}/{job['project_id']}/{name}"
+
+def upload(job, previous=None):
+    """
+    Envoie les visuels sur Bunny Storage. Retourne {"poster": url, "sprites": [url, ...], ...},
+    {} si rien à envoyer, ou None en cas d'échec. `previous` : URLs déjà publiées (noms hashés inchangés -> rien à renvoyer).
+    """
+    assets = job.get("assets") or {}
+    if not enabled(job) or not any(assets.values()):
+        return {}
+    if not (config.STORAGE_ZONE and config.STORAGE_PULL_ZONE):
+        logging.warning("   ⚠️ Bunny Storage not configured (BUNNY_STORAGE_ZONE): assets kept locally")
+        return {}
+
+    urls = {}
+    for key in KEYS:
+        value = assets.get(key)
+        if isinstance(value, list):
+            urls[key] = [_url(job, p.name) for p in value]
+        else:
+            urls[key] = _url(job, value.name) if value else None
+    if urls == previous:
+        logging.info("   ⏭️ Assets unchanged, already on Bunny Storage")
+        return urls
+
+    for key in KEYS:
+        value = assets.get(key)
+        for path in (value if isinstance(value, list) else [value] if value else []):
+            if job["cancel"].is_set():
+                return None
+            content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            remote = f"{config.STORAGE_PREFIX}/{job['project_id']}/{path.name}"
+            if not bunny_client.storage_put(remote, path.read_bytes(), content_type):
+                return None
+    logging.info(f"   ✅ Assets published: {urls['poster'] or urls['sprite_vtt']}")
+    return urls
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Benchmark reproductible du pipeline sur des masters synthétiques.
+
+- Masters déterministes générés par ffmpeg (lavfi : testsrc2 + sine / bruit rose),
+  en plusieurs durées, résolutions et ratios (mis en cache dans .cache/bench).
+- Chaque étape de process_video tourne pour de vrai, contre un faux Bunny local
+  (API vidéos + TUS) : aucun appel réseau, catalogue / ledger / index isolés.
+- Mesures par étape (metrics_v2) : temps réel, facteur temps réel (durée du
+  master / temps de l'étape), CPU, pic mémoire.
+- Résultats ajoutés à BENCH_HISTORY ; comparaison avec la médiane des derniers
+  runs de la même machine, seuils de régression dans config.BENCH_THRESHOLDS.
+
+Usage :
+    python bench_v2.py                      # Cas par défaut
+    python bench_v2.py --cases 10s_1080p_16x9 --repeat 3
+    python bench_v2.py --all --no-save      # Inclut les masters longs, sans écrire l'historique
+"""
+import os
+import re
+import sys
+import json
+import uuid
+import shutil
+import socket
+import logging
+import argparse
+import platform
+import statistics
+import threading
+import subprocess
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config
+
+# name -> durée (s), taille, fps, source audio, inclus par défaut
+CASES = {
+    "10s_1080p_16x9": {"duration": 10, "size": (1920, 1080), "fps": 25, "audio": "sine", "default": True},
+    "10s_1080p_9x16": {"duration": 10, "size": (1080, 1920), "fps": 30, "audio": "noise", "default": True},
+    "10s_1080p_1x1": {"duration": 10, "size": (1080, 1080), "fps": 25, "audio": "sine", "default": True},
+    "60s_720p_16x9": {"duration": 60, "size": (1280, 720), "fps": 25, "audio": "noise", "default": True},
+    "300s_1080p_16x9": {"duration": 300, "size": (1920, 1080), "fps": 25, "audio": "sine", "default": False},
+    "900s_720p_16x9": {"duration": 900, "size": (1280, 720), "fps": 25, "audio": "noise", "default": False},
+}
+
+AUDIO_SOURCES = {
+    "sine": "sine=frequency=440:sample_rate=48000:duration={d}",
+    "noise": "anoisesrc=color=pink:seed=42:sample_rate=48000:amplitude=0.2:duration={d}",
+}
+
+# --- FAUX BUNNY (API vidéos + TUS) ---
+
+class FakeBunny:
+    """Serveur HTTP local qui imite les endpoints Bunny utilisés par le pipeline."""
+
+    def __init__(self):
+        self.videos = {}   # guid -> dict Bunny
+        self.uploads = {}  # id TUS -> {"length", "offset"}
+        self.storage = {}  # chemin Bunny Storage -> taille (posters, preview, sprites)
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def _handler(self):
+        bunny = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, code, body=None, headers=None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(code)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Tus-Resumable", "1.0.0")
+                self.send_header("Content-Length", str(len(data)))
+                if body is not None:
+                    self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def do_OPTIONS(self):
+                self._reply(204, headers={"Tus-Version": "1.0.0", "Tus-Extension": "creation,concatenation"})
+
+            def do_HEAD(self):
+                up = bunny.uploads.get(self.path.rsplit("/", 1)[-1])
+                if up is None:
+                    return self._reply(404)
+                self._reply(200, headers={"Upload-Offset": str(up["offset"]), "Upload-Length": str(up["length"])})
+
+            def do_PATCH(self):
+                up = bunny.uploads.get(self.path.rsplit("/", 1)[-1])
+                data = self._body()
+                if up is None or int(self.headers.get("Upload-Offset", -1)) != up["offset"]:
+                    return self._reply(409)
+                with bunny.lock:
+                    up["offset"] += len(data)
+                    bunny.bytes_received += len(data)
+                self._reply(204, headers={"Upload-Offset": str(up["offset"])})
+
+            def do_POST(self):
+                body = self._body()
+                if self.path.startswith("/tusupload"):
+                    upload_id = uuid.uuid4().hex
+                    with bunny.lock:
+                        bunny.uploads[upload_id] = {"length": int(self.headers.get("Upload-Length") or 0), "offset": 0}
+                    return self._reply(201, headers={"Location": f"/tusupload/{upload_id}"})
+                match = re.match(r"^/library/(\w+)/videos/?$", self.path.split("?")[0])
+                if not match:
+                    return self._reply(404)
+                title = json.loads(body or b"{}").get("title", "")
+                video = {
+                    "guid": str(uuid.uuid4()), "title": title, "status": 4, "encodeProgress": 100,
+                    "dateUploaded": datetime.utcnow().isoformat(), "storageSize": 0,
+                    "width": 0, "height": 0, "length": 0
+                }
+                with bunny.lock:
+                    bunny.videos[video["guid"]] = video
+                self._reply(200, video)
+
+            def do_GET(self):
+                path = self.path.split("?")[0].rstrip("/")
+                if re.match(r"^/library/\w+/videos$", path):
+                    items = sorted(bunny.videos.values(), key=lambda v: v["dateUploaded"], reverse=True)
+                    return self._reply(200, {"items": items, "totalItems": len(items), "currentPage": 1, "itemsPerPage": 100})
+                guid = path.rsplit("/", 1)[-1]
+                if guid in bunny.videos:
+                    return self._reply(200, bunny.videos[guid])
+                self._reply(404)
+
+            def do_PUT(self):
+                data = self._body()
+                if not self.path.startswith("/storage/"):
+                    return self._reply(404)
+                with bunny.lock:
+                    bunny.storage[self.path] = len(data)
+                    bunny.bytes_received += len(data)
+                self._reply(201, {"HttpCode": 201, "Message": "File uploaded."})
+
+            def do_DELETE(self):
+                bunny.videos.pop(self.path.rsplit("/", 1)[-1], None)
+                self._reply(200, {"success": True})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+def isolate(work_dir, fake):
+    """Redirige tout ce que le pipeline écrit en dehors du projet (catalogue, ledger, index, logs, Bunny) vers work_dir."""
+    config.BUNNY_API_BASE = fake.base_url
+    config.TUS_ENDPOINT = f"{fake.base_url}/tusupload"
+    config.STORAGE_ENDPOINT = f"{fake.base_url}/storage"
+    config.STORAGE_ZONE = "bench"
+    config.STORAGE_KEY = "bench-key"
+    config.STORAGE_PULL_ZONE = "http://bench.invalid/storage"
+    config.LIB_PUBLIC = "bench"
+    config.API_KEY_PUBLIC = "bench-key"
+    config.PULL_ZONE_PUBLIC = "http://bench.invalid"
+    config.CATALOG_DB = work_dir / "catalog.sqlite"
+    config.DB_FILE = work_dir / "showcase.json"
+    config.INVENTORY_LEDGER = work_dir / "inventory_ledger.csv"
+    config.BUNNY_INDEX_DIR = work_dir / "index"
+    config.CATALOG_ARTIFACT = work_dir / "catalog.json"
+    config.ADMISSION_LOG = work_dir / "admission_log.jsonl"
+
+# --- MASTERS SYNTHÉTIQUES ---
+
+def make_master(name, case, masters_dir):
+    """Génère (une fois) le master d'un cas : testsrc2 + audio lavfi, encodage déterministe."""
+    from worker_v2 import run_cmd
+    w, h = case["size"]
+    d = case["duration"]
+    path = masters_dir / f"{name}.mp4"
+    if path.exists():
+        return path
+    masters_dir.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"~{path.name}")
+    cmd = [
+        config.FFMPEG, "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate={case['fps']}:duration={d}",
+        "-f", "lavfi", "-i", AUDIO_SOURCES[case["audio"]].format(d=d),
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+        "-g", str(case["fps"] * 2), "-threads", "1",
+        "-c:a", "aac", "-b:a", "192k",
+        "-fflags", "+bitexact", "-flags", "+bitexact", "-map_metadata", "-1",
+        "-f", "mp4", str(tmp)
+    ]
+    if not run_cmd(cmd, duration=d, label=f"master {name}"):
+        raise RuntimeError(f"Master generation failed: {name}")
+    tmp.replace(path)
+    return path
+
+# --- RUN ---
+
+def run_case(name, case, work_dir):
+    """Passe un master dans toutes les étapes du pipeline. Retourne les mesures du cas."""
+    from worker_v2 import STAGES, prepare_job, run_stage, finalize_job
+
+    master = make_master(name, case, work_dir / "masters")
+    prod_dir = work_dir / "projects" / name
+    shutil.rmtree(prod_dir, ignore_errors=True)
+    prod_dir.mkdir(parents=True)
+
+    logging.info(f"🏁 BENCH {name}")
+    job = prepare_job(f"bench-{name}", prod_dir, master, is_private=False, force=[n for n, _ in STAGES])
+    ok = all(run_stage(job, stage, fn) for stage, fn in STAGES) and finalize_job(job)
+
+    duration = case["duration"]
+    stages = {}
+    for stage, m in job.get("metrics", {}).items():
+        stages[stage] = {
+            "wall_s": m["wall_s"],
+            "rtf": round(duration / m["wall_s"], 2) if m["wall_s"] else None,
+            "cpu_s": m["cpu_s"],
+            "peak_rss_bytes": m["peak_rss_bytes"],
+            "child_peak_rss_bytes": m["child_peak_rss_bytes"],
+            "ok": m["ok"]
+        }
+    total = round(sum(s["wall_s"] for s in stages.values()), 3)
+    return {
+        "ok": bool(ok),
+        "duration_s": duration,
+        "wall_s": total,
+        "rtf": round(duration / total, 2) if total else None,
+        "output_bytes": sum(p.stat().st_size for p in job.get("encoded", {}).values() if p.exists()),
+        "stages": stages
+    }
+
+def host_id():
+    """Identifiant de la machine : on ne compare que des runs faits sur le même matériel."""
+    return f"{socket.gethostname()}|{platform.machine()}|{os.cpu_count()}cpu"
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=config.BASE_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+# --- HISTORIQUE / RÉGRESSIONS ---
+
+def load_history():
+    try:
+        return json.loads(config.BENCH_HISTORY.read_text())
+    except Exception:
+        return []
+
+def save_history(history):
+    tmp = config.BENCH_HISTORY.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(history, indent=2))
+    tmp.replace(config.BENCH_HISTORY)
+
+def find_regressions(run, history):
+    """Compare chaque (cas, étape, métrique) à la médiane des BENCH_BASELINE_RUNS derniers runs de la même machine."""
+    previous = [r for r in history if r.get("host") == run["host"]][-config.BENCH_BASELINE_RUNS:]
+    regressions = []
+    for case, res in run["cases"].items():
+        for stage, values in res["stages"].items():
+            for metric, ratio in config.BENCH_THRESHOLDS.items():
+                past = [r["cases"][case]["stages"][stage][metric] for r in previous
+                        if stage in r.get("cases", {}).get(case, {}).get("stages", {})]
+                past = [v for v in past if v]
+                if not past or not values.get(metric):
+                    continue
+                baseline = statistics.median(past)
+                if values[metric] > baseline * ratio:
+                    regressions.append({
+                        "case": case, "stage": stage, "metric": metric,
+                        "value": values[metric], "baseline": baseline,
+                        "ratio": round(values[metric] / baseline, 2)
+                    })
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic masters")
+    parser.add_argument("--cases", default="", help="Comma separated case names (default: default cases)")
+    parser.add_argument("--all", action="store_true", help="Include long masters")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case (the fastest one is kept)")
+    parser.add_argument("--no-save", action="store_true", help="Do not append to the history")
+    parser.add_argument("--list", action="store_true", help="List cases and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, case in CASES.items():
+            print(f"{name:20} {case['duration']:>4}s {case['size'][0]}x{case['size'][1]} @{case['fps']} {case['audio']}"
+                  f"{'' if case['default'] else '  (--all)'}")
+        return 0
+
+    names = [n for n in args.cases.split(",") if n] or [n for n, c in CASES.items() if c["default"] or args.all]
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        print(f"Unknown case(s): {', '.join(unknown)}")
+        return 2
+
+    work_dir = config.BENCH_DIR
+    work_dir.mkdir(parents=True, exist_ok=True)
+    fake = FakeBunny().start()
+    isolate(work_dir, fake)
+
+    run = {
+        "ts": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "host": host_id(),
+        "cases": {}
+    }
+    try:
+        for name in names:
+            results = [run_case(name, CASES[name], work_dir) for _ in range(max(1, args.repeat))]
+            run["cases"][name] = min(results, key=lambda r: r["wall_s"])
+    finally:
+        fake.stop()
+
+    # Rapport
+    print(f"\n{'case':20} {'stage':10} {'wall':>8} {'rtf':>7} {'cpu':>8} {'peak MB':>8}")
+    for name, res in run["cases"].items():
+        for stage, s in res["stages"].items():
+            peak = max(s["peak_rss_bytes"], s["child_peak_rss_bytes"]) / 1e6
+            print(f"{name:20} {stage:10} {s['wall_s']:>7.2f}s {s['rtf'] or 0:>6.1f}x {s['cpu_s']:>7.2f}s {peak:>8.0f}")
+        print(f"{name:20} {'TOTAL':10} {res['wall_s']:>7.2f}s {res['rtf'] or 0:>6.1f}x "
+              f"{'' if res['ok'] else '  ❌ FAILED'}")
+
+    history = load_history()
+    regressions = find_regressions(run, history)
+    run["regressions"] = regressions
+    for r in regressions:
+        print(f"⚠️ REGRESSION {r['case']} / {r['stage']} / {r['metric']}: "
+              f"{r['value']} vs baseline {r['baseline']} (x{r['ratio']})")
+
+    if not args.no_save:
+        history.append(run)
+        save_history(history)
+        print(f"\n💾 Saved to {config.BENCH_HISTORY.name} ({len(history)} runs)")
+
+    failed = [n for n, r in run["cases"].items() if not r["ok"]]
+    return 1 if regressions or failed else 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Client Bunny Stream partagé par le pipeline et tous les scripts de maintenance.
+
+- Une seule session HTTP keep-alive (pool de connexions) pour tout le process
+- Timeouts systématiques
+- Retry avec backoff sur 429 (en respectant Retry-After), 5xx et coupures réseau
+- Pagination parallèle des listes de vidéos
+- Latence mesurée par appel (agrégée par méthode + endpoint)
+
+Usage :
+    from bunny_client import BunnyClient
+    client = BunnyClient.for_library(is_private=False)
+    videos = client.list_all()
+"""
+import re
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import config
+
+# Méthodes rejouables sans risque (un POST n'est rejoué que sur 429 : requête non traitée)
+IDEMPOTENT = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS", "PATCH"}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+def session():
+    """Session HTTP keep-alive partagée par tout le process (créée au premier appel)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config.BUNNY_POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+    return _session
+
+# --- METRIQUES ---
+
+def _endpoint_label(method, url):
+    """'GET https://.../library/123/videos/<guid>' -> 'GET /library/{id}/videos/{guid}'"""
+    path = url.split("://", 1)[-1].split("/", 1)[-1].split("?", 1)[0]
+    path = re.sub(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", "{guid}", path)
+    path = re.sub(r"/\d+(?=/|$)", "/{id}", path)
+    return f"{method} /{path}"
+
+def _record(label, dur, ok):
+    with _metrics_lock:
+        m = _metrics.setdefault(label, {"count": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0})
+        m["count"] += 1
+        m["total_s"] += dur
+        m["max_s"] = max(m["max_s"], dur)
+        if not ok:
+            m["errors"] += 1
+
+def metrics():
+    """Latences agrégées par endpoint : {label: {count, errors, avg_s, max_s, total_s}}."""
+    with _metrics_lock:
+        out = {}
+        for label, m in _metrics.items():
+            out[label] = dict(m)
+            out[label]["avg_s"] = round(m["total_s"] / m["count"], 3) if m["count"] else 0.0
+            out[label]["total_s"] = round(m["total_s"], 3)
+            out[label]["max_s"] = round(m["max_s"], 3)
+        return out
+
+def log_metrics():
+    for label, m in sorted(metrics().items()):
+        logging.info(f"   📡 {label}: {m['count']} calls | avg {m['avg_s']}s | max {m['max_s']}s | errors {m['errors']}")
+
+# --- REQUETES ---
+
+def request(method, url, **kwargs):
+    """
+    Requête HTTP via la session partagée, avec timeout et retry/backoff.
+    Retourne la Response finale (le code HTTP est à vérifier par l'appelant).
+    """
+    method = method.upper()
+    kwargs.setdefault("timeout", config.BUNNY_TIMEOUT)
+    label = _endpoint_label(method, url)
+
+    attempt = 0
+    while True:
+        attempt += 1
+        t = time.time()
+        try:
+            resp = session().request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _record(label, time.time() - t, False)
+            if method not in IDEMPOTENT or attempt > config.BUNNY_MAX_RETRIES:
+                raise
+            wait = min(2 ** attempt * 0.5, 30)
+            logging.warning(f"   ⚠️ Bunny {label}: {e.__class__.__name__}, retry {attempt} in {wait}s")
+            time.sleep(wait)
+            continue
+
+        _record(label, time.time() - t, resp.ok)
+        retryable = resp.status_code == 429 or (resp.status_code in RETRY_STATUS and method in IDEMPOTENT)
+        if not retryable or attempt > config.BUNNY_MAX_RETRIES:
+            return resp
+
+        # Rate limit : on respecte Retry-After si Bunny le fournit
+        try:
+            wait = float(resp.headers.get("Retry-After", ""))
+        except ValueError:
+            wait = min(2 ** attempt * 0.5, 30)
+        logging.warning(f"   ⚠️ Bunny {label}: HTTP {resp.status_code}, retry {attempt} in {wait}s")
+        time.sleep(wait)
+
+def storage_put(remote_path, data, content_type="application/octet-stream"):
+    """Dépose un fichier sur Bunny Storage (STORAGE_ZONE, chemin relatif à la zone). True si accepté."""
+    resp = request(
+        "PUT", f"{config.STORAGE_ENDPOINT}/{config.STORAGE_ZONE}/{remote_path}", data=data,
+        headers={"AccessKey": config.STORAGE_KEY, "Content-Type": content_type}
+    )
+    if not resp.ok:
+        logging.error(f"   ❌ Bunny Storage PUT {remote_path}: HTTP {resp.status_code}")
+    return resp.ok
+
+# --- CLIENT PAR LIBRAIRIE ---
+
+class BunnyClient:
+    """Accès à une librairie Bunny Stream (toutes les requêtes passent par la session partagée)."""
+
+    def __init__(self, lib_id, api_key):
+        self.lib_id = str(lib_id)
+        self.api_key = api_key
+        self.base_url = f"{config.BUNNY_API_BASE}/library/{self.lib_id}/videos"
+        self.headers = {"AccessKey": api_key, "accept": "application/json"}
+
+    @classmethod
+    def for_library(cls, is_private):
+        """Client configuré pour la librairie publique ou privée (identifiants de config.py)."""
+        if is_private:
+            return cls(config.LIB_PRIVATE, config.API_KEY_PRIVATE)
+        return cls(config.LIB_PUBLIC, config.API_KEY_PUBLIC)
+
+    def request(self, method, path="", **kwargs):
+        headers = dict(self.headers)
+        headers.update(kwargs.pop("headers", {}))
+        return request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
+
+    # --- Lecture ---
+
+    def list_page(self, page=1, per_page=100, order_by="date", search=None):
+        """Une page de la liste des vidéos (dict Bunny : items, totalItems...)."""
+        params = {"page": page, "itemsPerPage": per_page, "orderBy": order_by}
+        if search:
+            params["search"] = search
+        resp = self.request("GET", params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    def list_all(self, per_page=100, order_by="date", workers=None):
+        """Toutes les vidéos : la 1ère page donne le total, les suivantes sont récupérées en parallèle."""
+        first = self.list_page(1, per_page, order_by)
+        items = list(first.get("items", []))
+        total = first.get("totalItems", len(items))
+        pages = -(-total // per_page)
+        if pages <= 1:
+            return items
+
+        with ThreadPoolExecutor(max_workers=workers or config.BUNNY_PAGE_WORKERS) as pool:
+            results = pool.map(lambda p: self.list_page(p, per_page, order_by), range(2, pages + 1))
+            for data in results:
+                items.extend(data.get("items", []))
+        return items
+
+    def search(self, title):
+        """Vidéos dont le titre correspond EXACTEMENT à `title`."""
+        data = self.list_page(1, 100, search=title)
+        return [v for v in data.get("items", []) if v.get("title") == title]
+
+    def get_video(self, guid):
+        resp = self.request("GET", f"/{guid}")
+        resp.raise_for_status()
+        return resp.json()
+
+    # --- Écriture ---
+
+    def create_video(self, title):
+        """Crée une entrée vidéo vide. Retourne le dict Bunny (avec 'guid')."""
+        resp = self.request("POST", json={"title": title})
+        resp.raise_for_status()
+        return resp.json()
+
+    def delete_video(self, guid):
+        """Supprime une vidéo. Retourne la Response (l'appelant affiche l'erreur éventuelle)."""
+        return self.request("DELETE", f"/{guid}")
@@ -0,0 +1,181 @@
+"""
+Index local d'une librairie Bunny Stream (titre -> guid).
+
+Une base SQLite par librairie garde title, guid, dateUploaded, taille et statut
+d'encodage de chaque vidéo. La synchronisation est incrémentale (on ne relit que
+les vidéos plus récentes que la dernière vue) et les recherches par titre exact
+sont servies depuis un dict en mémoire, sans appel réseau.
+
+Usage :
+    index = get_index(is_private=False)
+    guids = index.lookup("mon-projet (16x9)")
+"""
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+import config
+from bunny_client import BunnyClient
+
+COLUMNS = ["guid", "title", "dateUploaded", "storageSize", "status", "encodeProgress", "width", "height", "length"]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+class BunnyIndex:
+    """Miroir local d'une librairie : SQLite sur disque + dict titre -> guids en mémoire."""
+
+    def __init__(self, client, path=None):
+        self.client = client
+        self.path = path or config.BUNNY_INDEX_DIR / f"bunny_index_{client.lib_id}.sqlite"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            " guid TEXT PRIMARY KEY, title TEXT, dateUploaded TEXT, storageSize INTEGER,"
+            " status INTEGER, encodeProgress INTEGER, width INTEGER, height INTEGER, length INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_videos_title ON videos(title)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+        # Titre -> [guid, ...] (plusieurs si doublons sur Bunny)
+        self._by_title = {}
+        for guid, title in self._db.execute("SELECT guid, title FROM videos ORDER BY dateUploaded DESC"):
+            self._by_title.setdefault(title, []).append(guid)
+
+    # --- META ---
+
+    def _get_meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # --- LECTURE (sans réseau) ---
+
+    def lookup(self, title):
+        """GUIDs des vidéos dont le titre est exactement `title` (plus récente d'abord)."""
+        with self._lock:
+            return list(self._by_title.get(title, []))
+
+    def all(self):
+        """Toutes les vidéos indexées (dicts avec les mêmes clés que l'API Bunny)."""
+        with self._lock:
+            rows = self._db.execute(f"SELECT {', '.join(COLUMNS)} FROM videos ORDER BY dateUploaded DESC").fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    # --- ÉCRITURE ---
+
+    def add(self, video):
+        """Ajoute / met à jour une vidéo (dict Bunny, ex: réponse de create_video)."""
+        with self._lock:
+            self._upsert(video)
+            self._db.commit()
+
+    def remove(self, guid):
+        """Retire une vidéo supprimée sur Bunny."""
+        with self._lock:
+            row = self._db.execute("SELECT title FROM videos WHERE guid = ?", (guid,)).fetchone()
+            self._db.execute("DELETE FROM videos WHERE guid = ?", (guid,))
+            self._db.commit()
+            if row and guid in self._by_title.get(row[0], []):
+                self._by_title[row[0]].remove(guid)
+                if not self._by_title[row[0]]:
+                    del self._by_title[row[0]]
+
+    def _upsert(self, video):
+        values = [video.get(c) for c in COLUMNS]
+        old = self._db.execute("SELECT title FROM videos WHERE guid = ?", (video["guid"],)).fetchone()
+        self._db.execute(
+            f"INSERT OR REPLACE INTO videos ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            values
+        )
+        if old and old[0] != video.get("title") and video["guid"] in self._by_title.get(old[0], []):
+            self._by_title[old[0]].remove(video["guid"])
+        guids = self._by_title.setdefault(video.get("title"), [])
+        if video["guid"] not in guids:
+            guids.insert(0, video["guid"])
+
+    # --- SYNCHRO ---
+
+    def sync(self, full=False):
+        """
+        Synchronise avec Bunny.
+        - Incrémental : pages triées par date, on s'arrête aux vidéos déjà connues
+          (moins une marge pour rafraîchir le statut d'encodage des plus récentes).
+        - Complet (full=True, ou toutes les BUNNY_INDEX_FULL_SYNC s) : remplace tout,
+          ce qui retire aussi les vidéos supprimées hors de nos scripts.
+        """
+        with self._lock:
+            last_full = float(self._get_meta("last_full_sync", 0))
+            high_water = self._get_meta("high_water")
+        if full or not high_water or time.time() - last_full > config.BUNNY_INDEX_FULL_SYNC:
+            return self._full_sync()
+
+        # Marge : les vidéos récentes peuvent encore changer de statut (encodage)
+        try:
+            hw = datetime.fromisoformat(high_water.rstrip("Z")) - timedelta(seconds=config.BUNNY_INDEX_REFRESH_MARGIN)
+            cutoff = hw.isoformat()
+        except ValueError:
+            cutoff = high_water
+
+        fetched = []
+        page = 1
+        while True:
+            items = self.client.list_page(page, 100, order_by="date").get("items", [])
+            fetched.extend(items)
+            if len(items) < 100 or any((v.get("dateUploaded") or "") < cutoff for v in items):
+                break
+            page += 1
+
+        with self._lock:
+            for v in fetched:
+                self._upsert(v)
+            self._bump_high_water(fetched)
+            self._set_meta("last_sync", time.time())
+            self._db.commit()
+        logging.info(f"   🗂️ Bunny index {self.client.lib_id}: +{len(fetched)} checked ({len(self)} indexed)")
+        return len(fetched)
+
+    def _full_sync(self):
+        videos = self.client.list_all()
+        with self._lock:
+            self._db.execute("DELETE FROM videos")
+            self._by_title = {}
+            for v in sorted(videos, key=lambda x: x.get("dateUploaded") or ""):
+                self._upsert(v)
+            self._bump_high_water(videos)
+            self._set_meta("last_full_sync", time.time())
+            self._set_meta("last_sync", time.time())
+            self._db.commit()
+        logging.info(f"   🗂️ Bunny index {self.client.lib_id}: full sync ({len(videos)} videos)")
+        return len(videos)
+
+    def _bump_high_water(self, videos):
+        dates = [v.get("dateUploaded") for v in videos if v.get("dateUploaded")]
+        current = self._get_meta("high_water", "")
+        if dates and max(dates) > current:
+            self._set_meta("high_water", max(dates))
+
+    def sync_if_stale(self):
+        """Synchro incrémentale si la dernière date de plus de BUNNY_INDEX_MAX_AGE secondes."""
+        with self._lock:
+            last = float(self._get_meta("last_sync", 0))
+        if time.time() - last > config.BUNNY_INDEX_MAX_AGE:
+            self.sync()
+
+def get_index(is_private=None, client=None):
+    """Index partagé (un par librairie et par process)."""
+    client = client or BunnyClient.for_library(bool(is_private))
+    with _indexes_lock:
+        if client.lib_id not in _indexes:
+            _indexes[client.lib_id] = BunnyIndex(client)
+        return _indexes[client.lib_id]
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Catalogue publié pour le site : précalculé par le pipeline, servi sans appel à l'API Bunny Stream.
+
+Construit depuis catalog_store (une entrée par projet, formats déjà fusionnés),
+dans la forme attendue par index.html : id, updated_at, locked, bunny_urls,
+guids, thumbnails (+ preview / sprites quand les visuels existent). Minifié et
+versionné par le hash de son contenu (ETag côté API).
+
+backfill() ajoute au catalogue les projets présents sur Bunny Stream sans être
+passés par le pipeline (upload_existing_formats.py, uploads manuels), comme le
+listing Bunny que faisait le site : ils ne disparaissent pas avec CATALOG_URL.
+
+Écrit en local (CATALOG_ARTIFACT) puis déposé sur Bunny Storage :
+    <CATALOG_REMOTE_DIR>/catalog.<version>.json  (immuable)
+    <CATALOG_REMOTE_DIR>/catalog.json            (dernière version, lue par api/get-videos.js)
+Les miniatures des projets privés restent non signées : l'API les signe à la volée.
+
+Usage :
+    python catalog_publish.py           # Publie le catalogue s'il a changé
+    python catalog_publish.py --force   # Republie même si la version est identique
+"""
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime
+import config
+import catalog_store
+import bunny_client
+import bunny_index
+import job_queue
+
+_pending = True  # Publication à (re)faire : démarrage, export récent ou upload raté
+_last_backfill = 0
+TITLE_RE = re.compile(r"^(.*) \((.*)\)$")  # "solo-basement-talk (9x16)" -> id, format
+
+def _guid(url):
+    """'https://vz-xxx.b-cdn.net/<guid>/play_720p.mp4' -> '<guid>'"""
+    parts = url.split("://", 1)[-1].split("/")
+    return parts[1] if len(parts) > 2 else None
+
+def entry(project):
+    """Entrée compacte d'un projet (None si rien n'est publié sur Bunny)."""
+    urls = project.get("bunny_urls") or {}
+    if not urls:
+        return None
+    assets = project.get("assets") or {}
+    guids = {fmt: _guid(url) for fmt, url in urls.items()}
+    thumbnails = {}
+    for fmt, url in urls.items():
+        # Poster du pipeline (disponible tout de suite), sinon la vignette générée par Bunny
+        thumbnails[fmt] = assets.get("poster") or url.rsplit("/", 1)[0] + "/thumbnail.jpg"
+    item = {
+        "id": project["id"],
+        "updated_at": project.get("updated_at", ""),
+        "locked": bool(project.get("is_private")),
+        "bunny_urls": urls,
+        "guids": guids,
+        "thumbnails": thumbnails,
+    }
+    if assets.get("preview"):
+        item["preview"] = assets["preview"]
+    if assets.get("sprite_vtt"):
+        item["sprites"] = assets["sprite_vtt"]
+    return item
+
+def backfill():
+    """
+    Ajoute à catalog_store les projets publiés sur Bunny Stream qui n'y sont pas (index local des deux librairies),
+    et tient à jour ceux déjà ajoutés ainsi ("source": "bunny"). Les projets du pipeline et ceux en cours
+    de traitement ne sont pas touchés. Retourne le nombre de projets ajoutés ou modifiés.
+    Les vidéos du pipeline sont reconnues à leur GUID : le titre Bunny d'un projet "demo_v2" est "demo (...)".
+    """
+    backfilled, pipeline_guids = {}, set()
+    # Jobs en cours : GUID pas encore dans le catalogue, titre Bunny sans le suffixe de version
+    pipeline = {i for p in job_queue.active_ids() for i in (p, re.sub(r'_v\d+$', '', p))}
+    for project in catalog_store.all_projects():
+        if project.get("source") == "bunny":
+            backfilled[project["id"]] = project
+        else:
+            pipeline.add(project["id"]) # Jamais écrasé par une entrée "bunny" du même id
+            pipeline_guids.update(_guid(url) for url in (project.get("bunny_urls") or {}).values())
+            pipeline_guids.update((project.get("guids") or {}).values())
+    found, complete = {}, True
+    for is_private, pull_zone in ((False, config.PULL_ZONE_PUBLIC), (True, config.PULL_ZONE_PRIVATE)):
+        index = bunny_index.get_index(is_private=is_private)
+        try:
+            index.sync_if_stale()
+        except Exception as e:
+            logging.warning(f"   ⚠️ Bunny index sync fail: {e}")
+            complete = False
+        for video in reversed(index.all()): # Plus ancienne d'abord : la plus récente d'un format l'emporte
+            if video["guid"] in pipeline_guids:
+                continue
+            match = TITLE_RE.match(video["title"] or "")
+            project_id, fmt = match.groups() if match else (video["title"], "16x9")
+            if not project_id or project_id in pipeline:
+                continue
+            project = found.setdefault(project_id, {
+                "id": project_id, "updated_at": "", "is_private": False, "bunny_urls": {}, "source": "bunny"
+            })
+            project["bunny_urls"][fmt] = f"{pull_zone}/{video['guid']}/play_720p.mp4"
+            project["is_private"] = project["is_private"] or is_private
+            project["updated_at"] = max(project["updated_at"], video["dateUploaded"] or "")
+
+    changed = [p for p in found.values() if backfilled.get(p["id"]) != p]
+    for project in changed:
+        catalog_store.upsert(project)
+    if complete: # Index à jour : un projet ajouté ainsi qui n'y est plus a été supprimé de Bunny
+        for project_id in set(backfilled) - set(found) - pipeline:
+            catalog_store.delete(project_id)
+    if changed:
+        logging.info(f"   🐰 Catalog backfilled from Bunny: {len(changed)} project(s)")
+    return len(changed)
+
+def build():
+    """(version, contenu minifié, nombre de vidéos) du catalogue courant. La version ne dépend que des vidéos."""
+    videos = [e for e in (entry(p) for p in catalog_store.all_projects()) if e]
+    body = json.dumps(videos, separators=(",", ":"), ensure_ascii=False)
+    version = hashlib.sha256(body.encode()).hexdigest()[:16]
+    artifact = json.dumps({
+        "version": version,
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "videos": videos,
+    }, separators=(",", ":"), ensure_ascii=False)
+    return version, artifact, len(videos)
+
+def _published_version():
+    try:
+        return json.loads(config.CATALOG_ARTIFACT.read_text()).get("version")
+    except Exception:
+        return None
+
+def publish(force=False):
+    """Écrit et dépose le catalogue s'il a changé. Retourne la version publiée (None si inchangé ou échec)."""
+    version, artifact, count = build()
+    if not force and version == _published_version():
+        return None
+
+    if config.STORAGE_ZONE:
+        data = artifact.encode()
+        # Version immuable d'abord : catalog.json ne pointe jamais vers un état incomplet
+        for name in (f"catalog.{version}.json", "catalog.json"):
+            if not bunny_client.storage_put(f"{config.CATALOG_REMOTE_DIR}/{name}", data, "application/json"):
+                return None
+    else:
+        logging.warning("   ⚠️ Bunny Storage not configured (BUNNY_STORAGE_ZONE): catalog kept locally")
+
+    # Copie locale en dernier : sert de "dernière version publiée" (republication si l'upload a échoué)
+    tmp_path = config.CATALOG_ARTIFACT.with_suffix(".json.tmp")
+    tmp_path.write_text(artifact, encoding="utf-8")
+    tmp_path.replace(config.CATALOG_ARTIFACT)
+    logging.info(f"   🌐 Catalog published: {count} videos, version {version} ({len(artifact) // 1024} KB)")
+    return version
+
+def export_and_publish():
+    """Export JSON du catalogue (s'il a changé) puis publication de l'artefact du site (retentée si elle a échoué)."""
+    global _pending, _last_backfill
+    if time.time() - _last_backfill >= config.CATALOG_BACKFILL_INTERVAL:
+        _last_backfill = time.time()
+        try:
+            backfill()
+        except Exception as e:
+            logging.warning(f"   ⚠️ Catalog backfill failed: {e}")
+    exported = catalog_store.export_if_dirty()
+    if exported or _pending:
+        version, _, _ = build()
+        _pending = version != _published_version() and publish() is None
+    return exported
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    backfill()
+    publish(force="--force" in sys.argv)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Catalogue des projets publiés (SQLite en mode WAL).
+
+Chaque publication fait un upsert transactionnel d'une seule ligne : plus de
+relecture / réécriture complète de showcase_v2.json, et plusieurs workers
+peuvent publier en même temps sans perdre d'entrées.
+
+L'export du JSON compact consommé par le site est une étape séparée
+(export_json / export_if_dirty), appelée par le watcher en différé.
+
+Usage :
+    python catalog_store.py export   # Régénère showcase_v2.json
+"""
+import sys
+import json
+import sqlite3
+import logging
+import threading
+import config
+
+_local = threading.local()
+
+def _connect():
+    """Connexion SQLite du thread courant (créée et initialisée au premier appel)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+
+    config.CATALOG_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(config.CATALOG_DB), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS projects ("
+            " id TEXT PRIMARY KEY, is_private INTEGER, updated_at TEXT, data TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_projects_updated ON projects(updated_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # Première ouverture : on reprend le contenu de l'ancien showcase_v2.json
+        if conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone() is None:
+            _import_legacy(conn)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('version', '0'), ('exported_version', '0')")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _local.conn = conn
+    return conn
+
+def _import_legacy(conn):
+    try:
+        data = json.loads(config.DB_FILE.read_text())
+    except Exception:
+        return
+    for item in data:
+        if "id" in item:
+            _upsert(conn, item)
+    logging.info(f"   💾 Catalog imported {len(data)} items from {config.DB_FILE.name}")
+
+def _upsert(conn, project_data):
+    conn.execute(
+        "INSERT INTO projects (id, is_private, updated_at, data) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET is_private = excluded.is_private, "
+        "updated_at = excluded.updated_at, data = excluded.data",
+        (project_data["id"], int(bool(project_data.get("is_private"))),
+         project_data.get("updated_at", ""), json.dumps(project_data, separators=(",", ":")))
+    )
+
+def upsert(project_data):
+    """Insère ou remplace un projet (une transaction, commit atomique)."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _upsert(conn, project_data)
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def delete(project_id):
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def get(project_id):
+    row = _connect().execute("SELECT data FROM projects WHERE id = ?", (project_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def all_projects():
+    """Tous les projets, le plus récent d'abord (même ordre que l'ancien showcase_v2.json)."""
+    rows = _connect().execute("SELECT data FROM projects ORDER BY updated_at DESC").fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+def _meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return int(row[0]) if row else 0
+
+def export_json(path=None):
+    """Écrit le catalogue en JSON compact (fichier temporaire + rename atomique)."""
+    path = path or config.DB_FILE
+    conn = _connect()
+    # Lecture cohérente : version et contenu du même snapshot
+    conn.execute("BEGIN")
+    try:
+        version = _meta(conn, "version")
+        rows = conn.execute("SELECT data FROM projects ORDER BY updated_at DESC").fetchall()
+    finally:
+        conn.execute("COMMIT")
+
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text("[" + ",".join(r[0] for r in rows) + "]")
+    tmp_path.replace(path)
+
+    conn.execute("UPDATE meta SET value = ? WHERE key = 'exported_version'", (str(version),))
+    logging.info(f"   💾 Catalog exported ({len(rows)} items) -> {path.name}")
+    return len(rows)
+
+def export_if_dirty(path=None):
+    """Exporte seulement si des upserts ont eu lieu depuis le dernier export."""
+    conn = _connect()
+    if _meta(conn, "version") == _meta(conn, "exported_version"):
+        return False
+    export_json(path)
+    return True
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "export"
+    if cmd == "export":
+        export_json()
+    else:
+        print("Usage: python catalog_store.py export")
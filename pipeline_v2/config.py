@@ -29,25 +29,238 @@ FFPROBE = get_tool("ffprobe")
 WHISPER = get_tool("whisper")
 
 # --- BUNNY.NET ---
+# Source unique des identifiants Bunny pour tous les scripts (via bunny_client.py).
+# Les variables d'environnement / .env (mêmes noms que sur Vercel) ont priorité.
+try:
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / ".env")
+except ImportError:
+    pass
+
 # Stream Library IDs
-LIB_PUBLIC = "581630"
-LIB_PRIVATE = "552081"
+LIB_PUBLIC = os.getenv("BUNNY_LIBRARY_ID", "581630")
+LIB_PRIVATE = os.getenv("BUNNY_PRIVATE_LIBRARY_ID", "552081")
 
 # API Keys (Récupérées de l'ancien système)
-API_KEY_PUBLIC = "7b43d33b-576e-4890-8fb1dae4d73d-9663-4f27"
-API_KEY_PRIVATE = "202d4df5-5617-4738-9c82a7cae508-e3c5-48ef" # Key from config.private.json
+API_KEY_PUBLIC = os.getenv("BUNNY_ACCESS_KEY", "7b43d33b-576e-4890-8fb1dae4d73d-9663-4f27")
+API_KEY_PRIVATE = os.getenv("BUNNY_PRIVATE_ACCESS_KEY", "202d4df5-5617-4738-9c82a7cae508-e3c5-48ef") # Key from config.private.json
 
 # Pull Zones (Pour lecture Web)
-PULL_ZONE_PUBLIC = "https://vz-72668a20-6b9.b-cdn.net"
-PULL_ZONE_PRIVATE = "https://vz-c69f4e3f-963.b-cdn.net"
+PULL_ZONE_PUBLIC = os.getenv("BUNNY_PULL_ZONE", "https://vz-72668a20-6b9.b-cdn.net")
+PULL_ZONE_PRIVATE = os.getenv("BUNNY_PRIVATE_PULL_ZONE", "https://vz-c69f4e3f-963.b-cdn.net")
+
+# Bunny Storage (visuels statiques à côté des vidéos : posters, previews, sprites)
+STORAGE_ZONE = os.getenv("BUNNY_STORAGE_ZONE", "")
+STORAGE_KEY = os.getenv("BUNNY_STORAGE_KEY", "")  # Mot de passe de la zone (header AccessKey)
+STORAGE_ENDPOINT = os.getenv("BUNNY_STORAGE_ENDPOINT", "https://storage.bunnycdn.com")  # Selon la région
+STORAGE_PULL_ZONE = os.getenv("BUNNY_STORAGE_PULL_ZONE", "")  # URL CDN de la zone
+STORAGE_PREFIX = "assets"
+
+# Client HTTP partagé (bunny_client.py)
+BUNNY_API_BASE = "https://video.bunnycdn.com"
+BUNNY_POOL_SIZE = 16           # Connexions keep-alive max par hôte
+BUNNY_TIMEOUT = (5, 60)        # (connexion, lecture) en secondes
+BUNNY_MAX_RETRIES = 5          # Tentatives sur 429 / 5xx / coupure réseau
+BUNNY_PAGE_WORKERS = 4         # Pages de liste récupérées en parallèle
+
+# Index local titre -> guid (bunny_index.py)
+BUNNY_INDEX_DIR = BASE_DIR / ".cache"
+BUNNY_INDEX_MAX_AGE = 300           # Synchro incrémentale si l'index a plus de 5 min
+BUNNY_INDEX_FULL_SYNC = 24 * 3600   # Synchro complète (détecte les suppressions) 1x/jour
+BUNNY_INDEX_REFRESH_MARGIN = 3600   # Relit la dernière heure (statut d'encodage)
+
+# --- PROBE (probe_v2.py) ---
+# Cache des métadonnées ffprobe, clé (path, taille, mtime)
+PROBE_CACHE = BASE_DIR / ".cache" / "probe_cache.sqlite"
 
 # --- VERCEL / DATA ---
 # Le fichier JSON central qui sert de base de données pour le site
 # NOTE : On va utiliser un seul fichier "showcase.json" qui contiendra tout (public et privé)
 # avec un flag "is_private". Cela simplifie grandement la logique Vercel.
 DB_FILE = BASE_DIR / "showcase_v2.json"
+# Source de vérité transactionnelle (catalog_store.py) : DB_FILE n'en est qu'un export
+CATALOG_DB = BASE_DIR / "catalog_v2.sqlite"
+CATALOG_EXPORT_INTERVAL = 10  # Le watcher regroupe les exports JSON (s)
+# Catalogue publié pour le site (catalog_publish.py) : groupé par projet, minifié, versionné par hash.
+# Copie locale + Bunny Storage (CATALOG_REMOTE_DIR/catalog.json, servi par api/get-videos.js via CATALOG_URL)
+CATALOG_ARTIFACT = BASE_DIR / "catalog.json"
+CATALOG_REMOTE_DIR = "catalog"
+CATALOG_BACKFILL_INTERVAL = 600  # Vidéos Bunny absentes du catalogue (uploads hors pipeline) ajoutées toutes les 10 min
+
+# Inventaire humain : ledger append-only, INVENTORY.xlsx régénéré en lot
+INVENTORY_LEDGER = BASE_DIR / "inventory_ledger.csv"
+INVENTORY_EXCEL_DEBOUNCE = 300  # Au plus une régénération Excel toutes les 5 min
 
 # --- WORKER SETTINGS ---
 # Formats à générer (Standard Web)
 FORMATS = ["16x9", "9x16", "1x1"]
 DEFAULT_LANGS = ["fr", "en"]
+
+# --- WHISPER (Service résident) ---
+# Le modèle est chargé une seule fois par transcriber_v2.py, puis partagé
+# par le watcher et tous les workers via un socket local.
+WHISPER_MODEL = "base"  # "base" est un bon compromis vitesse/précision
+WHISPER_THREADS = 4     # Threads CPU alloués à torch dans le service
+# "vad" : audio découpé aux silences, fenêtres transcrites en parallèle (mémoire bornée)
+# "full" : tout l'audio d'un coup dans un seul modèle (comportement historique)
+TRANSCRIBE_MODE = "vad"
+TRANSCRIBE_WORKERS = 2          # Process Whisper parallèles (un modèle chacun, WHISPER_THREADS répartis)
+TRANSCRIBE_CHUNK_SECONDS = 60   # Durée max d'une fenêtre envoyée à un worker
+# VAD par énergie (vad_v2.py), sur l'audio déjà normalisé
+VAD_FRAME_MS = 30
+VAD_THRESHOLD_DBFS = -45        # Au-dessus : parole
+VAD_MIN_SILENCE = 0.5           # Pauses plus courtes comblées (s)
+VAD_MIN_SPEECH = 0.3            # Zones plus courtes ignorées (s)
+VAD_PAD = 0.2                   # Marge autour de chaque zone (s)
+VAD_DROP_GAP = 2.0              # Silences plus longs retirés de la transcription (s)
+TRANSCRIBER_ADDRESS = ("127.0.0.1", 6001)
+TRANSCRIBER_AUTHKEY = b"chaud-devant-whisper"
+
+# --- SCHEDULER (Pools par étape) ---
+# Nombre de jobs simultanés par étape du pipeline (voir scheduler_v2.py)
+STAGE_CONCURRENCY = {
+    "audio": 2,       # ffmpeg afftdn + loudnorm (CPU léger)
+    "captions": 1,    # Le service Whisper sérialise de toute façon
+    "probe": 2,       # ffprobe (quasi instantané)
+    "analysis": 2,    # Encodages test basse résolution (quelques secondes)
+    "encode": 1,      # libx264 utilise déjà plusieurs coeurs
+    "upload": 2,      # Réseau
+}
+SCHEDULER_STATS_INTERVAL = 60  # Secondes entre deux logs de stats
+
+# --- ADMISSION (admission_v2.py) ---
+# Une étape ne démarre que si la machine a la mémoire, le CPU et le disque pour elle
+ADMISSION = True
+ADMISSION_CPU_STAGES = ("audio", "analysis", "encode")  # Étapes ffmpeg qui se partagent les cœurs
+ADMISSION_MAX_LOAD = 1.5            # Load average (1 min) par cœur au-delà duquel une étape CPU attend
+ADMISSION_MEMORY_RESERVE_MB = 1024  # Mémoire laissée au système
+ADMISSION_STAGE_MEMORY_MB = {"audio": 300, "captions": 0, "probe": 50, "analysis": 300, "encode": 1500, "upload": 200}
+WHISPER_MEMORY_MB = 1500            # Mémoire de travail d'une transcription, par worker Whisper (TRANSCRIBE_WORKERS)
+ADMISSION_DISK_FACTOR = {"audio": 0.1, "encode": 1.5}  # Disque nécessaire = taille du master x facteur
+ADMISSION_RAMP_SECONDS = 30         # Une étape admise compte "réservée" le temps d'allouer sa mémoire
+ADMISSION_MAX_WAIT = 900            # Au-delà : l'étape part quand même (CPU / mémoire) ou échoue (disque)
+ADMISSION_POLL_INTERVAL = 5
+ADMISSION_LOG = BASE_DIR / "admission_log.jsonl"  # Une ligne par décision (pour régler les limites)
+
+# --- SCRATCH (scratch_v2.py) ---
+# Fichiers intermédiaires (segments d'encodage...) sur un volume rapide (NVMe local, tmpfs), pas dans production/
+SCRATCH_DIR = Path(os.getenv("PIPELINE_SCRATCH_DIR", str(BASE_DIR / ".cache" / "scratch")))
+SCRATCH_BUDGET_GB = float(os.getenv("PIPELINE_SCRATCH_BUDGET_GB", "50"))  # Total réservé par toutes les étapes
+SCRATCH_MARGIN = 1.2       # Estimation des octets écrits x marge
+SCRATCH_MAX_WAIT = 600     # Au-delà (ou si l'étape dépasse le budget à elle seule) : dossier temp/ du projet
+
+# --- FILE DE JOBS (job_queue.py) ---
+JOB_QUEUE_DB = BASE_DIR / "job_queue.sqlite"
+QUEUE_PRIORITY_PRIVATE = 0     # Plus petit = servi plus tôt (clients avant portfolio)
+QUEUE_PRIORITY_PUBLIC = 10
+QUEUE_MAX_ATTEMPTS = 3         # Au-delà : état "failed" (retry_stuck.py pour relancer)
+QUEUE_RETRY_DELAY = 300        # Délai avant nouvelle tentative (x nombre de tentatives), en s
+QUEUE_MAX_IN_FLIGHT = 4        # Jobs dans le scheduler en même temps (le reste attend dans la file, par priorité)
+
+# --- MULTI-MACHINES (coordinator_v2.py) ---
+# Une machine lance le coordinateur (détection + file), les autres "node" et prennent des jobs en bail.
+# Local par défaut : pour des nodes sur d'autres machines, PIPELINE_COORDINATOR_HOST=0.0.0.0 ET un token (sinon refus de démarrer)
+COORDINATOR_ADDRESS = (os.getenv("PIPELINE_COORDINATOR_HOST", "127.0.0.1"), int(os.getenv("PIPELINE_COORDINATOR_PORT", "9110")))
+COORDINATOR_URL = os.getenv("PIPELINE_COORDINATOR_URL", "http://127.0.0.1:9110")  # Vu depuis les nodes
+COORDINATOR_TOKEN = os.getenv("PIPELINE_COORDINATOR_TOKEN", "")  # Secret partagé (header X-Pipeline-Token)
+LEASE_SECONDS = 120            # Bail d'un job : sans heartbeat pendant ce délai, il repart en file
+HEARTBEAT_INTERVAL = 30        # Un node prolonge ses baux toutes les 30 s
+# Un node sans heartbeat réussi depuis LEASE_SECONDS - NODE_LEASE_MARGIN annule ses jobs,
+# avant que le coordinateur ne puisse les redonner à un autre node
+NODE_LEASE_MARGIN = 45
+NODE_MAX_IN_FLIGHT = 2         # Jobs en même temps sur un node
+NODE_POLL_INTERVAL = 10        # Attente entre deux /claim sans résultat
+# Chemins vus par le coordinateur -> chemins sur le node (partage monté ailleurs), ex. "/Volumes/prod=/mnt/prod"
+NODE_PATH_MAP = dict(
+    pair.split("=", 1) for pair in os.getenv("PIPELINE_NODE_PATH_MAP", "").split(";") if "=" in pair
+)
+
+# --- METRICS (metrics_v2.py) ---
+# Endpoint texte Prometheus servi par le watcher (GET /metrics)
+METRICS_ADDRESS = ("127.0.0.1", 9105)
+
+# --- BENCHMARK (bench_v2.py) ---
+BENCH_DIR = BASE_DIR / ".cache" / "bench"      # Masters synthétiques + projets de test
+BENCH_HISTORY = BASE_DIR / "bench_history.json"
+BENCH_BASELINE_RUNS = 5                        # Référence = médiane des 5 derniers runs (même machine)
+# Régression si valeur > référence x seuil
+BENCH_THRESHOLDS = {"wall_s": 1.20, "cpu_s": 1.20, "peak_rss_bytes": 1.25}
+
+# --- INGEST (watcher) ---
+STABLE_QUIET_SECONDS = 5     # Un fichier est "prêt" après 5 s sans changement de taille/mtime
+WATCH_TICK = 0.5             # Fréquence des contrôles de stabilité (stat seulement)
+WATCH_POLL_INTERVAL = 2      # Rescan des dossiers sans watchdog (polling)
+WATCH_RESCAN_INTERVAL = 30   # Rescan de sécurité avec watchdog (événements manqués)
+
+# --- ENCODAGE ---
+# Dimensions cibles de chaque format
+FORMAT_SIZES = {
+    "16x9": (1920, 1080),
+    "9x16": (1080, 1920),
+    "1x1": (1080, 1080),
+}
+# True : un seul décodage du master -> tous les formats activés dans le même ffmpeg
+# False : seulement le format détecté (comportement historique)
+MULTI_FORMAT_ENCODE = True
+ENCODE_PRESET = "fast"
+# Encodage par segments (masters longs) : découpe aux keyframes, N ffmpeg en parallèle,
+# puis concaténation sans ré-encodage. 1 = désactivé.
+ENCODE_CHUNKS = 4
+ENCODE_CHUNK_MIN_SECONDS = 600  # En dessous, un seul ffmpeg suffit
+
+# Fast path : master déjà conforme à un format cible -> remux (-c:v copy), seul l'audio propre est ajouté
+STREAM_COPY = True
+STREAM_COPY_CODECS = {"h264"}
+STREAM_COPY_PROFILES = {"Constrained Baseline", "Baseline", "Main", "High"}
+STREAM_COPY_PIX_FMTS = {"yuv420p", "yuvj420p"}
+STREAM_COPY_BITRATE_TOLERANCE = 1.25  # Débit vidéo max = borne haute du format (BITRATE_BOUNDS) x 1.25
+
+# Suivi des process ffmpeg (runner_v2.py)
+FFMPEG_TIMEOUT = 6 * 3600           # Durée max d'une commande ffmpeg (s)
+FFMPEG_STALL_TIMEOUT = 300          # Tuée si aucune progression pendant 5 min
+FFMPEG_STDERR_LINES = 200           # Lignes de stderr gardées pour les erreurs
+FFMPEG_PROGRESS_LOG_INTERVAL = 30   # Une ligne de progression toutes les 30 s
+FFMPEG_POLL_INTERVAL = 0.1
+
+# --- DÉBIT ADAPTATIF (étape analysis) ---
+# Quelques fenêtres du master sont encodées en basse résolution à CRF fixe :
+# le débit obtenu mesure la complexité (talking head statique << plan en mouvement).
+ANALYSIS_WINDOWS = 3            # Nombre de fenêtres échantillonnées
+ANALYSIS_WINDOW_SECONDS = 4     # Durée de chaque fenêtre
+ANALYSIS_WIDTH = 640            # Largeur des encodages test
+ANALYSIS_CRF = 23
+ANALYSIS_PRESET = "veryfast"
+# Débit cible = débit test x (pixels cible / pixels test) ^ EXPONENT x QUALITY_FACTOR
+ANALYSIS_SCALE_EXPONENT = 0.75  # Le débit ne croît pas linéairement avec la résolution
+ANALYSIS_QUALITY_FACTOR = 1.5   # Marge de qualité par rapport au CRF de test
+# Bornes de débit par format (kbps) : min, max
+BITRATE_BOUNDS = {
+    "16x9": (1500, 8000),
+    "9x16": (1500, 8000),
+    "1x1": (1200, 6000),
+}
+DEFAULT_BITRATE = 8000          # kbps, si l'analyse échoue (comportement historique)
+
+# --- VISUELS (assets_v2.py) ---
+# Produits par le décodage de l'étape encode, envoyés sur Bunny Storage
+ASSETS = True
+ASSETS_PRIVATE = False     # Projets privés : pas de visuels publics (vignettes signées de Bunny Stream)
+POSTER_COUNT = 3           # Candidats répartis sur la durée, le plus détaillé devient le poster
+POSTER_WIDTH = 1280
+PREVIEW_SECONDS = 4        # Boucle muette pour le survol des cartes
+PREVIEW_AT = 0.3           # Position dans la vidéo (fraction de la durée)
+PREVIEW_WIDTH = 480
+PREVIEW_FPS = 24
+PREVIEW_CRF = 30
+SPRITE_INTERVAL = 5        # Une vignette toutes les 5 s (aperçu de la barre de lecture)
+SPRITE_WIDTH = 160
+SPRITE_COLUMNS = 10        # Vignettes par planche : 10 x 10
+SPRITE_ROWS = 10
+
+# --- UPLOAD (TUS résumable) ---
+TUS_ENDPOINT = f"{BUNNY_API_BASE}/tusupload"
+TUS_SIGNATURE_TTL = 24 * 3600          # Validité de la signature d'upload (s)
+UPLOAD_CHUNK_SIZE = 32 * 1024 * 1024   # Taille d'un PATCH TUS
+UPLOAD_PARALLEL_CHUNKS = 4             # Parties envoyées en parallèle (si concatenation supportée)
+UPLOAD_CHUNK_TIMEOUT = 300             # Timeout d'un morceau (s)
+UPLOAD_MAX_RETRIES = 5                 # Tentatives par morceau avant abandon
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Mode multi-machines : un coordinateur, N nodes d'encodage.
+
+- Le coordinateur (une seule machine) détecte les exports comme le watcher et
+  tient la file de jobs (job_queue.py). Il sert une petite API HTTP aux nodes
+  et publie le catalogue quand un job est terminé.
+- Un node (chaque machine d'encodage, y compris celle du coordinateur si elle
+  doit encoder) prend des jobs en bail via /claim, les passe dans son propre
+  StageScheduler et prolonge ses baux par /heartbeat (avec l'étape en cours).
+- Un node mort ou coupé du réseau n'envoie plus de heartbeat : son bail expire
+  (LEASE_SECONDS) et le job repart en file pour un autre node. Un node qui perd
+  un bail, ou qui ne joint plus le coordinateur jusqu'à NODE_LEASE_MARGIN avant
+  son expiration, annule le job (ffmpeg tué, upload arrêté entre deux morceaux) :
+  un projet n'est jamais traité par deux machines à la fois.
+
+Les dossiers production/ sont partagés (NAS) ; NODE_PATH_MAP traduit les chemins
+du coordinateur en chemins locaux du node.
+
+API (header X-Pipeline-Token = COORDINATOR_TOKEN) :
+    POST /claim      {"worker", "limit"}                     -> {"jobs": [...]}
+    POST /heartbeat  {"worker", "jobs": {project_id: stage}} -> {"lost": [project_id, ...]}
+    POST /done       {"worker", "project_id", "result", "timings"}
+    POST /failed     {"worker", "project_id", "error"}
+    GET  /status     -> compteurs de la file + jobs en cours (node, étape, bail)
+
+Usage :
+    python coordinator_v2.py serve
+    python coordinator_v2.py node [--worker NAME] [--url http://coordinator:9110]
+"""
+import sys
+import hmac
+import json
+import time
+import socket
+import logging
+import argparse
+import ipaddress
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+import config
+import job_queue
+import catalog_publish
+import inventory_ledger
+import metrics_v2
+import transcriber_v2
+import scratch_v2
+from scheduler_v2 import StageScheduler
+from worker_v2 import update_db
+from watcher_v2 import Detector, setup_logging, start_job
+
+TOKEN_HEADER = "X-Pipeline-Token"
+REPORT_RETRIES = 5  # Tentatives d'envoi de /done et /failed avant d'abandonner (le bail expirera)
+HEARTBEAT_TIMEOUT = 10  # Un heartbeat lent ne doit pas consommer la marge du bail
+
+# --- COORDINATEUR ---
+
+def is_loopback(host):
+    """True si `host` (adresse d'écoute ou du client) ne sort pas de la machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def handle_claim(body):
+    jobs = job_queue.claim(int(body.get("limit", 1)), worker=body["worker"], lease_s=config.LEASE_SECONDS)
+    for job in jobs:
+        logging.info(f"   📤 Leased {job['project_id']} to {body['worker']} (attempt {job['attempts']})")
+    return {"jobs": jobs}
+
+def handle_heartbeat(body):
+    lost = [
+        project_id for project_id, stage in body.get("jobs", {}).items()
+        if not job_queue.heartbeat(project_id, body["worker"], stage)
+    ]
+    for project_id in lost:
+        logging.warning(f"   ⚠️ {body['worker']} lost the lease on {project_id}")
+    return {"lost": lost}
+
+def handle_done(body):
+    project_id, worker = body["project_id"], body["worker"]
+    job = job_queue.get(project_id)
+    if not job or job["state"] != "running" or job["worker"] != worker:
+        logging.warning(f"   ⚠️ Ignoring result of {project_id} from {worker} (lease lost)")
+        return {"accepted": False}
+    # Publication centralisée : un seul écrivain pour le catalogue et le ledger
+    update_db(body["result"])
+    inventory_ledger.record(body["result"], body.get("timings", {}))
+    accepted = job_queue.mark_done(project_id, worker)
+    logging.info(f"✅ DONE: {project_id} on {worker} | {body.get('timings')}")
+    return {"accepted": accepted}
+
+def handle_failed(body):
+    state = job_queue.mark_failed(body["project_id"], body.get("error", ""), worker=body["worker"])
+    if state:
+        logging.error(f"❌ FAILED: {body['project_id']} on {body['worker']} | {body.get('error')}")
+    return {"state": state}
+
+def handle_status():
+    running = [
+        {k: j[k] for k in ("project_id", "worker", "stage", "attempts", "lease_until")}
+        for j in job_queue.jobs("running")
+    ]
+    return {"counts": job_queue.counts(), "running": running}
+
+ROUTES = {
+    "/claim": handle_claim,
+    "/heartbeat": handle_heartbeat,
+    "/done": handle_done,
+    "/failed": handle_failed,
+}
+
+class _Handler(BaseHTTPRequestHandler):
+    def _authorized(self):
+        token = self.headers.get(TOKEN_HEADER, "")
+        # Sans token configuré : clients locaux seulement (un token vide "correspondrait" à tout le monde)
+        if config.COORDINATOR_TOKEN:
+            if hmac.compare_digest(token.encode(), config.COORDINATOR_TOKEN.encode()):
+                return True
+        elif is_loopback(self.client_address[0]):
+            return True
+        self.send_error(403)
+        return False
+
+    def _reply(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path.split("?")[0] != "/status":
+            self.send_error(404)
+            return
+        self._reply(handle_status())
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        route = ROUTES.get(self.path.split("?")[0])
+        if route is None:
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not body.get("worker"):
+                self.send_error(400, "missing worker")
+                return
+            self._reply(route(body))
+        except (ValueError, KeyError) as e:
+            self.send_error(400, str(e))
+        except Exception as e:
+            logging.error(f"   🔥 Coordinator error on {self.path}: {e}")
+            self.send_error(500, str(e))
+
+    def log_message(self, *args):
+        pass # Heartbeats toutes les 30 s par node : pas de log par requête
+
+def serve():
+    setup_logging("coordinator_v2.log")
+    address = config.COORDINATOR_ADDRESS
+    logging.info("🛰️ COORDINATOR V2 STARTED")
+    logging.info(f"   API: http://{address[0]}:{address[1]} | lease {config.LEASE_SECONDS}s")
+    if not config.COORDINATOR_TOKEN:
+        # /done publie le "result" reçu dans le catalogue : pas d'API ouverte sur le réseau
+        if not is_loopback(address[0]):
+            logging.error(f"   ❌ Refusing to listen on {address[0]} without PIPELINE_COORDINATOR_TOKEN")
+            return 1
+        logging.warning("   ⚠️ PIPELINE_COORDINATOR_TOKEN is empty: only local nodes can connect")
+
+    config.PRODUCTION_PUBLIC.mkdir(parents=True, exist_ok=True)
+    config.PRODUCTION_PRIVATE.mkdir(parents=True, exist_ok=True)
+    job_queue.recover()
+    logging.info(f"   📋 Job queue: {job_queue.counts()}")
+    # temp/ de repli laissés par des jobs interrompus (ceux encore en bail sur un node sont gardés)
+    leased = {j["project_id"] for j in job_queue.jobs("running")}
+    scratch_v2.cleanup([config.PRODUCTION_PUBLIC, config.PRODUCTION_PRIVATE], busy=leased)
+
+    server = ThreadingHTTPServer(address, _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    detector = Detector()
+    last_export = time.time()
+    while True:
+        try:
+            detector.tick()
+            job_queue.expire_leases()
+
+            if time.time() - last_export >= config.CATALOG_EXPORT_INTERVAL:
+                catalog_publish.export_and_publish()
+                inventory_ledger.materialize_if_stale()
+                last_export = time.time()
+        except Exception as e:
+            logging.error(f"🔥 CRITICAL COORDINATOR ERROR: {e}")
+            time.sleep(5)
+
+# --- NODE ---
+
+def map_path(path):
+    """Chemin vu par le coordinateur -> chemin local (NODE_PATH_MAP, préfixe le plus long d'abord)."""
+    for src in sorted(config.NODE_PATH_MAP, key=len, reverse=True):
+        if path.startswith(src):
+            return config.NODE_PATH_MAP[src] + path[len(src):]
+    return path
+
+class Node:
+    """Client d'un node : prend des jobs en bail, les exécute localement, rend compte au coordinateur."""
+
+    def __init__(self, worker, url):
+        self.worker = worker
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+        self.session.headers[TOKEN_HEADER] = config.COORDINATOR_TOKEN
+        self.scheduler = StageScheduler(on_done=self.on_done)
+        self.last_renewal = time.time()  # Envoi du dernier heartbeat accepté : les baux courent au moins jusqu'à +LEASE_SECONDS
+
+    def lease_deadline(self):
+        """Instant où le node abandonne ses baux sans nouvelle du coordinateur (marge avant leur expiration)."""
+        return self.last_renewal + config.LEASE_SECONDS - config.NODE_LEASE_MARGIN
+
+    def call(self, path, payload, retries=1, timeout=30):
+        """POST JSON au coordinateur ; None si injoignable après `retries` tentatives."""
+        for attempt in range(retries):
+            try:
+                r = self.session.post(f"{self.url}{path}", json={"worker": self.worker, **payload}, timeout=timeout)
+                r.raise_for_status()
+                return r.json()
+            except (requests.RequestException, ValueError) as e:
+                logging.warning(f"   ⚠️ Coordinator {path} failed ({attempt + 1}/{retries}): {e}")
+                if attempt + 1 < retries:
+                    time.sleep(min(2 ** attempt, 30))
+        return None
+
+    def report_failed(self, project_id, error):
+        self.call("/failed", {"project_id": project_id, "error": error}, retries=REPORT_RETRIES)
+
+    def on_done(self, job, success):
+        if job["cancel"].is_set():
+            return # Bail perdu : le job appartient déjà à un autre node
+        if success:
+            logging.info(f"✅ DONE: {job['project_id']} | {job['timings']}")
+            reply = self.call("/done", {
+                "project_id": job["project_id"], "result": job["result_data"], "timings": job["timings"]
+            }, retries=REPORT_RETRIES)
+            if reply is None:
+                logging.error(f"   ❌ Could not report {job['project_id']}: it will be re-run after lease expiry")
+        else:
+            logging.error(f"❌ FAILED: {job['project_id']} | {job['timings']}")
+            last_stage = next(reversed(job["timings"]), "prepare")
+            self.report_failed(job["project_id"], f"failed at {last_stage} on {self.worker}")
+
+    def heartbeat_loop(self):
+        while True:
+            # Prochain heartbeat, ou plus tôt si l'échéance locale du bail tombe avant
+            time.sleep(max(1, min(config.HEARTBEAT_INTERVAL, self.lease_deadline() - time.time())))
+            running = self.scheduler.stages_in_flight()
+            if not running:
+                self.last_renewal = time.time()
+                continue
+            sent = time.time()  # Le coordinateur prolonge à réception : jamais avant l'envoi
+            reply = self.call("/heartbeat", {"jobs": running}, timeout=HEARTBEAT_TIMEOUT)
+            if reply is not None:
+                self.last_renewal = sent
+                for project_id in reply.get("lost", []):
+                    self.scheduler.cancel(project_id)
+            elif time.time() >= self.lease_deadline():
+                # Les baux expirent dans moins de NODE_LEASE_MARGIN : on s'arrête avant qu'un autre node ne reprenne
+                logging.error("   🔌 Coordinator unreachable, lease about to expire: cancelling local jobs")
+                for project_id in running:
+                    self.scheduler.cancel(project_id)
+
+    def run(self):
+        threading.Thread(target=self.heartbeat_loop, daemon=True).start()
+        while True:
+            try:
+                free = config.NODE_MAX_IN_FLIGHT - len(self.scheduler.in_flight())
+                reply = self.call("/claim", {"limit": free}) if free > 0 else None
+                rows = reply["jobs"] if reply else []
+                for row in rows:
+                    row["prod_dir"] = map_path(row["prod_dir"])
+                    row["video_path"] = map_path(row["video_path"])
+                    start_job(row, self.scheduler, self.report_failed, node=True)
+                if not rows:
+                    time.sleep(config.NODE_POLL_INTERVAL)
+            except Exception as e:
+                logging.error(f"🔥 CRITICAL NODE ERROR: {e}")
+                time.sleep(5)
+
+def node(worker, url):
+    setup_logging("node_v2.log")
+    logging.info(f"🛠️ NODE V2 STARTED: {worker} -> {url}")
+    scratch_v2.cleanup()
+    transcriber_v2.ensure_service()
+    node = Node(worker, url)
+    metrics_v2.register_collector(lambda: metrics_v2.scheduler_lines(node.scheduler))
+    metrics_v2.start_server()
+    node.run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-node pipeline: coordinator or encode node")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("serve", help="Detect projects, lease jobs to nodes, publish results")
+    p_node = sub.add_parser("node", help="Pull leased jobs from the coordinator and process them")
+    p_node.add_argument("--worker", default=socket.gethostname(), help="Node name (unique per machine)")
+    p_node.add_argument("--url", default=config.COORDINATOR_URL, help="Coordinator base URL")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        return serve()
+    else:
+        node(args.worker, args.url)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
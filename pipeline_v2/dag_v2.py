@@ -0,0 +1,115 @@
+"""
+Empreintes des étapes du pipeline (audio, captions, probe, analysis, encode, upload).
+
+Chaque étape calcule une empreinte de ses entrées : empreinte du master,
+empreintes des étapes amont et clés de config qui la concernent. Après un
+succès, l'empreinte et les sorties sont gardées dans status.json["stages"].
+Au lancement suivant, une étape dont l'empreinte n'a pas changé (et dont les
+fichiers de sortie existent encore) est sautée et ses sorties sont restaurées :
+changer la clé Bunny ne relance plus que l'upload, pas Whisper.
+"""
+import json
+import hashlib
+from pathlib import Path
+from datetime import datetime
+
+SAMPLE_SIZE = 1024 * 1024
+
+def _sha(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def master_fingerprint(path, cached=None):
+    """
+    Empreinte du master : taille + sha256 de 3 blocs (début, milieu, fin).
+    Hasher un master de plusieurs Go en entier coûterait plus cher que certaines étapes ;
+    le résultat est réutilisé tant que (path, taille, mtime) ne change pas.
+    """
+    st = path.stat()
+    identity = {"path": str(path), "size": st.st_size, "mtime": int(st.st_mtime)}
+    if cached and all(cached.get(k) == v for k, v in identity.items()) and cached.get("hash"):
+        return cached
+
+    h = hashlib.sha256(str(st.st_size).encode())
+    with open(path, "rb") as f:
+        for offset in (0, st.st_size // 2, max(st.st_size - SAMPLE_SIZE, 0)):
+            f.seek(offset)
+            h.update(f.read(SAMPLE_SIZE))
+    return {**identity, "hash": h.hexdigest()}
+
+def stage_fingerprint(job, name, upstream, stage_config):
+    """Empreinte d'une étape = master + empreintes amont + config de l'étape."""
+    inputs = {
+        "master": job["status"]["master"]["hash"],
+        "upstream": {up: job["stage_fps"].get(up) for up in upstream},
+        "config": stage_config
+    }
+    return _sha(inputs)
+
+# --- SORTIES ---
+
+def _dump(value):
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: _dump(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_dump(v) for v in value]
+    return value
+
+def _load(value):
+    if isinstance(value, str):
+        return Path(value)
+    if isinstance(value, dict):
+        return {k: _load(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_load(v) for v in value]
+    return value
+
+def _paths(value):
+    if isinstance(value, Path):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _paths(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _paths(v)
+
+def restore(job, name, fingerprint, output_keys, path_keys):
+    """
+    Si l'étape a déjà tourné avec la même empreinte et que ses fichiers existent,
+    remet ses sorties dans `job` et retourne True (étape à sauter).
+    """
+    record = job["status"].get("stages", {}).get(name)
+    if not record or record.get("fingerprint") != fingerprint:
+        return False
+
+    outputs = {}
+    for key in output_keys:
+        if key not in record.get("outputs", {}):
+            return False
+        value = record["outputs"][key]
+        outputs[key] = _load(value) if key in path_keys else value
+
+    if not all(p.exists() for key in path_keys if key in outputs for p in _paths(outputs[key])):
+        return False
+
+    job.update(outputs)
+    return True
+
+def record(job, name, fingerprint, output_keys):
+    """
+    Garde l'empreinte et les sorties d'une étape réussie.
+    Retourne False (rien d'enregistré) si une sortie manque, ex: audio en fallback :
+    l'étape sera retentée au prochain lancement.
+    """
+    outputs = {key: job.get(key) for key in output_keys}
+    if not all(outputs.values()):
+        job["status"].setdefault("stages", {}).pop(name, None)
+        return False
+    job["status"].setdefault("stages", {})[name] = {
+        "fingerprint": fingerprint,
+        "outputs": _dump(outputs),
+        "at": datetime.utcnow().isoformat() + "Z"
+    }
+    return True
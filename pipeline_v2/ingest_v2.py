@@ -0,0 +1,96 @@
+"""
+Détection des nouveaux exports, sans bloquer la boucle du watcher.
+
+- Les événements fichiers (inotify sur Linux, FSEvents sur macOS via `watchdog`)
+  réveillent le watcher dès qu'un fichier bouge. Sans `watchdog`, on retombe
+  sur un rescan périodique.
+- StabilityTracker suit taille + mtime de chaque candidat en parallèle : chaque
+  fichier est promu "prêt" dès que SA propre période de calme est écoulée,
+  sans `sleep` et sans attendre les autres.
+"""
+import time
+import logging
+from pathlib import Path
+import config
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+class StabilityTracker:
+    """Suivi non bloquant de la stabilité (taille + mtime) des fichiers candidats."""
+
+    def __init__(self, quiet_seconds=None):
+        self.quiet_seconds = config.STABLE_QUIET_SECONDS if quiet_seconds is None else quiet_seconds
+        self._entries = {}  # clé -> {path, size, mtime, first_seen, last_change}
+
+    def observe(self, key, path):
+        """Enregistre l'état courant de `path`. True si le fichier est stable (et non vide) depuis quiet_seconds."""
+        now = time.time()
+        try:
+            st = path.stat()
+        except OSError:
+            self._entries.pop(key, None)
+            return False
+
+        entry = self._entries.get(key)
+        if entry is None or entry["path"] != path:
+            self._entries[key] = {
+                "path": path, "size": st.st_size, "mtime": st.st_mtime,
+                "first_seen": now, "last_change": now
+            }
+            return False
+
+        if (st.st_size, st.st_mtime) != (entry["size"], entry["mtime"]):
+            entry.update(size=st.st_size, mtime=st.st_mtime, last_change=now)
+            return False
+
+        return st.st_size > 0 and now - entry["last_change"] >= self.quiet_seconds
+
+    def first_seen(self, key):
+        entry = self._entries.get(key)
+        return entry["first_seen"] if entry else None
+
+    def forget(self, key):
+        self._entries.pop(key, None)
+
+    def prune(self, alive_keys):
+        """Oublie les candidats qui ont disparu du dernier scan."""
+        for key in list(self._entries):
+            if key not in alive_keys:
+                del self._entries[key]
+
+# Dossiers écrits par le pipeline lui-même : leurs événements ne concernent pas l'ingest
+IGNORED_DIRS = {"output", "temp", "logs"}
+
+class _WakeHandler(FileSystemEventHandler):
+    def __init__(self, wake):
+        self.wake = wake
+
+    def on_any_event(self, event):
+        path = Path(event.src_path)
+        if IGNORED_DIRS.intersection(path.parts) or path.suffix == ".tmp":
+            return
+        self.wake.set()
+
+def start_observer(paths, wake):
+    """
+    Démarre l'observateur d'événements fichiers sur `paths` (récursif).
+    Retourne l'observer, ou None si `watchdog` n'est pas installé (mode polling).
+    """
+    if Observer is None:
+        logging.info("   👀 watchdog not installed, polling every "
+                     f"{config.WATCH_POLL_INTERVAL}s (pip install watchdog)")
+        return None
+
+    observer = Observer()
+    handler = _WakeHandler(wake)
+    for p in paths:
+        observer.schedule(handler, str(p), recursive=True)
+    observer.daemon = True
+    observer.start()
+    logging.info("   👀 File events enabled (watchdog)")
+    return observer
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Inventaire des publications : ledger CSV append-only + Excel généré à la demande.
+
+Chaque job ajoute UNE ligne au ledger (écriture O(1), pas de pandas, rien à
+relire). INVENTORY.xlsx est régénéré en lot depuis le ledger : par le watcher
+(au plus toutes les INVENTORY_EXCEL_DEBOUNCE secondes) ou à la main :
+
+    python inventory_ledger.py
+"""
+import csv
+import json
+import time
+import fcntl
+import logging
+import threading
+import config
+
+LEDGER_COLUMNS = ["ID Projet", "Date (UTC)", "Type", "Format", "Lien Bunny", "Timings"]
+
+_lock = threading.Lock()
+_last_attempt = 0.0
+
+def record(project_data, timings=None):
+    """Ajoute une ligne au ledger (timings = durée de chaque étape en secondes)."""
+    row = {
+        "ID Projet": project_data["id"],
+        "Date (UTC)": project_data["updated_at"],
+        "Type": "Privé" if project_data["is_private"] else "Public",
+        "Format": ", ".join(project_data["bunny_urls"].keys()),
+        "Lien Bunny": next(iter(project_data["bunny_urls"].values()), ""), # Premier lien dispo
+        "Timings": json.dumps(timings or {})
+    }
+
+    ledger = config.INVENTORY_LEDGER
+    with _lock, open(ledger, "a", newline="", encoding="utf-8") as f:
+        # Verrou fichier : plusieurs workers peuvent écrire en même temps
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            writer = csv.DictWriter(f, fieldnames=LEDGER_COLUMNS)
+            if f.tell() == 0:
+                writer.writeheader()
+            writer.writerow(row)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    logging.info("   📊 Inventory ledger updated.")
+
+def read_latest():
+    """Dernière ligne de chaque projet, la plus récente en haut."""
+    ledger = config.INVENTORY_LEDGER
+    if not ledger.exists():
+        return []
+    latest = {}
+    with open(ledger, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            latest.pop(row["ID Projet"], None)
+            latest[row["ID Projet"]] = row
+    return list(reversed(latest.values()))
+
+def materialize_excel():
+    """Régénère INVENTORY.xlsx depuis le ledger (une colonne "<étape> (s)" par étape mesurée)."""
+    import pandas as pd
+
+    rows = []
+    for row in read_latest():
+        flat = {k: row[k] for k in LEDGER_COLUMNS if k != "Timings"}
+        try:
+            timings = json.loads(row.get("Timings") or "{}")
+        except ValueError:
+            timings = {}
+        for stage, dur in timings.items():
+            flat[f"{stage} (s)"] = dur
+        if timings:
+            flat["Total (s)"] = round(sum(timings.values()), 2)
+        rows.append(flat)
+
+    excel_path = config.BASE_DIR / "INVENTORY.xlsx"
+    tmp_path = excel_path.with_name(f"~{excel_path.name}")
+    try:
+        pd.DataFrame(rows).to_excel(tmp_path, index=False)
+        tmp_path.replace(excel_path)
+        logging.info(f"   📊 Inventory Excel regenerated ({len(rows)} projects).")
+        return True
+    except Exception as e:
+        # Ex: fichier ouvert dans Excel -> on réessaiera au prochain passage
+        logging.error(f"   ❌ Inventory Excel update failed: {e}")
+        return False
+
+def materialize_if_stale():
+    """Régénère l'Excel si le ledger a changé, au plus une fois par INVENTORY_EXCEL_DEBOUNCE."""
+    global _last_attempt
+    ledger = config.INVENTORY_LEDGER
+    excel_path = config.BASE_DIR / "INVENTORY.xlsx"
+    if not ledger.exists():
+        return False
+    if excel_path.exists() and excel_path.stat().st_mtime >= ledger.stat().st_mtime:
+        return False
+    if time.time() - _last_attempt < config.INVENTORY_EXCEL_DEBOUNCE:
+        return False
+    _last_attempt = time.time()
+    return materialize_excel()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    materialize_excel()
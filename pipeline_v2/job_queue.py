@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+File de jobs persistante (SQLite en mode WAL).
+
+Chaque projet détecté par le watcher devient une ligne : queued -> running -> done | failed.
+La file survit aux redémarrages (un job "running" lors d'un crash repasse en
+"queued" au démarrage suivant), compte les tentatives et sert les jobs par
+priorité : échéance la plus proche d'abord, puis priorité (privé avant public),
+puis ordre d'arrivée.
+
+Mode multi-machines (coordinator_v2.py) : un job pris par un worker distant
+porte un bail (worker, lease_until) prolongé par ses heartbeats. Un bail expiré
+(machine morte, réseau coupé) remet le job en file pour un autre worker.
+
+Usage :
+    python job_queue.py list [queued|running|done|failed]
+    python job_queue.py retry <project_id> [...]
+"""
+import os
+import sys
+import time
+import json
+import socket
+import sqlite3
+import logging
+import threading
+import config
+
+STATES = ("queued", "running", "done", "failed")
+COLUMNS = ["project_id", "prod_dir", "video_path", "video_mtime", "is_private", "priority", "deadline",
+           "state", "attempts", "enqueued_at", "not_before", "started_at", "finished_at", "last_error",
+           "worker", "lease_until", "stage", "first_seen"]
+
+_local = threading.local()
+
+def _connect():
+    """Connexion SQLite du thread courant (créée et initialisée au premier appel)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+    config.JOB_QUEUE_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(config.JOB_QUEUE_DB), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " project_id TEXT PRIMARY KEY, prod_dir TEXT, video_path TEXT, video_mtime REAL,"
+        " is_private INTEGER, priority INTEGER, deadline TEXT, state TEXT, attempts INTEGER DEFAULT 0,"
+        " enqueued_at REAL, not_before REAL DEFAULT 0, started_at REAL, finished_at REAL, last_error TEXT)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, deadline, priority, enqueued_at)")
+    # Colonnes des baux (ajoutées aux files créées avant le mode multi-machines)
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(jobs)")}
+    for col, kind in [("worker", "TEXT"), ("lease_until", "REAL"), ("stage", "TEXT"), ("first_seen", "REAL")]:
+        if col not in existing:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {col} {kind}")
+    _local.conn = conn
+    return conn
+
+def _row(values):
+    job = dict(zip(COLUMNS, values))
+    job["is_private"] = bool(job["is_private"])
+    return job
+
+def _transaction(fn):
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        result = fn(conn)
+        conn.execute("COMMIT")
+        return result
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def local_worker():
+    """Nom du worker local (<hôte>-<pid>) : permet de savoir si le process qui tient un job est encore vivant."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def worker_alive(job):
+    """
+    Le worker d'un job "running" est-il encore là ? True / False, ou None si on ne peut pas le savoir
+    (worker distant sans bail, ou job pris avant que le worker ne soit enregistré).
+    """
+    if job["lease_until"] is not None:
+        return job["lease_until"] >= time.time()
+    host, _, pid = (job["worker"] or "").rpartition("-")
+    if host != socket.gethostname() or not pid.isdigit():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def project_settings(prod_dir):
+    """Priorité / échéance optionnelles du config.json du projet ("priority", "deadline" ISO 8601)."""
+    try:
+        cfg = json.loads((prod_dir / "config.json").read_text())
+    except Exception:
+        return None, None
+    return cfg.get("priority"), cfg.get("deadline")
+
+# --- ÉCRITURE ---
+
+def enqueue(prod_dir, video_path, is_private, priority=None, deadline=None, first_seen=None):
+    """
+    Ajoute (ou remet en file) un projet. Sans effet si le projet est déjà queued / running.
+    first_seen : première détection de l'export (latence d'ingest mesurée au démarrage du job).
+    Priorité par défaut : QUEUE_PRIORITY_PRIVATE / QUEUE_PRIORITY_PUBLIC (plus petit = plus tôt).
+    """
+    cfg_priority, cfg_deadline = project_settings(prod_dir)
+    if priority is None:
+        priority = cfg_priority
+    if priority is None:
+        priority = config.QUEUE_PRIORITY_PRIVATE if is_private else config.QUEUE_PRIORITY_PUBLIC
+    deadline = deadline or cfg_deadline
+    project_id = prod_dir.name
+    video_mtime = video_path.stat().st_mtime
+
+    def op(conn):
+        row = conn.execute("SELECT state FROM jobs WHERE project_id = ?", (project_id,)).fetchone()
+        if row and row[0] in ("queued", "running"):
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (project_id, prod_dir, video_path, video_mtime, is_private, priority,"
+            " deadline, state, attempts, enqueued_at, not_before, first_seen)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', 0, ?, 0, ?)",
+            (project_id, str(prod_dir), str(video_path), video_mtime, int(bool(is_private)),
+             int(priority), deadline, time.time(), first_seen)
+        )
+        return True
+
+    added = _transaction(op)
+    if added:
+        logging.info(f"   📥 Queued {project_id} (priority {priority}{', deadline ' + deadline if deadline else ''})")
+    return added
+
+def claim(limit=1, worker=None, lease_s=None):
+    """
+    Passe en "running" les `limit` prochains jobs prêts (échéance, priorité, ancienneté) et les retourne.
+    lease_s : durée du bail (workers distants) ; None = pas d'expiration (watcher local).
+    worker : nom du worker distant ; par défaut le process local (local_worker()).
+    """
+    worker = worker or local_worker()
+    def op(conn):
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE state = 'queued' AND not_before <= ?"
+            " ORDER BY deadline IS NULL, deadline, priority, enqueued_at LIMIT ?",
+            (time.time(), limit)
+        ).fetchall()
+        jobs = [_row(r) for r in rows]
+        for job in jobs:
+            job["attempts"] += 1
+            job["state"] = "running"
+            job["worker"] = worker
+            job["lease_until"] = time.time() + lease_s if lease_s else None
+            conn.execute(
+                "UPDATE jobs SET state = 'running', attempts = ?, started_at = ?, worker = ?, lease_until = ?,"
+                " stage = NULL WHERE project_id = ?",
+                (job["attempts"], time.time(), worker, job["lease_until"], job["project_id"])
+            )
+        return jobs
+    return _transaction(op)
+
+def _owns(conn, project_id, worker):
+    """True si `worker` détient encore le job (None = pas de vérification)."""
+    if worker is None:
+        return True
+    row = conn.execute("SELECT state, worker FROM jobs WHERE project_id = ?", (project_id,)).fetchone()
+    return bool(row) and row[0] == "running" and row[1] == worker
+
+def heartbeat(project_id, worker, stage=None, lease_s=None):
+    """Prolonge le bail d'un job. False si le job n'appartient plus à `worker` (bail expiré et repris)."""
+    def op(conn):
+        if not _owns(conn, project_id, worker):
+            return False
+        conn.execute(
+            "UPDATE jobs SET lease_until = ?, stage = COALESCE(?, stage) WHERE project_id = ?",
+            (time.time() + (lease_s or config.LEASE_SECONDS), stage, project_id)
+        )
+        return True
+    return _transaction(op)
+
+def expire_leases():
+    """Remet en file les jobs dont le bail a expiré (worker mort). Retourne les IDs concernés."""
+    def op(conn):
+        rows = conn.execute(
+            "SELECT project_id, worker FROM jobs WHERE state = 'running' AND lease_until IS NOT NULL AND lease_until < ?",
+            (time.time(),)
+        ).fetchall()
+        for project_id, _ in rows:
+            conn.execute(
+                "UPDATE jobs SET state = 'queued', not_before = 0, worker = NULL, lease_until = NULL,"
+                " last_error = 'lease expired' WHERE project_id = ?", (project_id,)
+            )
+        return rows
+    expired = _transaction(op)
+    for project_id, worker in expired:
+        logging.warning(f"   ⌛ Lease expired: {project_id} (worker {worker}), re-queued")
+    return [p for p, _ in expired]
+
+def mark_done(project_id, worker=None):
+    """Job terminé. False si `worker` ne détient plus le job (résultat ignoré)."""
+    def op(conn):
+        if not _owns(conn, project_id, worker):
+            return False
+        conn.execute(
+            "UPDATE jobs SET state = 'done', finished_at = ?, last_error = NULL, lease_until = NULL WHERE project_id = ?",
+            (time.time(), project_id)
+        )
+        return True
+    return _transaction(op)
+
+def mark_failed(project_id, error="", worker=None):
+    """Échec : retenté plus tard (délai croissant) tant que attempts < QUEUE_MAX_ATTEMPTS, sinon "failed"."""
+    def op(conn):
+        if not _owns(conn, project_id, worker):
+            return None
+        row = conn.execute("SELECT attempts FROM jobs WHERE project_id = ?", (project_id,)).fetchone()
+        attempts = row[0] if row else config.QUEUE_MAX_ATTEMPTS
+        if attempts < config.QUEUE_MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE jobs SET state = 'queued', not_before = ?, last_error = ?, lease_until = NULL WHERE project_id = ?",
+                (time.time() + config.QUEUE_RETRY_DELAY * attempts, error, project_id)
+            )
+            return "queued"
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', finished_at = ?, last_error = ?, lease_until = NULL WHERE project_id = ?",
+            (time.time(), error, project_id)
+        )
+        return "failed"
+
+    state = _transaction(op)
+    if state == "queued":
+        logging.warning(f"   🔁 {project_id} will be retried")
+    return state
+
+def recover(project_ids=None):
+    """
+    Au démarrage : les jobs "running" locaux (watcher arrêté / crash) repassent en file.
+    Les jobs des workers distants (avec bail) continuent : expire_leases() s'en charge.
+    project_ids : ces jobs-là, qu'ils aient un bail ou non (retry_stuck.py).
+    """
+    def op(conn):
+        query = "UPDATE jobs SET state = 'queued', not_before = 0, lease_until = NULL WHERE state = 'running'"
+        if project_ids:
+            query += f" AND project_id IN ({', '.join('?' * len(project_ids))})"
+        else:
+            query += " AND lease_until IS NULL"
+        return conn.execute(query, tuple(project_ids or ())).rowcount
+    n = _transaction(op)
+    if n:
+        logging.info(f"   ♻️ Job queue: {n} interrupted job(s) re-queued")
+    return n
+
+def retry(project_ids=None, states=("failed",)):
+    """Remet en file (tentatives remises à zéro) les projets donnés, ou tous ceux dans `states`."""
+    def op(conn):
+        if project_ids:
+            marks = ", ".join("?" * len(project_ids))
+            return conn.execute(
+                f"UPDATE jobs SET state = 'queued', attempts = 0, not_before = 0, enqueued_at = ?"
+                f" WHERE project_id IN ({marks}) AND state != 'running'", (time.time(), *project_ids)
+            ).rowcount
+        marks = ", ".join("?" * len(states))
+        return conn.execute(
+            f"UPDATE jobs SET state = 'queued', attempts = 0, not_before = 0, enqueued_at = ? WHERE state IN ({marks})",
+            (time.time(), *states)
+        ).rowcount
+    return _transaction(op)
+
+# --- LECTURE ---
+
+def get(project_id):
+    row = _connect().execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE project_id = ?", (project_id,)).fetchone()
+    return _row(row) if row else None
+
+def jobs(state=None):
+    """Jobs (tous, ou d'un état), dans l'ordre de service."""
+    query = f"SELECT {', '.join(COLUMNS)} FROM jobs"
+    args = ()
+    if state:
+        query += " WHERE state = ?"
+        args = (state,)
+    query += " ORDER BY deadline IS NULL, deadline, priority, enqueued_at"
+    return [_row(r) for r in _connect().execute(query, args).fetchall()]
+
+def active_ids():
+    """Projets en file ou en cours (à ne pas re-détecter)."""
+    rows = _connect().execute("SELECT project_id FROM jobs WHERE state IN ('queued', 'running')").fetchall()
+    return {r[0] for r in rows}
+
+def is_blocked(project_id, video_path):
+    """True si le projet a échoué définitivement avec CE master (un nouvel export le débloque)."""
+    job = get(project_id)
+    if not job or job["state"] != "failed":
+        return False
+    try:
+        return job["video_path"] == str(video_path) and job["video_mtime"] == video_path.stat().st_mtime
+    except OSError:
+        return False
+
+def counts():
+    rows = _connect().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+    return {state: dict(rows).get(state, 0) for state in STATES}
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if cmd == "list":
+        state = sys.argv[2] if len(sys.argv) > 2 else None
+        for job in jobs(state):
+            print(f"{job['state']:8} p{job['priority']:<3} x{job['attempts']} {job['project_id']}"
+                  f"{'  @' + job['worker'] + (' [' + job['stage'] + ']' if job['stage'] else '') if job['state'] == 'running' and job['worker'] else ''}"
+                  f"{'  ⏰ ' + job['deadline'] if job['deadline'] else ''}"
+                  f"{'  ❌ ' + job['last_error'] if job['last_error'] else ''}")
+        print(counts())
+    elif cmd == "retry":
+        print(f"{retry(sys.argv[2:] or None)} job(s) re-queued")
+    else:
+        print("Usage: python job_queue.py list [state] | retry [project_id ...]")
@@ -0,0 +1,293 @@
+"""
+Mesures par étape du pipeline : temps réel, temps CPU, pic mémoire (RSS), octets lus / écrits.
+
+- Chaque étape est mesurée dans le thread qui l'exécute (CPU et I/O du thread),
+  plus les process enfants qu'elle lance (ffmpeg, ffprobe...) : runner_v2 les
+  attend via wait_child (os.wait4) qui attribue leur rusage à l'étape en cours.
+- Mémoire : pic des process enfants, et hausse du pic du process pipeline pendant
+  l'étape (ru_maxrss de RUSAGE_SELF est un pic sur toute la vie du process : sa
+  valeur brute est gardée à part, "process_peak_rss_bytes").
+- I/O du thread : Linux seulement (/proc) ; ailleurs read_bytes / write_bytes
+  valent None et seuls les compteurs des enfants (child_*_bytes) sont renseignés.
+- Une ligne JSON par étape dans <projet>/logs/metrics.jsonl, plus une par attente
+  en file du scheduler (queue_wait_s) et une pour la latence d'ingest (détection
+  de l'export -> début de la première étape).
+- Histogrammes agrégés exposés au format texte Prometheus sur METRICS_ADDRESS
+  (serveur démarré par le watcher), avec les stats du scheduler et de l'API Bunny.
+
+Usage :
+    with metrics_v2.measure(job, "encode"):
+        ...
+"""
+import os
+import sys
+import json
+import time
+import logging
+import resource
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config
+
+_current = threading.local()
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024  # ru_maxrss : octets sur macOS, Ko sur Linux
+
+# --- MESURES ---
+
+def _thread_io():
+    """Octets lus / écrits sur disque par le thread courant (Linux), sinon (None, None)."""
+    try:
+        text = open(f"/proc/self/task/{threading.get_native_id()}/io").read()
+    except OSError:
+        return None, None
+    values = dict(line.split(": ") for line in text.splitlines() if ": " in line)
+    return int(values.get("read_bytes", 0)), int(values.get("write_bytes", 0))
+
+def _process_peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+def _thread_cpu():
+    try:
+        return time.thread_time()
+    except AttributeError:
+        return time.process_time()
+
+class StageSample:
+    """Compteurs d'une étape en cours (thread + process enfants)."""
+
+    def __init__(self):
+        self.t0 = time.time()
+        self.cpu0 = _thread_cpu()
+        self.read0, self.write0 = _thread_io()
+        self.rss0 = _process_peak_rss()
+        self.child_cpu = 0.0
+        self.child_rss = 0
+        self.child_read = 0
+        self.child_write = 0
+        self.children = 0
+
+    def add_child(self, ru):
+        self.children += 1
+        self.child_cpu += ru.ru_utime + ru.ru_stime
+        self.child_rss = max(self.child_rss, ru.ru_maxrss * RSS_UNIT)
+        # Blocs de 512 octets
+        self.child_read += ru.ru_inblock * 512
+        self.child_write += ru.ru_oublock * 512
+
+    def result(self):
+        read1, write1 = _thread_io()
+        process_rss = _process_peak_rss()
+        own_growth = process_rss - self.rss0  # 0 si l'étape n'a pas dépassé le pic déjà atteint par le process
+        io = self.read0 is not None and read1 is not None
+        return {
+            "wall_s": round(time.time() - self.t0, 3),
+            "cpu_s": round(_thread_cpu() - self.cpu0 + self.child_cpu, 3),
+            "child_cpu_s": round(self.child_cpu, 3),
+            "peak_rss_bytes": max(own_growth, self.child_rss),
+            "child_peak_rss_bytes": self.child_rss,
+            "own_rss_growth_bytes": own_growth,
+            "process_peak_rss_bytes": process_rss,
+            "read_bytes": read1 - self.read0 + self.child_read if io else None,
+            "write_bytes": write1 - self.write0 + self.child_write if io else None,
+            "child_read_bytes": self.child_read,
+            "child_write_bytes": self.child_write,
+            "children": self.children,
+        }
+
+def wait_child(proc, block=True):
+    """
+    Attend `proc` (os.wait4), enregistre son rusage dans l'étape en cours et retourne son code de sortie.
+    block=False : retourne None tout de suite si le process tourne encore.
+    """
+    pid, status, ru = os.wait4(proc.pid, 0 if block else os.WNOHANG)
+    if pid == 0:
+        return None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    sample = getattr(_current, "sample", None)
+    if sample is not None:
+        sample.add_child(ru)
+    return proc.returncode
+
+def bind(fn):
+    """Enveloppe `fn` pour qu'elle compte dans l'étape courante même exécutée dans un autre thread (pool)."""
+    sample = getattr(_current, "sample", None)
+    def wrapper(*args, **kwargs):
+        previous, _current.sample = getattr(_current, "sample", None), sample
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.sample = previous
+    return wrapper
+
+@contextmanager
+def measure(job, stage):
+    """Mesure une étape (dans le thread courant) et publie le résultat dans job["metrics"], le JSONL et les histogrammes."""
+    sample = StageSample()
+    previous, _current.sample = getattr(_current, "sample", None), sample
+    outcome = {"ok": False}
+    try:
+        yield outcome
+    finally:
+        _current.sample = previous
+        data = sample.result()
+        data["ok"] = bool(outcome.get("ok"))
+        data["skipped"] = bool(outcome.get("skipped"))
+        job.setdefault("metrics", {})[stage] = data
+        observe(stage, data)
+        _append_jsonl(job, stage, data)
+
+def _append_jsonl(job, stage, data):
+    log_dir = job["prod_dir"] / "logs"
+    try:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        line = {"ts": datetime.utcnow().isoformat() + "Z", "project": job["project_id"], "stage": stage, **data}
+        with open(log_dir / "metrics.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(line) + "\n")
+    except OSError as e:
+        logging.warning(f"   ⚠️ Metrics write failed: {e}")
+
+# --- AGRÉGATION (Prometheus) ---
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, b in enumerate(self.buckets):
+            if value <= b:
+                self.counts[i] += 1
+
+    def lines(self, name, labels):
+        out = []
+        for b, c in zip(self.buckets, self.counts):
+            out.append(f'{name}_bucket{{{labels},le="{b}"}} {c}')
+        out.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        out.append(f"{name}_sum{{{labels}}} {round(self.sum, 3)}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+SECONDS_BUCKETS = [0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600]
+BYTES_BUCKETS = [2 ** p for p in range(20, 36, 2)]  # 1 Mo -> 32 Go
+
+HISTOGRAMS = {
+    "pipeline_stage_wall_seconds": ("wall_s", SECONDS_BUCKETS, "Wall time per stage"),
+    "pipeline_stage_cpu_seconds": ("cpu_s", SECONDS_BUCKETS, "CPU time per stage (thread + child processes)"),
+    "pipeline_stage_peak_rss_bytes": ("peak_rss_bytes", BYTES_BUCKETS, "Peak RSS per stage (child processes, or growth of the pipeline process peak)"),
+    "pipeline_stage_read_bytes": ("read_bytes", BYTES_BUCKETS, "Bytes read from disk per stage"),
+    "pipeline_stage_write_bytes": ("write_bytes", BYTES_BUCKETS, "Bytes written to disk per stage"),
+}
+
+# Événements du scheduler (hors mesure d'étape) : métrique -> (label, aide)
+EVENT_HISTOGRAMS = {
+    "pipeline_stage_queue_wait_seconds": ("stage", "Time a stage waited for a free slot in its pool"),
+    "pipeline_ingest_latency_seconds": ("visibility", "Export first seen -> first stage started"),
+}
+
+_hists = {}   # (metric, label) -> Histogram
+_counts = {}  # (stage, outcome) -> n
+_lock = threading.Lock()
+_collectors = []
+
+def observe(stage, data):
+    with _lock:
+        outcome = "skipped" if data.get("skipped") else ("ok" if data.get("ok") else "failed")
+        _counts[(stage, outcome)] = _counts.get((stage, outcome), 0) + 1
+        if data.get("skipped"):
+            return
+        for metric, (key, buckets, _) in HISTOGRAMS.items():
+            if data.get(key) is not None: # I/O inconnue hors Linux : pas d'observation plutôt qu'un faux 0
+                _hists.setdefault((metric, stage), Histogram(buckets)).observe(data[key])
+
+def observe_wait(job, stage, wait_s):
+    """Attente d'une étape dans la file de son pool (scheduler)."""
+    with _lock:
+        _hists.setdefault(("pipeline_stage_queue_wait_seconds", stage), Histogram(SECONDS_BUCKETS)).observe(wait_s)
+    _append_jsonl(job, stage, {"queue_wait_s": round(wait_s, 2)})
+
+def observe_ingest(job, latency_s):
+    """Latence d'ingest : export vu pour la première fois -> début de la première étape."""
+    visibility = "private" if job["is_private"] else "public"
+    with _lock:
+        _hists.setdefault(("pipeline_ingest_latency_seconds", visibility), Histogram(SECONDS_BUCKETS)).observe(latency_s)
+    _append_jsonl(job, "ingest", {"latency_s": round(latency_s, 2)})
+
+def register_collector(fn):
+    """Ajoute une source de lignes Prometheus (fn() -> [str]), ex: stats du scheduler."""
+    _collectors.append(fn)
+
+def bunny_lines():
+    import bunny_client
+    out = ["# TYPE bunny_api_requests_total counter", "# TYPE bunny_api_seconds_total counter"]
+    for label, m in sorted(bunny_client.metrics().items()):
+        out.append(f'bunny_api_requests_total{{endpoint="{label}"}} {m["count"]}')
+        out.append(f'bunny_api_errors_total{{endpoint="{label}"}} {m["errors"]}')
+        out.append(f'bunny_api_seconds_total{{endpoint="{label}"}} {m["total_s"]}')
+        out.append(f'bunny_api_max_seconds{{endpoint="{label}"}} {m["max_s"]}')
+    return out
+
+def scheduler_lines(scheduler):
+    out = []
+    for name, st in scheduler.snapshot().items():
+        for key in ("queued", "running", "done", "failed", "limit", "wait_avg_s", "wait_max_s"):
+            out.append(f'pipeline_scheduler_{key}{{stage="{name}"}} {st[key]}')
+    return out
+
+def render():
+    """Toutes les métriques au format texte Prometheus."""
+    lines = []
+    with _lock:
+        for metric, (_, _, help_text) in HISTOGRAMS.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (m, stage), hist in sorted(_hists.items()):
+                if m == metric:
+                    lines.extend(hist.lines(metric, f'stage="{stage}"'))
+        for metric, (label, help_text) in EVENT_HISTOGRAMS.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (m, value), hist in sorted(_hists.items()):
+                if m == metric:
+                    lines.extend(hist.lines(metric, f'{label}="{value}"'))
+        lines.append("# TYPE pipeline_stage_runs_total counter")
+        for (stage, outcome), n in sorted(_counts.items()):
+            lines.append(f'pipeline_stage_runs_total{{stage="{stage}",outcome="{outcome}"}} {n}')
+    for fn in [bunny_lines] + _collectors:
+        try:
+            lines.extend(fn())
+        except Exception as e:
+            logging.warning(f"   ⚠️ Metrics collector failed: {e}")
+    return "\n".join(lines) + "\n"
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass # Pas de log par requête (scrape toutes les X s)
+
+def start_server(address=None):
+    """Démarre l'endpoint /metrics dans un thread daemon. Retourne le serveur, ou None si le port est pris."""
+    address = address or config.METRICS_ADDRESS
+    try:
+        server = ThreadingHTTPServer(address, _Handler)
+    except OSError as e:
+        logging.warning(f"   ⚠️ Metrics endpoint disabled ({address[0]}:{address[1]}): {e}")
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"   📈 Metrics on http://{address[0]}:{address[1]}/metrics")
+    return server
@@ -0,0 +1,188 @@
+"""
+Métadonnées des médias (ffprobe), mémorisées.
+
+ffprobe ne tourne qu'une fois par fichier : le résultat est gardé en mémoire et
+sur disque (SQLite dans .cache), clé (path, taille, mtime). Le watcher (choix du
+master), l'étape probe (format natif), l'analyse / l'encodage (durée, fps) et
+l'encodage par segments (index des keyframes) lisent tous ce même résultat.
+
+Usage :
+    meta = probe_v2.probe(path)     # dict, ou None si ffprobe échoue (échec mémorisé tant que le fichier ne change pas)
+    meta["video"]["display_width"], meta["duration"], probe_v2.keyframes(path)
+"""
+import json
+import sqlite3
+import logging
+import threading
+from fractions import Fraction
+import config
+import runner_v2
+
+_lock = threading.RLock()
+_db = None
+_memory = {}  # path -> entrée complète (avec identité size/mtime)
+_failed = {}  # path -> (size, mtime) d'un échec : pas de nouveau ffprobe tant que le fichier ne change pas
+
+def _conn():
+    global _db
+    if _db is None:
+        config.PROBE_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        _db = sqlite3.connect(str(config.PROBE_CACHE), check_same_thread=False, timeout=30)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime REAL, data TEXT, keyframes TEXT)"
+        )
+        _db.commit()
+    return _db
+
+def _identity(path):
+    st = path.stat()
+    return st.st_size, st.st_mtime
+
+def _cached(path):
+    """Entrée en cache si le fichier n'a pas changé depuis, sinon None."""
+    size, mtime = _identity(path)
+    key = str(path)
+    with _lock:
+        entry = _memory.get(key)
+        if entry is None:
+            row = _conn().execute(
+                "SELECT size, mtime, data, keyframes FROM probes WHERE path = ?", (key,)
+            ).fetchone()
+            if row:
+                entry = {"size": row[0], "mtime": row[1], "data": json.loads(row[2]),
+                         "keyframes": json.loads(row[3]) if row[3] else None}
+                _memory[key] = entry
+        if entry and entry["size"] == size and entry["mtime"] == mtime:
+            return entry
+    return None
+
+def _store(path, size, mtime, data, keyframes=None):
+    key = str(path)
+    entry = {"size": size, "mtime": mtime, "data": data, "keyframes": keyframes}
+    with _lock:
+        _memory[key] = entry
+        _conn().execute(
+            "INSERT OR REPLACE INTO probes (path, size, mtime, data, keyframes) VALUES (?, ?, ?, ?, ?)",
+            (key, size, mtime, json.dumps(data), json.dumps(keyframes) if keyframes is not None else None)
+        )
+        _conn().commit()
+    return entry
+
+# --- PARSING ---
+
+def _rate(value):
+    try:
+        r = Fraction(value)
+        return round(float(r), 3) if r else None
+    except (ValueError, ZeroDivisionError, TypeError):
+        return None
+
+def _rotation(stream):
+    for side in stream.get("side_data_list", []):
+        if "rotation" in side:
+            return int(side["rotation"]) % 360
+    try:
+        return int(stream.get("tags", {}).get("rotate", 0)) % 360
+    except ValueError:
+        return 0
+
+def _parse(raw):
+    fmt = raw.get("format", {})
+    streams = raw.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"
+                  and not s.get("disposition", {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    meta = {
+        "format": fmt.get("format_name"),
+        "duration": float(fmt.get("duration") or 0),
+        "start_time": float(fmt.get("start_time") or 0), # Origine des -ss en entrée (pts des keyframes = absolus)
+        "bit_rate": int(fmt.get("bit_rate") or 0),
+        "video": None,
+        "audio": None,
+    }
+    if video:
+        w, h = int(video.get("width") or 0), int(video.get("height") or 0)
+        rotation = _rotation(video)
+        meta["video"] = {
+            "codec": video.get("codec_name"),
+            "profile": video.get("profile"),
+            "pix_fmt": video.get("pix_fmt"),
+            "width": w,
+            "height": h,
+            "rotation": rotation,
+            # Dimensions affichées (vidéo de téléphone tournée de 90° -> portrait)
+            "display_width": h if rotation in (90, 270) else w,
+            "display_height": w if rotation in (90, 270) else h,
+            "sar": video.get("sample_aspect_ratio", "1:1"),
+            "fps": _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate")),
+            "bit_rate": int(video.get("bit_rate") or 0),
+            "nb_frames": int(video.get("nb_frames") or 0),
+        }
+    if audio:
+        meta["audio"] = {
+            "codec": audio.get("codec_name"),
+            "channels": int(audio.get("channels") or 0),
+            "channel_layout": audio.get("channel_layout"),
+            "sample_rate": int(audio.get("sample_rate") or 0),
+            "bit_rate": int(audio.get("bit_rate") or 0),
+        }
+    return meta
+
+# --- API ---
+
+def probe(path):
+    """Métadonnées complètes de `path` (dict), ou None si le fichier n'est pas lisible par ffprobe."""
+    entry = _cached(path)
+    if entry:
+        return entry["data"]
+
+    size, mtime = _identity(path)
+    with _lock:
+        if _failed.get(str(path)) == (size, mtime):
+            return None
+    try:
+        out = runner_v2.run([
+            config.FFPROBE, "-v", "error", "-show_format", "-show_streams", "-of", "json", str(path)
+        ], capture_stdout=True)
+        data = _parse(json.loads(out))
+    except (runner_v2.CommandError, FileNotFoundError, ValueError) as e:
+        logging.warning(f"   ⚠️ ffprobe failed on {path.name}: {e}")
+        with _lock:
+            _failed[str(path)] = (size, mtime)
+        return None
+    _store(path, size, mtime, data)
+    return data
+
+def keyframes(path):
+    """Timestamps (s) des keyframes de la piste vidéo (lecture des paquets, sans décodage), mis en cache."""
+    entry = _cached(path)
+    if entry and entry["keyframes"] is not None:
+        return entry["keyframes"]
+
+    data = probe(path)
+    if data is None:
+        return []
+    try:
+        out = runner_v2.run([
+            config.FFPROBE, "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(path)
+        ], capture_stdout=True)
+    except (runner_v2.CommandError, FileNotFoundError) as e:
+        logging.warning(f"   ⚠️ Keyframe scan failed on {path.name}: {e}")
+        return []
+
+    times = []
+    for line in out.decode().splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                times.append(float(pts))
+            except ValueError:
+                pass
+    times.sort()
+    size, mtime = _identity(path)
+    _store(path, size, mtime, data, times)
+    return times
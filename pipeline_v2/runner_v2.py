@@ -0,0 +1,149 @@
+"""
+Exécution des commandes externes (ffmpeg, ffprobe) en streaming.
+
+- ffmpeg est lancé avec `-progress pipe:2 -nostats` : les blocs de progression
+  (frame, fps, out_time, speed) sont lus au fil de l'eau et transformés en
+  événements (avec % et ETA si la durée est connue).
+- Seules les dernières FFMPEG_STDERR_LINES lignes de stderr sont gardées
+  (buffer circulaire) pour le message d'erreur : la mémoire ne grossit plus
+  avec le volume de logs d'un long encodage.
+- Timeout global, détection de blocage (aucune progression pendant
+  FFMPEG_STALL_TIMEOUT secondes) et annulation via threading.Event.
+"""
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+import config
+import metrics_v2
+
+PROGRESS_KEYS = {"frame", "fps", "out_time_us", "out_time_ms", "speed", "progress", "total_size", "bitrate"}
+
+class CommandError(Exception):
+    """Échec d'une commande : code de sortie, timeout, blocage ou annulation (+ fin de stderr)."""
+
+    def __init__(self, reason, stderr_tail=""):
+        super().__init__(f"{reason}\n{stderr_tail}" if stderr_tail else reason)
+        self.reason = reason
+        self.stderr_tail = stderr_tail
+
+def _fmt_eta(seconds):
+    m, s = divmod(int(seconds), 60)
+    return f"{m}m{s:02d}s"
+
+def log_progress(label, interval=None):
+    """Callback de progression par défaut : une ligne de log au plus toutes les `interval` secondes."""
+    interval = config.FFMPEG_PROGRESS_LOG_INTERVAL if interval is None else interval
+    last = [0.0]
+
+    def on_progress(ev):
+        if ev["done"] or time.time() - last[0] < interval:
+            return
+        last[0] = time.time()
+        pct = f"{ev['percent']:.0f}% | " if ev.get("percent") is not None else ""
+        eta = f" | ETA {_fmt_eta(ev['eta_s'])}" if ev.get("eta_s") is not None else ""
+        logging.info(f"   ⏳ {label}: {pct}frame {ev['frame']} | {ev['fps']:.0f} fps | {ev['speed']:.2f}x{eta}")
+    return on_progress
+
+def _progress_event(block, duration, started):
+    def num(key, default=0.0):
+        try:
+            return float(str(block.get(key, default)).rstrip("x"))
+        except ValueError:
+            return default
+
+    out_time = num("out_time_us") / 1e6 or num("out_time_ms") / 1e6
+    speed = num("speed")
+    if not speed and out_time:
+        speed = out_time / max(time.time() - started, 1e-6)
+    ev = {
+        "frame": int(num("frame")), "fps": num("fps"), "speed": speed,
+        "out_time_s": round(out_time, 2), "percent": None, "eta_s": None,
+        "done": block.get("progress") == "end"
+    }
+    if duration:
+        ev["percent"] = min(100.0, 100.0 * out_time / duration)
+        if speed > 0:
+            ev["eta_s"] = max(0.0, (duration - out_time) / speed)
+    return ev
+
+def run(cmd_list, capture_stdout=False, duration=None, on_progress=None,
+        timeout=None, stall_timeout=None, cancel=()):
+    """
+    Lance une commande et suit son exécution.
+    - duration : durée (s) du média produit, pour le % et l'ETA des commandes ffmpeg
+    - on_progress(event) : appelé à chaque bloc de progression ffmpeg
+    - timeout / stall_timeout : secondes (None = valeurs de config pour ffmpeg, pas de limite sinon)
+    - cancel : threading.Event (ou tuple d'Events) ; le process est tué dès que l'un est posé
+    Retourne stdout (bytes) si capture_stdout, sinon b"". Lève CommandError en cas d'échec.
+    """
+    cmd_list = [str(x) for x in cmd_list]
+    is_ffmpeg = cmd_list[0] == str(config.FFMPEG)
+    if is_ffmpeg:
+        cmd_list = [cmd_list[0], "-nostats", "-progress", "pipe:2"] + cmd_list[1:]
+        timeout = config.FFMPEG_TIMEOUT if timeout is None else timeout
+        stall_timeout = config.FFMPEG_STALL_TIMEOUT if stall_timeout is None else stall_timeout
+    cancel = cancel if isinstance(cancel, (tuple, list)) else (cancel,)
+    cancel = [c for c in cancel if c is not None]
+
+    proc = subprocess.Popen(
+        cmd_list, stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    started = time.time()
+    tail = deque(maxlen=config.FFMPEG_STDERR_LINES)
+    state = {"last_progress": started}
+    stdout_chunks = []
+
+    def read_stderr():
+        block = {}
+        for raw in iter(proc.stderr.readline, b""):
+            line = raw.decode(errors="replace").rstrip()
+            key, sep, value = line.partition("=")
+            if is_ffmpeg and sep and key in PROGRESS_KEYS:
+                block[key] = value.strip()
+                if key == "progress":
+                    state["last_progress"] = time.time()
+                    if on_progress:
+                        try:
+                            on_progress(_progress_event(block, duration, started))
+                        except Exception as e:
+                            logging.warning(f"   ⚠️ Progress callback failed: {e}")
+                    block = {}
+            elif line:
+                tail.append(line)
+
+    readers = [threading.Thread(target=read_stderr, daemon=True)]
+    if capture_stdout:
+        readers.append(threading.Thread(target=lambda: stdout_chunks.extend(iter(lambda: proc.stdout.read(1 << 20), b"")), daemon=True))
+    for r in readers:
+        r.start()
+
+    reason = None
+    while True:
+        code = metrics_v2.wait_child(proc, block=False)
+        if code is not None:
+            break
+        now = time.time()
+        if any(c.is_set() for c in cancel):
+            reason = "cancelled"
+        elif timeout and now - started > timeout:
+            reason = f"timeout after {timeout}s"
+        elif stall_timeout and now - state["last_progress"] > stall_timeout:
+            reason = f"stalled (no progress for {stall_timeout}s)"
+        if reason:
+            proc.kill()
+            code = metrics_v2.wait_child(proc)
+            break
+        time.sleep(config.FFMPEG_POLL_INTERVAL)
+
+    for r in readers:
+        r.join()
+    stderr_tail = "\n".join(tail)
+    if reason:
+        raise CommandError(reason, stderr_tail)
+    if code != 0:
+        raise CommandError(f"exit code {code}", stderr_tail)
+    return b"".join(stdout_chunks)
@@ -0,0 +1,144 @@
+"""
+Scheduler par étapes pour le watcher.
+
+Chaque étape du pipeline (audio, transcribe, encode, upload) a son propre pool
+de workers avec sa propre limite de concurrence : le projet B peut encoder
+pendant que le projet A upload. Un job passe d'un pool au suivant dès que son
+étape est terminée.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import config
+import metrics_v2
+from worker_v2 import STAGES, run_stage, finalize_job
+
+class StageScheduler:
+    """Pools bornés par étape + stats (profondeur de file, temps d'attente)."""
+
+    def __init__(self, stages=STAGES, limits=None, on_done=None):
+        self.stages = stages
+        self.limits = limits or config.STAGE_CONCURRENCY
+        self.on_done = on_done
+        self._lock = threading.Lock()
+        self._in_flight = {}  # project_id -> nom de l'étape courante
+        self._jobs = {}       # project_id -> job (pour cancel)
+        self.pools = {}
+        self.stats = {}
+        for name, _ in stages:
+            self.pools[name] = ThreadPoolExecutor(
+                max_workers=self.limits.get(name, 1),
+                thread_name_prefix=f"stage-{name}"
+            )
+            self.stats[name] = {
+                "queued": 0, "running": 0, "done": 0, "failed": 0,
+                "wait_total_s": 0.0, "wait_max_s": 0.0
+            }
+
+    # --- API ---
+
+    def submit(self, job):
+        """Ajoute un job (préparé par worker_v2.prepare_job) en tête de pipeline."""
+        with self._lock:
+            if job["project_id"] in self._in_flight:
+                return False
+            self._in_flight[job["project_id"]] = self.stages[0][0]
+            self._jobs[job["project_id"]] = job
+        self._enqueue(job, 0)
+        return True
+
+    def cancel(self, project_id):
+        """Annule un job en cours : le ffmpeg en cours est tué, les étapes suivantes ne démarrent pas."""
+        with self._lock:
+            job = self._jobs.get(project_id)
+        if job is None:
+            return False
+        job["cancel"].set()
+        logging.warning(f"   🛑 Cancel requested: {project_id}")
+        return True
+
+    def in_flight(self):
+        """IDs des projets actuellement dans le pipeline (en file ou en cours)."""
+        with self._lock:
+            return set(self._in_flight)
+
+    def stages_in_flight(self):
+        """Étape courante de chaque projet en cours : {project_id: étape} (heartbeats du mode node)."""
+        with self._lock:
+            return dict(self._in_flight)
+
+    def snapshot(self):
+        """Copie des stats par étape (profondeur de file, attente moyenne/max)."""
+        with self._lock:
+            snap = {}
+            for name, st in self.stats.items():
+                finished = st["done"] + st["failed"] + st["running"]
+                snap[name] = dict(st)
+                snap[name]["wait_avg_s"] = round(st["wait_total_s"] / finished, 2) if finished else 0.0
+                snap[name]["limit"] = self.limits.get(name, 1)
+            return snap
+
+    def log_stats(self):
+        for name, st in self.snapshot().items():
+            logging.info(
+                f"   📊 [{name}] queued {st['queued']} | running {st['running']}/{st['limit']} | "
+                f"done {st['done']} | failed {st['failed']} | wait avg {st['wait_avg_s']}s max {st['wait_max_s']}s"
+            )
+
+    def shutdown(self, wait=True):
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait)
+
+    # --- INTERNE ---
+
+    def _enqueue(self, job, idx):
+        name = self.stages[idx][0]
+        with self._lock:
+            self.stats[name]["queued"] += 1
+            self._in_flight[job["project_id"]] = name
+        self.pools[name].submit(self._run, job, idx, time.time())
+
+    def _run(self, job, idx, t_enqueued):
+        name, fn = self.stages[idx]
+        wait_s = time.time() - t_enqueued
+        with self._lock:
+            st = self.stats[name]
+            st["queued"] -= 1
+            st["running"] += 1
+            st["wait_total_s"] += wait_s
+            st["wait_max_s"] = round(max(st["wait_max_s"], wait_s), 2)
+        job.setdefault("waits", {})[name] = round(wait_s, 2)
+        metrics_v2.observe_wait(job, name, wait_s)
+        if idx == 0 and job.get("first_seen"):
+            # Détection -> début du travail : stabilité + file de jobs + attente du pool
+            job["ingest_latency_s"] = round(time.time() - job["first_seen"], 2)
+            metrics_v2.observe_ingest(job, job["ingest_latency_s"])
+
+        logging.info(f"   ▶️ [{name}] {job['project_id']} (waited {wait_s:.1f}s)")
+        try:
+            ok = run_stage(job, name, fn)
+        except Exception:
+            # Sinon l'exception reste dans le Future : job jamais finalisé, ligne de file bloquée en "running"
+            logging.exception(f"   🔥 [{name}] {job['project_id']} crashed")
+            ok = False
+
+        with self._lock:
+            st["running"] -= 1
+            st["done" if ok else "failed"] += 1
+
+        if ok and idx + 1 < len(self.stages):
+            self._enqueue(job, idx + 1)
+            return
+
+        success = False
+        if ok:
+            try:
+                success = finalize_job(job)
+            except Exception as e:
+                logging.error(f"   ❌ Finalize crashed for {job['project_id']}: {e}")
+        with self._lock:
+            self._in_flight.pop(job["project_id"], None)
+            self._jobs.pop(job["project_id"], None)
+        if self.on_done:
+            self.on_done(job, success)
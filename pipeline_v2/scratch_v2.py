@@ -0,0 +1,132 @@
+"""
+Zone de travail (scratch) pour les fichiers intermédiaires des étapes.
+
+Les segments d'encodage et autres fichiers jetables ne sont plus écrits dans
+le dossier de production (stockage lent, partagé avec la lecture des masters)
+mais sous SCRATCH_DIR, sur un volume rapide (NVMe local, tmpfs).
+
+- Un dossier par process (<hôte>-<pid>), un sous-dossier par job et par étape.
+- Budget global SCRATCH_BUDGET_GB : une étape réserve ses octets (estimés) avant
+  de démarrer et attend que d'autres libèrent la place. Une étape plus grosse que
+  le budget, ou qui attend trop, travaille dans le dossier temp/ du projet.
+- cleanup() au démarrage supprime les dossiers laissés par un process mort (crash),
+  et les temp/ de repli des projets qui ne sont plus en cours.
+
+Usage :
+    with scratch_v2.reserve(job, "encode", nbytes) as work_dir:
+        ...  # fichiers intermédiaires dans work_dir, supprimé à la fin de l'étape
+"""
+import os
+import time
+import shutil
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+import config
+
+_cond = threading.Condition()
+_reserved = {}  # (project_id, étape) -> octets réservés
+
+def owner_dir():
+    """Dossier scratch de ce process."""
+    return config.SCRATCH_DIR / f"{socket.gethostname()}-{os.getpid()}"
+
+def job_dir(project_id):
+    return owner_dir() / project_id
+
+def budget_bytes():
+    return int(config.SCRATCH_BUDGET_GB * 1024 ** 3)
+
+def reserved_bytes():
+    with _cond:
+        return sum(_reserved.values())
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _size(path):
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+def cleanup(prod_areas=(), busy=()):
+    """
+    Supprime les dossiers scratch des process morts de cette machine, et le temp/ de repli
+    des projets de `prod_areas` hors `busy` (projets encore en cours ailleurs). Retourne les octets libérés.
+    """
+    host = socket.gethostname()
+    stale = []
+    if config.SCRATCH_DIR.exists():
+        for d in config.SCRATCH_DIR.iterdir():
+            name, _, pid = d.name.rpartition("-")
+            if d.is_dir() and name == host and pid.isdigit() and not _alive(int(pid)):
+                stale.append(d)
+    for area in prod_areas:
+        if area.exists():
+            stale.extend(d for d in area.glob("*/temp") if d.is_dir() and d.parent.name not in busy)
+
+    freed, removed = 0, 0
+    for d in stale:
+        try:
+            freed += _size(d)
+        except OSError:
+            pass
+        shutil.rmtree(d, ignore_errors=True)
+        removed += 1
+    if removed:
+        logging.info(f"   🧹 Scratch cleanup: {removed} stale dir(s), {freed / 1024 ** 3:.1f} GB freed")
+    return freed
+
+def _fits(nbytes):
+    if sum(_reserved.values()) + nbytes > budget_bytes():
+        return False
+    try:
+        config.SCRATCH_DIR.mkdir(parents=True, exist_ok=True)
+        return shutil.disk_usage(config.SCRATCH_DIR).free >= nbytes
+    except OSError:
+        return False
+
+@contextmanager
+def reserve(job, stage, nbytes):
+    """
+    Réserve `nbytes` pour l'étape et donne son dossier de travail (vide, supprimé en sortie).
+    Sans place après SCRATCH_MAX_WAIT (ou étape plus grosse que le budget) : temp/ du projet.
+    """
+    key = (job["project_id"], stage)
+    work_dir = job_dir(job["project_id"]) / stage
+    t = time.time()
+    with _cond:
+        if nbytes > budget_bytes():
+            work_dir = None
+        while work_dir is not None and nbytes and not _fits(nbytes):
+            if job["cancel"].is_set() or time.time() - t >= config.SCRATCH_MAX_WAIT:
+                work_dir = None
+                break
+            _cond.wait(5)
+        if work_dir is not None and nbytes:
+            _reserved[key] = nbytes
+
+    if work_dir is None:
+        work_dir = job["prod_dir"] / "temp" / stage
+        logging.warning(f"   ⚠️ Scratch full for {stage} ({nbytes / 1024 ** 3:.1f} GB): using {work_dir}")
+    elif nbytes:
+        logging.info(f"   💽 Scratch: {nbytes / 1024 ** 3:.1f} GB reserved for {stage}"
+                     f" ({reserved_bytes() / 1024 ** 3:.1f}/{config.SCRATCH_BUDGET_GB:.0f} GB)")
+    work_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        yield work_dir
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        with _cond:
+            _reserved.pop(key, None)
+            _cond.notify_all()
+
+def release(job):
+    """Fin du job : supprime son dossier scratch (et l'ancien temp/ du projet s'il existe)."""
+    shutil.rmtree(job_dir(job["project_id"]), ignore_errors=True)
+    shutil.rmtree(job["prod_dir"] / "temp", ignore_errors=True)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Service de transcription résident (Whisper).
+
+Le modèle est chargé UNE seule fois au démarrage du service, puis le watcher
+et n'importe quel nombre de workers lui envoient leurs fichiers audio via un
+socket local (multiprocessing.connection). Chaque réponse indique le temps de
+chargement vs le temps de transcription.
+
+En mode "vad" (config.TRANSCRIBE_MODE), l'audio est découpé aux silences
+(vad_v2) et les fenêtres de parole sont transcrites en parallèle par un pool de
+TRANSCRIBE_WORKERS process (un modèle chacun). Les timestamps sont recalés puis
+fusionnés en un seul résultat. La mémoire d'un worker dépend de la taille d'une
+fenêtre, plus de la durée de la vidéo.
+
+Usage :
+    python transcriber_v2.py --model base --threads 4
+"""
+import sys
+import time
+import logging
+import argparse
+import threading
+import subprocess
+import warnings
+import multiprocessing
+from pathlib import Path
+from multiprocessing.connection import Listener, Client
+import config
+import vad_v2
+
+# Suppress Whisper warnings
+warnings.filterwarnings("ignore")
+
+# Modèle chargé (un par process : service OU fallback local d'un worker)
+_model = None
+_model_name = None
+_model_load_s = 0.0
+_model_lock = threading.Lock()
+
+# Pool de process Whisper (mode "vad")
+_pool = None
+_pool_lock = threading.Lock()
+
+# --- MODELE ---
+
+def get_model(model_name=None, threads=None):
+    """Charge le modèle Whisper si besoin. Retourne (model, load_s) où load_s = 0 si déjà en mémoire."""
+    global _model, _model_name, _model_load_s
+    if _model is not None and model_name in (None, _model_name):
+        return _model, 0.0
+    model_name = model_name or config.WHISPER_MODEL
+
+    import torch
+    import whisper
+    torch.set_num_threads(threads or config.WHISPER_THREADS)
+
+    t = time.time()
+    _model = whisper.load_model(model_name)
+    _model_name = model_name
+    _model_load_s = round(time.time() - t, 2)
+    logging.info(f"   🧠 Whisper '{model_name}' loaded in {_model_load_s}s")
+    return _model, _model_load_s
+
+def _to_whisper_input(audio):
+    """Buffer PCM s16le 16 kHz mono (bytes) -> tableau float32 attendu par Whisper."""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        import numpy as np
+        return np.frombuffer(audio, dtype=np.int16).astype(np.float32) / 32768.0
+    return audio
+
+def _to_pcm(audio):
+    """Chemin, tableau float32 ou buffer -> buffer PCM s16le 16 kHz mono."""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return audio
+    if isinstance(audio, str):
+        import runner_v2
+        return runner_v2.run([
+            config.FFMPEG, "-i", audio, "-vn", "-ac", "1", "-ar", str(vad_v2.SAMPLE_RATE), "-f", "s16le", "pipe:1"
+        ], capture_stdout=True)
+    import numpy as np
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+# --- MODE VAD (fenêtres en parallèle) ---
+
+def _init_worker(model_name, threads):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    warnings.filterwarnings("ignore")
+    get_model(model_name, threads)
+
+def _worker_ready(_):
+    return _model_load_s
+
+def _transcribe_chunk(args):
+    """(pcm, début_s, options) -> segments de la fenêtre, timestamps recalés sur la vidéo."""
+    pcm, offset, options = args
+    model, _ = get_model()
+    result = model.transcribe(_to_whisper_input(pcm), **options)
+    segments = []
+    for seg in result.get("segments", []):
+        segments.append({
+            "start": round(seg["start"] + offset, 3),
+            "end": round(seg["end"] + offset, 3),
+            "text": seg["text"],
+            "avg_logprob": seg.get("avg_logprob"),
+            "no_speech_prob": seg.get("no_speech_prob"),
+        })
+    return {"language": result.get("language"), "segments": segments}
+
+def _get_pool():
+    """Pool de TRANSCRIBE_WORKERS process, modèle chargé dans chacun. Retourne (pool, load_s)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            return _pool, 0.0
+        workers = max(1, config.TRANSCRIBE_WORKERS)
+        threads = max(1, config.WHISPER_THREADS // workers)
+        t = time.time()
+        pool = multiprocessing.get_context("spawn").Pool(
+            workers, initializer=_init_worker, initargs=(config.WHISPER_MODEL, threads)
+        )
+        pool.map(_worker_ready, range(workers)) # Attend le chargement des modèles
+        _pool = pool
+        load_s = round(time.time() - t, 2)
+        logging.info(f"   🧠 Whisper pool ready: {workers} workers x {threads} threads in {load_s}s")
+        return _pool, load_s
+
+def merge_results(parts):
+    """Fusionne les résultats des fenêtres (dans l'ordre) en un résultat Whisper unique pour write_subtitles."""
+    segments = []
+    for part in parts:
+        for seg in part["segments"]:
+            segments.append({"id": len(segments), **seg})
+    return {
+        "text": "".join(seg["text"] for seg in segments),
+        "segments": segments,
+        "language": next((p["language"] for p in parts if p.get("language")), None)
+    }
+
+def _transcribe_chunked(audio, options):
+    pcm = _to_pcm(audio)
+    chunks = vad_v2.speech_chunks(pcm)
+    total_s = len(pcm) / vad_v2.BYTES_PER_SAMPLE / vad_v2.SAMPLE_RATE
+    speech_s = sum(e - s for s, e in chunks)
+    if not chunks:
+        logging.info(f"   🤫 No speech detected in {total_s:.0f}s of audio")
+        return {"text": "", "segments": [], "language": options.get("language")}, 0.0, 0.0
+
+    pool, load_s = _get_pool()
+    t = time.time()
+    jobs = [(bytes(vad_v2.pcm_slice(pcm, s, e)), s, options) for s, e in chunks[:1]]
+    first = pool.map(_transcribe_chunk, jobs)[0]
+    # Langue détectée sur la 1ère fenêtre, imposée aux suivantes (cohérence + pas de re-détection)
+    opts = {**options, "language": options.get("language") or first["language"]}
+    rest = pool.imap(_transcribe_chunk, ((bytes(vad_v2.pcm_slice(pcm, s, e)), s, opts) for s, e in chunks[1:]))
+    result = merge_results([first, *rest])
+    transcribe_s = round(time.time() - t, 2)
+    logging.info(f"   🗣️ VAD: {len(chunks)} windows, {speech_s:.0f}s of speech / {total_s:.0f}s")
+    return result, load_s, transcribe_s
+
+def _transcribe_local(audio, options):
+    """Transcription dans le process du service (pool de fenêtres en mode "vad")."""
+    if config.TRANSCRIBE_MODE == "vad":
+        return _transcribe_chunked(audio, options)
+    return _transcribe_single(audio, options)
+
+def _transcribe_single(audio, options):
+    """Transcription d'un bloc par un seul modèle, chargé dans le process courant et gardé entre deux appels."""
+    audio = _to_whisper_input(audio)
+    with _model_lock:
+        model, load_s = get_model()
+        t = time.time()
+        result = model.transcribe(audio, **options)
+        transcribe_s = round(time.time() - t, 2)
+    return result, load_s, transcribe_s
+
+# --- SERVICE ---
+
+def _handle(conn):
+    """Traite une connexion client (une requête = un fichier audio)."""
+    try:
+        req = conn.recv()
+        if req.get("cmd") == "ping":
+            conn.send({"ok": True, "model": _model_name, "model_load_s": _model_load_s})
+            return
+
+        t_wait = time.time()
+        result, load_s, transcribe_s = _transcribe_local(req["audio"], req.get("options", {}))
+        wait_s = round(time.time() - t_wait - load_s - transcribe_s, 2)
+
+        logging.info(f"   🎙️ {req.get('label', '?')}: load {load_s}s | wait {wait_s}s | transcribe {transcribe_s}s")
+        conn.send({
+            "ok": True,
+            "result": result,
+            "load_s": load_s,
+            "wait_s": wait_s,
+            "transcribe_s": transcribe_s
+        })
+    except Exception as e:
+        logging.error(f"   ❌ Transcription failed: {e}")
+        try:
+            conn.send({"ok": False, "error": str(e)})
+        except Exception:
+            pass
+    finally:
+        conn.close()
+
+def serve(model_name=None, threads=None):
+    """Boucle principale du service : charge le modèle (ou le pool en mode vad) puis répond aux clients."""
+    if config.TRANSCRIBE_MODE == "vad":
+        config.WHISPER_MODEL = model_name or config.WHISPER_MODEL
+        config.WHISPER_THREADS = threads or config.WHISPER_THREADS
+        _get_pool()
+    else:
+        get_model(model_name, threads)
+    listener = Listener(config.TRANSCRIBER_ADDRESS, authkey=config.TRANSCRIBER_AUTHKEY)
+    logging.info(f"🎙️ TRANSCRIBER READY on {config.TRANSCRIBER_ADDRESS[0]}:{config.TRANSCRIBER_ADDRESS[1]}")
+
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            logging.warning(f"   ⚠️ Rejected connection: {e}")
+            continue
+        # Un thread par client : les requêtes sont sérialisées sur le modèle,
+        # mais un client lent à envoyer ne bloque pas les autres.
+        threading.Thread(target=_handle, args=(conn,), daemon=True).start()
+
+# --- CLIENT ---
+
+def _connect():
+    return Client(config.TRANSCRIBER_ADDRESS, authkey=config.TRANSCRIBER_AUTHKEY)
+
+def is_running():
+    """True si un service répond sur le socket local."""
+    try:
+        conn = _connect()
+        conn.send({"cmd": "ping"})
+        ok = conn.recv().get("ok", False)
+        conn.close()
+        return ok
+    except (ConnectionRefusedError, OSError, EOFError):
+        return False
+
+def ensure_service(wait=60):
+    """Démarre le service en arrière-plan s'il ne tourne pas déjà (appelé par le watcher)."""
+    if is_running():
+        return True
+
+    logging.info("   🎙️ Starting transcriber service...")
+    log_file = open(config.BASE_DIR / "transcriber_v2.log", "a")
+    subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve())],
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        cwd=str(Path(__file__).parent),
+        start_new_session=True
+    )
+
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        if is_running():
+            return True
+        time.sleep(1)
+    logging.warning("   ⚠️ Transcriber service not reachable, workers will load Whisper locally.")
+    return False
+
+def transcribe(audio, label="", **options):
+    """
+    Transcrit `audio` (chemin, tableau numpy 16 kHz ou buffer PCM s16le 16 kHz mono)
+    via le service résident. Le buffer PCM est envoyé tel quel (2x plus léger que du float32).
+    Si le service est injoignable, on retombe sur UN modèle chargé dans ce process, sans découpage VAD :
+    pas de pool de TRANSCRIBE_WORKERS modèles qui resterait chargé dans le watcher.
+    """
+    if isinstance(audio, Path):
+        audio = str(audio)
+
+    t = time.time()
+    try:
+        conn = _connect()
+    except (ConnectionRefusedError, OSError):
+        conn = None
+
+    if conn is None:
+        logging.warning("   ⚠️ Transcriber service down, using local model.")
+        result, load_s, transcribe_s = _transcribe_single(audio, options)
+        logging.info(f"   🎙️ Whisper (local): load {load_s}s | transcribe {transcribe_s}s")
+        return result
+
+    try:
+        conn.send({"audio": audio, "label": label, "options": options})
+        resp = conn.recv()
+    finally:
+        conn.close()
+
+    if not resp.get("ok"):
+        raise RuntimeError(resp.get("error", "transcriber error"))
+
+    total_s = round(time.time() - t, 2)
+    logging.info(
+        f"   🎙️ Whisper (service): load {resp['load_s']}s | wait {resp['wait_s']}s | "
+        f"transcribe {resp['transcribe_s']}s | total {total_s}s"
+    )
+    return resp["result"]
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="Resident Whisper transcription service")
+    parser.add_argument("--model", default=config.WHISPER_MODEL, help="Whisper model size (tiny, base, small...)")
+    parser.add_argument("--threads", type=int, default=config.WHISPER_THREADS, help="CPU threads for torch")
+    args = parser.parse_args()
+
+    serve(args.model, args.threads)
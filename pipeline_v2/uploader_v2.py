@@ -0,0 +1,207 @@
+"""
+Upload résumable vers Bunny Stream (protocole TUS).
+
+Le fichier est envoyé par morceaux (UPLOAD_CHUNK_SIZE). Si le serveur supporte
+l'extension TUS "concatenation", le fichier est découpé en plusieurs parties
+envoyées en parallèle (UPLOAD_PARALLEL_CHUNKS) puis assemblées côté Bunny.
+
+L'état (URL TUS + offset de chaque partie) est gardé dans un dict fourni par
+l'appelant et sauvegardé après chaque morceau via `save_state` : après un crash
+ou un redémarrage du watcher, l'upload reprend là où il s'était arrêté.
+"""
+import time
+import base64
+import hashlib
+import logging
+import threading
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import config
+import bunny_client
+
+_concat_supported = None
+EXPIRED_STATUS = (404, 410)  # URL TUS inconnue ou expirée côté Bunny : reprise impossible
+
+class Cancelled(Exception):
+    """Upload interrompu par l'appelant (job annulé, bail perdu) : l'état reste reprenable."""
+
+def _expired(error):
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in EXPIRED_STATUS
+
+def _b64(value):
+    return base64.b64encode(str(value).encode()).decode()
+
+def _auth_headers(lib_id, api_key, guid):
+    """Headers d'authentification TUS Bunny : sha256(library_id + api_key + expiration + video_id)."""
+    expire = int(time.time()) + config.TUS_SIGNATURE_TTL
+    signature = hashlib.sha256(f"{lib_id}{api_key}{expire}{guid}".encode()).hexdigest()
+    return {
+        "AuthorizationSignature": signature,
+        "AuthorizationExpire": str(expire),
+        "VideoId": guid,
+        "LibraryId": str(lib_id),
+        "Tus-Resumable": "1.0.0"
+    }
+
+def supports_concatenation():
+    """True si l'endpoint TUS annonce l'extension "concatenation" (uploads parallèles)."""
+    global _concat_supported
+    if _concat_supported is None:
+        try:
+            resp = bunny_client.request("OPTIONS", config.TUS_ENDPOINT, headers={"Tus-Resumable": "1.0.0"})
+            _concat_supported = "concatenation" in resp.headers.get("Tus-Extension", "")
+        except requests.RequestException:
+            _concat_supported = False
+    return _concat_supported
+
+def _create_upload(auth, length, title, partial=False):
+    headers = dict(auth)
+    headers["Upload-Length"] = str(length)
+    headers["Upload-Metadata"] = f"filetype {_b64('video/mp4')},title {_b64(title)}"
+    if partial:
+        headers["Upload-Concat"] = "partial"
+    resp = bunny_client.request("POST", config.TUS_ENDPOINT, headers=headers)
+    resp.raise_for_status()
+    return urljoin(config.TUS_ENDPOINT, resp.headers["Location"])
+
+def _remote_offset(url, auth):
+    """Offset réellement reçu par le serveur (HEAD TUS)."""
+    resp = bunny_client.request("HEAD", url, headers=auth)
+    resp.raise_for_status()
+    return int(resp.headers["Upload-Offset"])
+
+def _upload_part(file_path, part, auth, lock, persist, cancel=None, title="", partial=False):
+    """
+    Envoie une partie morceau par morceau, en reprenant à l'offset serveur après une coupure.
+    Si Bunny a expiré l'upload (404/410), la partie repart de zéro dans un nouvel upload.
+    """
+    retries = 0
+    with open(file_path, "rb") as f:
+        while part["offset"] < part["length"]:
+            if cancel is not None and cancel.is_set():
+                raise Cancelled()
+            f.seek(part["start"] + part["offset"])
+            chunk = f.read(min(config.UPLOAD_CHUNK_SIZE, part["length"] - part["offset"]))
+            headers = dict(auth)
+            headers["Upload-Offset"] = str(part["offset"])
+            headers["Content-Type"] = "application/offset+octet-stream"
+            try:
+                # PATCH direct sur la session partagée : la reprise se fait ici, à l'offset serveur
+                resp = bunny_client.session().patch(part["url"], headers=headers, data=chunk,
+                                                    timeout=(config.BUNNY_TIMEOUT[0], config.UPLOAD_CHUNK_TIMEOUT))
+                resp.raise_for_status()
+                with lock:
+                    part["offset"] = int(resp.headers.get("Upload-Offset", part["offset"] + len(chunk)))
+                    persist()
+                retries = 0
+            except requests.RequestException as e:
+                retries += 1
+                if retries > config.UPLOAD_MAX_RETRIES:
+                    raise
+                if _expired(e):
+                    logging.warning(f"   ⚠️ Upload part at {part['start']} expired on Bunny, restarting it")
+                    with lock:
+                        part["url"] = _create_upload(auth, part["length"], title, partial=partial)
+                        part["offset"] = 0
+                        persist()
+                    continue
+                wait = min(2 ** retries, 60)
+                logging.warning(f"   ⚠️ Chunk failed at {part['start'] + part['offset']} ({e}), retry {retries} in {wait}s")
+                time.sleep(wait)
+                try:
+                    with lock:
+                        part["offset"] = _remote_offset(part["url"], auth)
+                        persist()
+                except requests.RequestException:
+                    pass
+
+def upload_file(file_path, lib_id, api_key, guid, title="", state=None, save_state=None, cancel=None):
+    """
+    Upload TUS résumable de `file_path` dans la vidéo Bunny `guid`.
+    `state` est modifié sur place ; `save_state()` est appelé après chaque morceau.
+    `cancel` (threading.Event) est vérifié entre deux morceaux : l'upload s'arrête s'il est levé.
+    Retourne True si le fichier est complètement reçu par Bunny.
+    """
+    state = {} if state is None else state
+    lock = threading.Lock()
+
+    def persist():
+        if save_state:
+            save_state()
+
+    # Un état ne vaut que pour le même fichier, dans la même vidéo Bunny
+    stat = file_path.stat()
+    identity = {"lib_id": str(lib_id), "guid": guid, "size": stat.st_size, "mtime": int(stat.st_mtime)}
+    if any(state.get(k) != v for k, v in identity.items()):
+        state.clear()
+        state.update(identity)
+
+    if state.get("done"):
+        logging.info(f"   ⏭️ Already uploaded: {file_path.name}")
+        return True
+
+    auth = _auth_headers(lib_id, api_key, guid)
+    t = time.time()
+    try:
+        # 1. Plan : une partie (séquentiel) ou N parties (concatenation TUS)
+        if not state.get("parts"):
+            size = stat.st_size
+            n = 1
+            if config.UPLOAD_PARALLEL_CHUNKS > 1 and size > config.UPLOAD_CHUNK_SIZE * 2 and supports_concatenation():
+                n = min(config.UPLOAD_PARALLEL_CHUNKS, size // config.UPLOAD_CHUNK_SIZE)
+            part_len = -(-size // n)
+            parts = []
+            for i in range(n):
+                start = i * part_len
+                length = min(part_len, size - start)
+                parts.append({
+                    "url": _create_upload(auth, length, title, partial=n > 1),
+                    "start": start,
+                    "length": length,
+                    "offset": 0
+                })
+            with lock:
+                state["parts"] = parts
+                state["concat"] = n > 1
+                persist()
+        else:
+            resumed = sum(p["offset"] for p in state["parts"])
+            logging.info(f"   ↩️ Resuming upload of {file_path.name} at {resumed / stat.st_size:.0%}")
+
+        # 2. Envoi des parties (en parallèle si plusieurs)
+        parts = state["parts"]
+        with ThreadPoolExecutor(max_workers=len(parts)) as pool:
+            futures = [pool.submit(_upload_part, file_path, p, auth, lock, persist, cancel, title, state.get("concat"))
+                       for p in parts]
+            for fut in futures:
+                fut.result()
+
+        # 3. Assemblage final
+        if state.get("concat"):
+            headers = dict(auth)
+            headers["Upload-Concat"] = "final;" + " ".join(p["url"] for p in parts)
+            headers["Upload-Metadata"] = f"filetype {_b64('video/mp4')},title {_b64(title)}"
+            resp = bunny_client.request("POST", config.TUS_ENDPOINT, headers=headers)
+            if resp.status_code in EXPIRED_STATUS:
+                # Une partie terminée a expiré avant l'assemblage : le prochain essai repart de zéro
+                with lock:
+                    state.pop("parts", None)
+                    persist()
+            resp.raise_for_status()
+
+        with lock:
+            state["done"] = True
+            persist()
+    except Cancelled:
+        logging.warning(f"   🛑 Upload of {file_path.name} cancelled")
+        return False
+    except (requests.RequestException, KeyError, ValueError) as e:
+        logging.error(f"   ❌ TUS upload failed for {file_path.name}: {e}")
+        return False
+
+    dur = time.time() - t
+    mbps = stat.st_size / 1e6 / dur if dur else 0
+    logging.info(f"   ☁️ Uploaded {file_path.name} ({len(state['parts'])} part(s), {dur:.1f}s, {mbps:.1f} MB/s)")
+    return True
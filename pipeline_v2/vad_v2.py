@@ -0,0 +1,104 @@
+"""
+Détection d'activité vocale (VAD) par énergie, sur un buffer PCM s16le 16 kHz mono.
+
+L'audio a déjà été normalisé (-16 LUFS) et débruité par l'étape audio : un
+seuil fixe en dBFS suffit à séparer la parole des silences. Le buffer est lu
+par blocs (mémoire bornée, même sur plusieurs heures d'audio).
+
+speech_chunks() retourne des fenêtres [(début_s, fin_s), ...] prêtes à être
+transcrites indépendamment : les longs silences sont retirés et chaque
+fenêtre dure au plus TRANSCRIBE_CHUNK_SECONDS.
+"""
+import math
+import config
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2
+BLOCK_FRAMES = 1000  # Trames analysées par bloc (30 s à 30 ms/trame)
+
+def frame_levels(pcm, frame_ms=None):
+    """Niveau (dBFS) de chaque trame de frame_ms millisecondes."""
+    import numpy as np
+    frame_ms = frame_ms or config.VAD_FRAME_MS
+    frame_len = SAMPLE_RATE * frame_ms // 1000
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    n_frames = len(samples) // frame_len
+
+    levels = []
+    for start in range(0, n_frames, BLOCK_FRAMES):
+        stop = min(start + BLOCK_FRAMES, n_frames)
+        block = samples[start * frame_len:stop * frame_len].astype(np.float32).reshape(-1, frame_len)
+        rms = np.sqrt(np.mean(block * block, axis=1)) / 32768.0
+        levels.extend((20 * np.log10(rms + 1e-10)).tolist())
+    return levels
+
+def speech_regions(levels, frame_ms=None):
+    """Zones de parole [(début_s, fin_s)] : trames au-dessus du seuil, petits silences comblés, padding."""
+    frame_s = (frame_ms or config.VAD_FRAME_MS) / 1000
+    regions = []
+    start = None
+    for i, db in enumerate(levels):
+        if db > config.VAD_THRESHOLD_DBFS:
+            if start is None:
+                start = i
+        elif start is not None:
+            regions.append([start * frame_s, i * frame_s])
+            start = None
+    if start is not None:
+        regions.append([start * frame_s, len(levels) * frame_s])
+
+    # Comble les pauses courtes (entre deux mots), retire les bruits isolés
+    merged = []
+    for r in regions:
+        if merged and r[0] - merged[-1][1] < config.VAD_MIN_SILENCE:
+            merged[-1][1] = r[1]
+        else:
+            merged.append(r)
+    total = len(levels) * frame_s
+    return [
+        (max(0.0, s - config.VAD_PAD), min(total, e + config.VAD_PAD))
+        for s, e in merged if e - s >= config.VAD_MIN_SPEECH
+    ]
+
+def _quietest_cut(levels, start_s, end_s, frame_s):
+    """Point de coupe dans le dernier quart de [start_s, end_s] : la trame la plus silencieuse."""
+    lo = int((start_s + (end_s - start_s) * 0.75) / frame_s)
+    hi = max(lo + 1, int(end_s / frame_s))
+    window = levels[lo:hi]
+    if not window:
+        return end_s
+    return (lo + window.index(min(window))) * frame_s
+
+def speech_chunks(pcm, max_chunk=None, frame_ms=None):
+    """
+    Fenêtres à transcrire [(début_s, fin_s)].
+    - Les zones de parole proches sont regroupées (Whisper travaille par fenêtres de 30 s :
+      des morceaux trop courts gaspilleraient du calcul).
+    - Un silence de plus de VAD_DROP_GAP secondes coupe la fenêtre : il n'est pas transcrit.
+    - Une fenêtre dépasse rarement max_chunk ; une zone de parole plus longue est coupée
+      sur sa trame la plus silencieuse.
+    """
+    frame_ms = frame_ms or config.VAD_FRAME_MS
+    frame_s = frame_ms / 1000
+    max_chunk = max_chunk or config.TRANSCRIBE_CHUNK_SECONDS
+    levels = frame_levels(pcm, frame_ms)
+
+    chunks = []
+    for start, end in speech_regions(levels, frame_ms):
+        if chunks and start - chunks[-1][1] <= config.VAD_DROP_GAP and end - chunks[-1][0] <= max_chunk:
+            chunks[-1][1] = end
+            continue
+        # Zone trop longue pour une seule fenêtre
+        while end - start > max_chunk:
+            cut = _quietest_cut(levels, start, start + max_chunk, frame_s)
+            cut = cut if cut > start else start + max_chunk
+            chunks.append([start, cut])
+            start = cut
+        chunks.append([start, end])
+    return [(round(s, 3), round(e, 3)) for s, e in chunks]
+
+def pcm_slice(pcm, start_s, end_s):
+    """Sous-buffer (sans copie) correspondant à [start_s, end_s]."""
+    a = int(math.floor(start_s * SAMPLE_RATE)) * BYTES_PER_SAMPLE
+    b = int(math.ceil(end_s * SAMPLE_RATE)) * BYTES_PER_SAMPLE
+    return memoryview(pcm)[a:b]
@@ -2,68 +2,149 @@ import time
 import shutil
 import json
 import logging
+import threading
 from pathlib import Path
 from datetime import datetime
 import config
-from worker_v2 import process_video
-
-# Setup Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("watcher_v2.log"),
-        logging.StreamHandler()
-    ]
-)
-
-def is_file_stable(path, wait_time=5):
-    """Vérifie si le fichier a fini d'être écrit (taille stable)."""
-    if not path.exists(): return False
-    
-    # Si c'est un dossier, on regarde la taille cumulée des fichiers
-    if path.is_dir():
-        def get_dir_size(p):
-            return sum(f.stat().st_size for f in p.glob('**/*') if f.is_file())
-            
-        size1 = get_dir_size(path)
-        # Si vide, on donne une chande (DaVinci peut prendre qqs secondes pour créer le fichier)
-        if size1 == 0:
-             time.sleep(wait_time)
-             size1 = get_dir_size(path)
-             if size1 == 0: return False # Toujours vide -> pas prêt
-             
-        time.sleep(wait_time)
-        size2 = get_dir_size(path)
-        # On veut que ça soit stable ET > 0
-        return size1 == size2 and size1 > 0
+import ingest_v2
+from worker_v2 import prepare_job, is_processed, find_master_video
+from scheduler_v2 import StageScheduler
+import transcriber_v2
+import catalog_publish
+import inventory_ledger
+import metrics_v2
+import job_queue
+import scratch_v2
+
+def setup_logging(log_file="watcher_v2.log"):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+
+def scan_candidates(active, done_cache, pending=None):
+    """
+    Projets non traités avec une vidéo master : {project_dir: (video_master, is_private)}.
+    Sans ffprobe (exports peut-être en cours de copie) : le master retenu au scan précédent (`pending`)
+    est gardé tant qu'il existe, sinon le plus gros fichier. Le choix est confirmé une fois stable (Detector.tick).
+    """
+    pending = pending or {}
+    candidates = {}
+    # Check des deux zones de production directement
+    for prod_area, is_private in [(config.PRODUCTION_PUBLIC, False), (config.PRODUCTION_PRIVATE, True)]:
+        if not prod_area.exists(): continue
         
-    else:
-        # Fichier simple
-        size1 = path.stat().st_size
-        time.sleep(wait_time)
-        if not path.exists(): return False # Peut avoir disparu entre temps
-        size2 = path.stat().st_size
-        return size1 == size2 and size1 > 0
-
-def find_master_video(folder_path):
-    """Trouve le fichier vidéo principal dans un dossier."""
-    video_extensions = {".mp4", ".mov", ".mkv", ".mxf", ".avi"}
-    candidates = []
-    
-    for f in folder_path.iterdir():
-        if f.is_file() and f.suffix.lower() in video_extensions:
-            # On ignore les fichiers systèmes cachés (type ._video.mov)
-            if f.name.startswith("."): continue
-            candidates.append(f)
+        # On scanne les PROJETS (dossiers)
+        entries = sorted(list(prod_area.iterdir()), key=lambda x: x.stat().st_mtime)
+        
+        for project_dir in entries:
+            if project_dir.name.startswith("."): continue 
+            if not project_dir.is_dir(): continue
+            if project_dir.name in active: continue
+
+            # 1. Check si déjà traité (status.json relu seulement s'il a changé)
+            status_file = project_dir / "status.json"
+            try:
+                status_mtime = status_file.stat().st_mtime
+            except OSError:
+                status_mtime = None
+            if status_mtime is not None and done_cache.get(project_dir) == status_mtime:
+                continue
+            if is_processed(project_dir):
+                done_cache[project_dir] = status_mtime
+                continue
+
+            # 2. Cherche la vidéo master
+            video_master = pending.get(project_dir, (None,))[0]
+            if not (video_master and video_master.is_file()):
+                video_master = find_master_video(project_dir, probe=False)
+            # Échec définitif avec ce master : on attend un nouvel export (ou retry_stuck.py)
+            if video_master and not job_queue.is_blocked(project_dir.name, video_master):
+                candidates[project_dir] = (video_master, is_private)
+    return candidates
+
+class Detector:
+    """Détection des exports prêts (événements fichiers + rescans + stabilité) -> file de jobs."""
+
+    def __init__(self):
+        # Événements fichiers (si watchdog dispo) + suivi de stabilité non bloquant
+        self.wake = threading.Event()
+        observer = ingest_v2.start_observer([config.PRODUCTION_PUBLIC, config.PRODUCTION_PRIVATE], self.wake)
+        self.rescan_interval = config.WATCH_RESCAN_INTERVAL if observer else config.WATCH_POLL_INTERVAL
+        self.tracker = ingest_v2.StabilityTracker()
+        self.done_cache = {}  # project_dir -> mtime du status.json déjà lu "terminé"
+        self.pending = {}     # project_dir -> (video_master, is_private)
+        self.last_scan = 0
+
+    def tick(self, busy=()):
+        """Un tour de détection (attend au plus WATCH_TICK). `busy` : projets déjà en cours ailleurs."""
+        woke = self.wake.wait(timeout=config.WATCH_TICK)
+        if woke:
+            time.sleep(config.WATCH_TICK) # Regroupe les rafales d'événements
+            self.wake.clear()
+
+        # 1. Scan des projets (sur événement, ou périodiquement par sécurité)
+        if woke or time.time() - self.last_scan >= self.rescan_interval:
+            self.pending = scan_candidates(set(busy) | job_queue.active_ids(), self.done_cache, self.pending)
+            self.tracker.prune(self.pending)
+            self.last_scan = time.time()
+
+        # 2. Stabilité : un simple stat() par candidat, chacun avec sa propre période de calme
+        for project_dir, (video_master, is_private) in list(self.pending.items()):
+            if not self.tracker.observe(project_dir, video_master):
+                continue
+
+            # Fichier stable : choix définitif avec ffprobe (un autre master retenu repart pour sa période de calme)
+            best = find_master_video(project_dir) or video_master
+            if best != video_master:
+                logging.info(f"   🔀 {project_dir.name}: master is {best.name}, not {video_master.name}")
+                self.pending[project_dir] = (best, is_private)
+                continue
+
+            project_id = project_dir.name
+            first_seen = self.tracker.first_seen(project_dir)
+            self.tracker.forget(project_dir)
+            del self.pending[project_dir]
+            logging.info(f"✨ NEW DETECTED (V3): {project_id} | File: {video_master.name} | detect->queue {time.time() - first_seen:.1f}s")
             
-    if not candidates: return None
-    
-    # On prend le plus gros fichier pour éviter les proxies ou fichiers temporaires
-    best_candidate = max(candidates, key=lambda x: x.stat().st_size)
-    return best_candidate
+            # 3. FILE DE JOBS (persistante, par priorité) ; la latence d'ingest est mesurée au début du job
+            job_queue.enqueue(project_dir, video_master, is_private, first_seen=first_seen)
+
+def start_job(row, scheduler, on_error, node=False):
+    """
+    Prépare un job pris dans la file (row de job_queue) et le confie au scheduler. on_error(project_id, message).
+    node : job pris par un worker distant (coordinator_v2.py) ; le catalogue est mis à jour par le coordinateur.
+    """
+    video_master = Path(row["video_path"])
+    if not video_master.exists():
+        logging.error(f"❌ Master missing for {row['project_id']}: {video_master}")
+        on_error(row["project_id"], "master missing")
+        return None
+    logging.info(f"⚙️ Starting {row['project_id']} (attempt {row['attempts']}, priority {row['priority']})...")
+    try:
+        job = prepare_job(
+            project_id=row["project_id"],
+            prod_dir=Path(row["prod_dir"]), # Le dossier EST le dossier de prod
+            video_path=video_master,
+            is_private=row["is_private"]
+        )
+    except Exception as e:
+        logging.error(f"❌ Cannot prepare {row['project_id']}: {e}")
+        on_error(row["project_id"], str(e))
+        return None
+    # Latence d'ingest (mesurée par le scheduler au début de la première étape) : première tentative seulement
+    job["first_seen"] = row.get("first_seen") if row["attempts"] == 1 else None
+    if node:
+        job["node"] = True
+    scheduler.submit(job)
+    return job
 
 def main():
+    setup_logging()
     logging.info("👀 WATCHER V3 (DIRECT-PROD) STARTED")
     logging.info(f"   Public Prod Area : {config.PRODUCTION_PUBLIC}")
     logging.info(f"   Private Prod Area: {config.PRODUCTION_PRIVATE}")
@@ -72,49 +153,59 @@ def main():
     config.PRODUCTION_PUBLIC.mkdir(parents=True, exist_ok=True)
     config.PRODUCTION_PRIVATE.mkdir(parents=True, exist_ok=True)
 
+    # Service Whisper résident (chargé une fois pour tous les jobs)
+    transcriber_v2.ensure_service()
+
+    # File persistante : les jobs interrompus (crash, arrêt) repartent
+    job_queue.recover()
+    logging.info(f"   📋 Job queue: {job_queue.counts()}")
+
+    # Fichiers intermédiaires laissés par un watcher tué (crash, reboot) ; les jobs encore en bail sur un node gardent les leurs
+    leased = {j["project_id"] for j in job_queue.jobs("running")}
+    scratch_v2.cleanup([config.PRODUCTION_PUBLIC, config.PRODUCTION_PRIVATE], busy=leased)
+
+    def on_done(job, success):
+        if success:
+            logging.info(f"✅ DONE: {job['project_id']} | {job['timings']}")
+            job_queue.mark_done(job["project_id"])
+        else:
+            logging.error(f"❌ FAILED: {job['project_id']} | {job['timings']}")
+            last_stage = next(reversed(job["timings"]), "prepare")
+            job_queue.mark_failed(job["project_id"], f"failed at {last_stage}")
+
+    # Un pool par étape : un upload n'empêche plus un autre projet d'encoder
+    scheduler = StageScheduler(on_done=on_done)
+
+    # Endpoint Prometheus (/metrics) : histogrammes par étape + files du scheduler + API Bunny
+    metrics_v2.register_collector(lambda: metrics_v2.scheduler_lines(scheduler))
+    metrics_v2.start_server()
+
+    detector = Detector()
+    last_stats = time.time()
+    last_export = time.time()
+
     while True:
         try:
-            # Check des deux zones de production directement
-            for prod_area, is_private in [(config.PRODUCTION_PUBLIC, False), (config.PRODUCTION_PRIVATE, True)]:
-                if not prod_area.exists(): continue
-                
-                # On scanne les PROJETS (dossiers)
-                entries = sorted(list(prod_area.iterdir()), key=lambda x: x.stat().st_mtime)
-                
-                for project_dir in entries:
-                    if project_dir.name.startswith("."): continue 
-                    if not project_dir.is_dir(): continue
-
-                    # 1. Check si déjà traité
-                    if (project_dir / "status.json").exists():
-                        continue 
-
-                    # 2. Cherche une vidéo stable
-                    video_master = find_master_video(project_dir)
-                    
-                    if video_master and is_file_stable(video_master):
-                        project_id = project_dir.name
-                        logging.info(f"✨ NEW DETECTED (V3): {project_id} | File: {video_master.name}")
-                        
-                        # 3. PROCESS DIRECT
-                        logging.info(f"⚙️ Processing {project_id}...")
-                        success = process_video(
-                            project_id=project_id,
-                            prod_dir=project_dir, # Le dossier EST le dossier de prod
-                            video_path=video_master,
-                            is_private=is_private
-                        )
-                        
-                        if success:
-                            logging.info(f"✅ DONE: {project_id}")
-                        else:
-                            logging.error(f"❌ FAILED: {project_id}")
+            detector.tick(scheduler.in_flight())
+
+            # 4. PROCESS : on alimente le scheduler depuis la file, dans l'ordre de priorité
+            free = config.QUEUE_MAX_IN_FLIGHT - len(scheduler.in_flight())
+            for row in (job_queue.claim(free) if free > 0 else []):
+                start_job(row, scheduler, job_queue.mark_failed)
+
+            # Export JSON du catalogue groupé (une écriture pour N publications)
+            if time.time() - last_export >= config.CATALOG_EXPORT_INTERVAL:
+                catalog_publish.export_and_publish()
+                inventory_ledger.materialize_if_stale()
+                last_export = time.time()
+
+            if time.time() - last_stats >= config.SCHEDULER_STATS_INTERVAL:
+                scheduler.log_stats()
+                last_stats = time.time()
 
         except Exception as e:
             logging.error(f"🔥 CRITICAL WATCHER ERROR: {e}")
             time.sleep(5) 
-        
-        time.sleep(2)
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,28 @@
+import os
 import json
-import subprocess
-import requests
+import time
+import hashlib
 import logging
-import pandas as pd
-import shutil
-import whisper
 import warnings
+import threading
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import config
+import transcriber_v2
+import uploader_v2
+from bunny_client import BunnyClient
+import bunny_index
+import catalog_store
+import catalog_publish
+import inventory_ledger
+import dag_v2
+import metrics_v2
+import admission_v2
+import scratch_v2
+import assets_v2
+import runner_v2
+import probe_v2
 
 # Suppress Whisper warnings
 warnings.filterwarnings("ignore")
@@ -52,192 +66,272 @@ def write_subtitles(result, output_dir, file_stem):
         
     return vtt_path, srt_path, txt_path
 
-def process_audio_track(work_dir, video_path):
+# afftdn: FFT based denoiser
+# loudnorm: EBU R128 normalization (sort en 192 kHz -> on rééchantillonne)
+AUDIO_GRAPH = (
+    "[0:a:0]afftdn=nf=-25,loudnorm=I=-16:TP=-1.5:LRA=11,aresample=48000,asplit=2[enc][asr];"
+    "[asr]aresample=16000,aformat=sample_fmts=s16:channel_layouts=mono[asr16]"
+)
+AUDIO_BITRATE = "192k"
+
+# Paramètres vidéo communs à tous les formats (le débit est choisi par l'étape analysis)
+VIDEO_CODEC_ARGS = ["-c:v", "libx264", "-preset", config.ENCODE_PRESET]
+
+def video_rate_args(bitrate):
+    """Débit moyen + plafond VBV pour un format ({"bitrate": kbps, "maxrate": kbps})."""
+    b, m = bitrate["bitrate"], bitrate["maxrate"]
+    return ["-b:v", f"{b}k", "-maxrate", f"{m}k", "-bufsize", f"{2 * m}k"]
+
+def thread_args(threads):
+    """Options globales ffmpeg pour un budget de threads (admission_v2) ; [] si pas de budget."""
+    if not threads:
+        return []
+    return ["-filter_threads", str(threads), "-filter_complex_threads", str(threads)]
+
+def output_threads(threads):
+    """Threads de l'encodeur, à placer avant chaque sortie."""
+    return ["-threads", str(threads)] if threads else []
+
+def process_audio_track(work_dir, video_path, cancel=(), threads=None):
     """
-    1. Extract Audio
-    2. Denoise (afftdn)
-    3. Normalize (loudnorm -16 LUFS)
+    Un seul décodage du master, en streaming :
+    1. Denoise (afftdn)
+    2. Normalize (loudnorm -16 LUFS)
+    3. Split -> AAC 48 kHz (copié tel quel par l'encodeur)
+             -> PCM 16 kHz mono sur stdout (buffer mémoire pour Whisper)
+    Aucun WAV 48 kHz pleine longueur n'est écrit sur disque.
+    Retourne (clean_audio, asr_pcm) ou (None, None).
     """
-    raw_audio = work_dir / "raw_audio.wav"
-    clean_audio = work_dir / "clean_audio.wav"
-    
-    # Export WAV
-    cmd_extract = [
-        config.FFMPEG, "-y", "-i", str(video_path), 
-        "-vn", "-acodec", "pcm_s16le", "-ar", "48000", str(raw_audio)
-    ]
-    if not run_cmd(cmd_extract): return None
+    work_dir.mkdir(parents=True, exist_ok=True)
+    clean_audio = work_dir / "clean_audio.m4a"
 
-    # Process: Denoise + Normalize
-    # afftdn: FFT based denoiser
-    # loudnorm: EBU R128 normalization
     cmd_process = [
-        config.FFMPEG, "-y", "-i", str(raw_audio),
-        "-af", "afftdn=nf=-25,loudnorm=I=-16:TP=-1.5:LRA=11",
-        "-c:a", "pcm_s16le", "-ar", "48000", str(clean_audio)
+        config.FFMPEG, "-y", *thread_args(threads), "-i", str(video_path),
+        "-filter_complex", AUDIO_GRAPH,
+        "-map", "[enc]", "-c:a", "aac", "-b:a", AUDIO_BITRATE, *output_threads(threads), str(clean_audio),
+        "-map", "[asr16]", "-f", "s16le", "pipe:1"
     ]
-    
-    if run_cmd(cmd_process) and clean_audio.exists():
-        return clean_audio
-    return None
 
-def update_inventory_excel(project_data):
-    """Met à jour un fichier Excel global à la racine pour le suivi humain."""
-    excel_path = config.BASE_DIR / "INVENTORY.xlsx"
-    
-    # Données à plat pour l'Excel
-    flat_data = {
-        "ID Projet": project_data["id"],
-        "Date (UTC)": project_data["updated_at"],
-        "Type": "Privé" if project_data["is_private"] else "Public",
-        "Format": ", ".join(project_data["bunny_urls"].keys()),
-        "Lien Bunny": next(iter(project_data["bunny_urls"].values()), "") # Premier lien dispo
-    }
-    
-    df_new = pd.DataFrame([flat_data])
-    
-    if excel_path.exists():
-        try:
-            df_old = pd.read_excel(excel_path)
-            # On supprime l'ancienne ligne de ce projet si elle existe
-            df_old = df_old[df_old["ID Projet"] != project_data["id"]]
-            # On ajoute la nouvelle en haut
-            df_final = pd.concat([df_new, df_old], ignore_index=True)
-        except Exception as e:
-            logging.warning(f"   ⚠️ Excel read error ({e}), creating new.")
-            df_final = df_new
-    else:
-        df_final = df_new
-        
-    try:
-        df_final.to_excel(excel_path, index=False)
-        logging.info("   📊 Inventory Excel updated.")
-    except Exception as e:
-        logging.error(f"   ❌ Inventory Excel update failed: {e}")
+    asr_pcm = run_cmd_output(cmd_process, cancel=cancel, label="audio")
+    if asr_pcm is not None and clean_audio.exists():
+        return clean_audio, asr_pcm
+    return None, None
 
-def run_cmd(cmd_list):
-    """Exécute une commande système de manière sécurisée."""
+def run_cmd(cmd_list, duration=None, cancel=(), label=None):
+    """
+    Exécute une commande système (streaming : progression ffmpeg, fin de stderr seulement).
+    duration : durée du média produit, pour le % / ETA. cancel : Event(s) d'annulation.
+    """
+    return run_cmd_output(cmd_list, duration=duration, cancel=cancel, label=label, capture=False) is not None
+
+def run_cmd_output(cmd_list, duration=None, cancel=(), label=None, capture=True):
+    """Comme run_cmd, mais retourne le stdout brut (bytes) de la commande, ou None en cas d'échec."""
     cmd_str = " ".join([str(x) for x in cmd_list])
     logging.info(f"   RUN: {cmd_str}")
     try:
-        subprocess.run(cmd_list, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except subprocess.CalledProcessError as e:
-        logging.error(f"   ❌ CMD ERROR: {e.stderr.decode()}")
-        return False
+        return runner_v2.run(
+            cmd_list, capture_stdout=capture, duration=duration, cancel=cancel,
+            on_progress=runner_v2.log_progress(label or Path(str(cmd_list[0])).name)
+        )
+    except runner_v2.CommandError as e:
+        logging.error(f"   ❌ CMD ERROR ({e.reason}): {e.stderr_tail}")
+        return None
     except FileNotFoundError:
         logging.error(f"   ❌ TOOL MISSING: {cmd_list[0]}")
-        return False
+        return None
 
 def update_db(project_data):
-    """Met à jour le fichier JSON global pour Vercel."""
-    db_path = config.DB_FILE
-    data = []
-    if db_path.exists():
-        try:
-            data = json.loads(db_path.read_text())
-        except:
-            data = []
-    
-    # Upsert : On supprime l'ancien si existe, on met le nouveau en haut
-    data = [d for d in data if d["id"] != project_data["id"]]
-    data.insert(0, project_data)
-    
-    db_path.write_text(json.dumps(data, indent=2))
-    logging.info(f"   💾 Database updated ({len(data)} items)")
+    """Upsert du projet dans le catalogue (SQLite WAL). L'export JSON pour Vercel est fait à part."""
+    catalog_store.upsert(project_data)
+    logging.info(f"   💾 Database updated ({project_data['id']})")
 
 # --- CORE ---
 
 def bunny_get_or_create(title, api_key, lib_id):
-    """Cherche une vidéo par titre, ou la crée si elle n'existe pas. Retourne l'GUID."""
-    headers = {"AccessKey": api_key, "Content-Type": "application/json"}
+    """Cherche une vidéo par titre (index local, sans réseau), ou la crée si elle n'existe pas. Retourne l'GUID."""
+    client = BunnyClient(lib_id, api_key)
+    index = bunny_index.get_index(client=client)
     
-    # 1. Search
+    # 1. Search (index local, synchro incrémentale si trop vieux)
     try:
-        url = f"https://video.bunnycdn.com/library/{lib_id}/videos?search={title}"
-        resp = requests.get(url, headers=headers)
-        if resp.ok:
-            for item in resp.json().get("items", []):
-                if item["title"] == title:
-                    logging.info(f"   🐰 Found existing video: {item['guid']}")
-                    return item["guid"]
+        index.sync_if_stale()
     except Exception as e:
-        logging.warning(f"   ⚠️ Bunny search fail: {e}")
+        logging.warning(f"   ⚠️ Bunny index sync fail: {e}")
+    for guid in index.lookup(title):
+        logging.info(f"   🐰 Found existing video: {guid}")
+        return guid
 
     # 2. Create
     try:
-        url = f"https://video.bunnycdn.com/library/{lib_id}/videos"
-        resp = requests.post(url, headers=headers, json={"title": title})
-        if resp.ok:
-            guid = resp.json()["guid"]
-            logging.info(f"   🐰 Created new video: {guid}")
-            return guid
+        video = client.create_video(title)
+        index.add(video)
+        logging.info(f"   🐰 Created new video: {video['guid']}")
+        return video["guid"]
     except Exception as e:
         logging.error(f"   ❌ Bunny create fail: {e}")
         return None
-    return None
 
-def process_video(project_id, prod_dir, video_path, is_private):
-    """Pipeline complet V3: Audio Clean -> AI Subs -> Remux -> Upload."""
-    
-    # Config adaptée (Public vs Private)
-    API_KEY = config.API_KEY_PRIVATE if is_private else config.API_KEY_PUBLIC
-    LIB_ID = config.LIB_PRIVATE if is_private else config.LIB_PUBLIC
-    PULL_ZONE = config.PULL_ZONE_PRIVATE if is_private else config.PULL_ZONE_PUBLIC
+def find_master_video(folder_path, probe=True):
+    """
+    Trouve le fichier vidéo principal dans un dossier.
+    probe=False : classement par taille seulement (fichiers peut-être encore en cours de copie, pas de ffprobe).
+    """
+    video_extensions = {".mp4", ".mov", ".mkv", ".mxf", ".avi"}
+    candidates = []
     
-    # Dossiers de sortie
-    out_dir = prod_dir / "output"
-    formats_dir = out_dir / "formats"
-    captions_dir = out_dir / "captions"
-    tmp_dir = prod_dir / "temp"
+    for f in folder_path.iterdir():
+        if f.is_file() and f.suffix.lower() in video_extensions:
+            # On ignore les fichiers systèmes cachés (type ._video.mov)
+            if f.name.startswith("."): continue
+            candidates.append(f)
+            
+    if not candidates: return None
+    if not probe:
+        return max(candidates, key=lambda f: f.stat().st_size)
     
-    formats_dir.mkdir(parents=True, exist_ok=True)
-    captions_dir.mkdir(parents=True, exist_ok=True)
-    tmp_dir.mkdir(parents=True, exist_ok=True)
+    # On préfère les fichiers lisibles avec une piste vidéo, puis le plus long / le plus défini
+    # (un proxy a la même durée mais moins de pixels), puis le plus gros (comportement historique).
+    # ffprobe n'est relancé que si le fichier a changé (probe_v2 mémorise par path/taille/mtime).
+    def rank(f):
+        meta = probe_v2.probe(f) or {}
+        video = meta.get("video") or {}
+        pixels = video.get("display_width", 0) * video.get("display_height", 0)
+        return (bool(video), round(meta.get("duration") or 0), pixels, f.stat().st_size)
+
+    best_candidate = max(candidates, key=rank)
+    return best_candidate
+
+def load_status(prod_dir):
+    """Lit le status.json d'un projet ({} si absent ou illisible)."""
+    try:
+        return json.loads((prod_dir / "status.json").read_text())
+    except Exception:
+        return {}
 
-    result_data = {
+def save_status(prod_dir, status):
+    """Écrit status.json de façon atomique (pas de fichier à moitié écrit si crash)."""
+    status_file = prod_dir / "status.json"
+    tmp_file = status_file.with_suffix(".json.tmp")
+    tmp_file.write_text(json.dumps(status, indent=2))
+    tmp_file.replace(status_file)
+
+def is_processed(prod_dir):
+    """
+    Un projet est traité si son status.json existe, sans job interrompu (in_progress)
+    ni demande de relance (needs_rerun, posé par fix_configs.py).
+    """
+    if not (prod_dir / "status.json").exists():
+        return False
+    status = load_status(prod_dir)
+    return not (status.get("in_progress") or status.get("needs_rerun"))
+
+def prepare_job(project_id, prod_dir, video_path, is_private, force=()):
+    """
+    Prépare le contexte d'un job (chemins, clés Bunny, données de résultat) partagé par toutes les étapes.
+    `force` : noms d'étapes à relancer même si leur empreinte n'a pas changé.
+    """
+    previous = load_status(prod_dir)
+    # Config adaptée (Public vs Private)
+    job = {
+        "project_id": project_id,
+        "prod_dir": prod_dir,
+        "video_path": video_path,
+        "is_private": is_private,
+        "api_key": config.API_KEY_PRIVATE if is_private else config.API_KEY_PUBLIC,
+        "lib_id": config.LIB_PRIVATE if is_private else config.LIB_PUBLIC,
+        "pull_zone": config.PULL_ZONE_PRIVATE if is_private else config.PULL_ZONE_PUBLIC,
+        # Dossiers de sortie
+        "out_dir": prod_dir / "output",
+        "formats_dir": prod_dir / "output" / "formats",
+        "captions_dir": prod_dir / "output" / "captions",
+        "audio_dir": prod_dir / "output" / "audio",
+        "formats": enabled_formats(prod_dir),
+        "force": set(force),
+        "timings": {},
+        "cancel": threading.Event(), # Posé par StageScheduler.cancel() : tue le ffmpeg en cours
+        "stage_fps": {},
+        "skipped": [],
+        # État persistant du job (reprise des uploads + empreintes des étapes)
+        "status": {
+            "in_progress": True,
+            "master": dag_v2.master_fingerprint(video_path, previous.get("master")),
+            "stages": previous.get("stages", {}),
+            "uploads": previous.get("uploads", {}),
+            "assets": previous.get("assets", {}) # URLs Bunny Storage des visuels
+        },
+        "bunny_urls": {},
+    }
+    job["result_data"] = {
         "id": project_id,
         "is_private": is_private,
         "updated_at": datetime.utcnow().isoformat() + "Z",
-        "bunny_urls": {},
+        "bunny_urls": job["bunny_urls"],
         "pipeline_steps": []
     }
 
-    # 1. AUDIO PROCESSING (DSP)
-    # -------------------------
+    job["formats_dir"].mkdir(parents=True, exist_ok=True)
+    job["captions_dir"].mkdir(parents=True, exist_ok=True)
+    return job
+
+def stage_audio(job):
+    """1. AUDIO PROCESSING (DSP)"""
     logging.info(f"   🔊 Processing Audio (Denoise + Norm)...")
-    clean_audio_path = process_audio_track(tmp_dir, video_path)
-    if not clean_audio_path:
+    job["clean_audio"], job["asr_pcm"] = process_audio_track(
+        job["audio_dir"], job["video_path"], cancel=job["cancel"], threads=job.get("threads")
+    )
+    if not job["clean_audio"]:
         logging.warning("   ⚠️ Audio processing failed. Using original audio.")
-        audio_source_arg = ["-c:a", "aac", "-b:a", "192k"]
-        whisper_source = video_path # Fallback for whisper
     else:
-        # On utilisera cet audio pour le mix final
-        audio_source_arg = ["-i", str(clean_audio_path), "-c:a", "aac", "-b:a", "192k", "-map", "0:v", "-map", "1:a"]
-        whisper_source = clean_audio_path
         logging.info("   ✅ Audio Optimized (-16 LUFS)")
+    return True
 
-    # 2. AI SUBTITLES (Whisper)
-    # -------------------------
+def stage_captions(job):
+    """2. AI SUBTITLES (Whisper) - un échec ne bloque pas la publication."""
+    # Buffer PCM 16 kHz produit par l'étape audio (pas de relecture disque).
+    # Si l'étape audio a été sautée, on relit la piste AAC propre.
+    whisper_source = job.get("asr_pcm") or job.get("clean_audio") or job["video_path"] # Fallback for whisper
     logging.info(f"   🧠 Generating Subtitles (Whisper)...")
     try:
-        model = whisper.load_model("base") # "base" est un bon compromis vitesse/précision
-        result = model.transcribe(str(whisper_source))
-        write_subtitles(result, out_dir, "video_optimized")
+        # Modèle résident (transcriber_v2) : pas de rechargement par vidéo
+        result = transcriber_v2.transcribe(whisper_source, label=job["project_id"])
+        job["captions"] = list(write_subtitles(result, job["out_dir"], "video_optimized"))
         logging.info("   ✅ Subtitles Generated (SRT/VTT/TXT)")
     except Exception as e:
         logging.error(f"   ❌ Whisper failed: {e}")
+    job.pop("asr_pcm", None) # Libère le buffer
+    return True
 
-    # 3. VIDEO ANALYSIS & ENCODING
-    # ----------------------------
-    detected_format = "16x9"
+def enabled_formats(prod_dir):
+    """Formats activés dans le config.json du projet (sinon config.FORMATS)."""
+    cfg_file = prod_dir / "config.json"
     try:
-        res = subprocess.run([
-            config.FFPROBE, "-v", "error", "-select_streams", "v:0", 
-            "-show_entries", "stream=width,height", "-of", "json", str(video_path)
-        ], capture_output=True, text=True)
-        meta = json.loads(res.stdout)["streams"][0]
-        w, h = int(meta["width"]), int(meta["height"])
+        fmts = json.loads(cfg_file.read_text()).get("formats", {})
+        enabled = [f for f in config.FORMATS if fmts.get(f)]
+        if enabled:
+            return enabled
+    except Exception:
+        pass
+    return list(config.FORMATS)
+
+def format_filter(fmt, native):
+    """
+    Filtre scale pour un format cible.
+    - Format natif : "pad" (letterbox) pour garder toute l'image et des dimensions paires (requis pour H264)
+    - Autres formats : "crop" centré pour remplir le cadre
+    """
+    w, h = config.FORMAT_SIZES[fmt]
+    if native:
+        return f"scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    return f"scale={w}:{h}:force_original_aspect_ratio=increase,crop={w}:{h},setsar=1"
+
+def stage_probe(job):
+    """3. VIDEO ANALYSIS (dimensions -> format natif)"""
+    detected_format = "16x9"
+    meta = probe_v2.probe(job["video_path"]) # Déjà en cache si le watcher a choisi ce master
+    video = (meta or {}).get("video")
+    if video and video["display_width"] and video["display_height"]:
+        # Dimensions affichées : une vidéo de téléphone tournée de 90° est bien détectée en 9x16
+        w, h = video["display_width"], video["display_height"]
         ratio = w / h
         
         if 0.9 <= ratio <= 1.1: detected_format = "1x1"
@@ -245,85 +339,496 @@ def process_video(project_id, prod_dir, video_path, is_private):
         else:                   detected_format = "16x9"
         
         logging.info(f"   📐 Ratio {ratio:.2f} -> Mode: {detected_format}")
-    except Exception as e:
-        logging.error(f"   ⚠️ Analysis failed ({e}), defaulting to 16x9")
+        job["video_meta"] = {
+            "width": w, "height": h, "duration": meta["duration"], "fps": video["fps"],
+            "rotation": video["rotation"], "codec": video["codec"],
+            "audio_layout": (meta.get("audio") or {}).get("channel_layout")
+        }
+    else:
+        logging.error("   ⚠️ Analysis failed (no readable video stream), defaulting to 16x9")
 
-    target_file = formats_dir / f"{detected_format}.mp4"
-    
-    # Paramètres de scale avec "pad" pour s'assurer d'avoir des dimensions paires (requis pour H264)
-    scale_filter = "scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2" 
-    if detected_format == "9x16":
-        scale_filter = "scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2"
-    elif detected_format == "1x1":
-        scale_filter = "scale=1080:1080:force_original_aspect_ratio=decrease,pad=1080:1080:(ow-iw)/2:(oh-ih)/2"
-
-    # Construction de la commande finale (Video Source + Clean Audio Source)
-    # Note: audio_source_arg gère le mapping
-    cmd_encode = [
-        config.FFMPEG, "-y", "-i", str(video_path)
+    job["native_format"] = detected_format
+    return True
+
+def sample_windows(duration):
+    """Débuts (s) des fenêtres d'analyse, répartis sur la durée (hors tout début / toute fin)."""
+    n, length = config.ANALYSIS_WINDOWS, config.ANALYSIS_WINDOW_SECONDS
+    if duration <= n * length:
+        return [0.0]
+    return [round(duration * (i + 1) / (n + 1) - length / 2, 2) for i in range(n)]
+
+def measure_window(video_path, start, threads=None, cancel=()):
+    """Encode une fenêtre en basse résolution à CRF fixe. Retourne le débit obtenu (kbps) ou None."""
+    cmd = [
+        config.FFMPEG, "-y", *thread_args(threads), "-ss", str(start), "-t", str(config.ANALYSIS_WINDOW_SECONDS),
+        "-i", str(video_path), "-an",
+        "-vf", f"scale={config.ANALYSIS_WIDTH}:-2",
+        "-c:v", "libx264", "-preset", config.ANALYSIS_PRESET, "-crf", str(config.ANALYSIS_CRF),
+        *output_threads(threads), "-f", "h264", "pipe:1"
     ]
-    
-    if clean_audio_path:
-        # input 0 is video, input 1 is audio. map 0:v, map 1:a
-        cmd_encode.extend(["-i", str(clean_audio_path), "-map", "0:v", "-map", "1:a"])
+    data = run_cmd_output(cmd, cancel=cancel)
+    if not data:
+        return None
+    return len(data) * 8 / 1000 / config.ANALYSIS_WINDOW_SECONDS
+
+def stage_analysis(job):
+    """
+    4. COMPLEXITY PROBE (débit adaptatif par titre et par format)
+    Quelques fenêtres encodées en 640px à CRF fixe donnent le débit "nécessaire" du contenu,
+    extrapolé à la résolution de chaque format puis borné par config.BITRATE_BOUNDS.
+    En cas d'échec, on garde le débit historique (DEFAULT_BITRATE) : la publication continue.
+    """
+    meta = job.get("video_meta") or {}
+    if not meta.get("width"):
+        logging.warning("   ⚠️ No video metadata, skipping complexity probe")
+        return True
+
+    logging.info(f"   🔬 Complexity probe ({config.ANALYSIS_WINDOWS} x {config.ANALYSIS_WINDOW_SECONDS}s @ {config.ANALYSIS_WIDTH}px)...")
+    windows = sample_windows(meta.get("duration") or 0)
+    rates = []
+    for start in windows:
+        if job["cancel"].is_set():
+            break
+        rate = measure_window(job["video_path"], start, job.get("threads"), cancel=job["cancel"])
+        if rate:
+            rates.append(rate)
+    # Annulé (ou bail perdu) : pas de débit par défaut enregistré comme résultat de l'étape
+    if job["cancel"].is_set():
+        logging.warning("   🛑 Complexity probe cancelled")
+        return False
+    if not rates:
+        logging.warning("   ⚠️ Complexity probe failed, using default bitrate")
+        return True
+
+    # Dimensions des encodages test (scale=640:-2 -> hauteur paire)
+    test_h = int(round(config.ANALYSIS_WIDTH * meta["height"] / meta["width"] / 2)) * 2
+    test_pixels = config.ANALYSIS_WIDTH * max(test_h, 2)
+    mean_rate, peak_rate = sum(rates) / len(rates), max(rates)
+
+    bitrates = {}
+    for fmt, (w, h) in config.FORMAT_SIZES.items():
+        lo, hi = config.BITRATE_BOUNDS.get(fmt, (0, config.DEFAULT_BITRATE))
+        scale = (w * h / test_pixels) ** config.ANALYSIS_SCALE_EXPONENT * config.ANALYSIS_QUALITY_FACTOR
+        bitrate = int(min(max(mean_rate * scale, lo), hi))
+        maxrate = int(min(max(peak_rate * scale, bitrate), hi))
+        bitrates[fmt] = {"bitrate": bitrate, "maxrate": maxrate}
+
+    job["bitrates"] = bitrates
+    logging.info(f"   ✅ Test rate {mean_rate:.0f} kbps (peak {peak_rate:.0f}) -> "
+                 + ", ".join(f"{f}: {b['bitrate']}k" for f, b in bitrates.items()))
+    return True
+
+def plan_chunks(video_path, duration):
+    """
+    Découpe le master en ENCODE_CHUNKS segments [(début, fin), ...] commençant sur une keyframe
+    (fin=None pour le dernier). Un seul segment si le master est court ou sans keyframes exploitables.
+    Temps relatifs au début du fichier (comme -ss en entrée) : le start_time du conteneur est retiré des pts.
+    """
+    n = config.ENCODE_CHUNKS
+    if n <= 1 or duration < config.ENCODE_CHUNK_MIN_SECONDS:
+        return [(0.0, None)]
+    meta = probe_v2.probe(video_path)
+    origin = meta["start_time"] if meta else 0.0
+    keyframes = [round(t - origin, 6) for t in probe_v2.keyframes(video_path)]
+    keyframes = [t for t in keyframes if 0 < t < duration]
+    if not keyframes:
+        return [(0.0, None)]
+
+    cuts = sorted({min(keyframes, key=lambda k: abs(k - duration * i / n)) for i in range(1, n)})
+    starts = [0.0] + cuts
+    return list(zip(starts, cuts + [None]))
+
+def encode_output_args(job, targets, with_audio=True):
+    """Arguments de sortie ffmpeg par format (map vidéo [outN], débit adaptatif, audio éventuel)."""
+    default_rate = {"bitrate": config.DEFAULT_BITRATE, "maxrate": config.DEFAULT_BITRATE}
+    bitrates = job.get("bitrates") or {}
+    if job.get("clean_audio"):
+        # input 1 = piste audio propre (déjà en AAC)
+        audio = ["-map", "1:a", "-c:a", "copy"]
     else:
         # input 0 only. use default audio
-        pass 
-
-    cmd_encode.extend([
-        "-vf", f"{scale_filter},setsar=1",
-        "-c:v", "libx264", "-b:v", "8M", "-preset", "fast",
-        "-c:a", "aac", "-b:a", "192k",
-        str(target_file)
-    ])
-    
-    logging.info(f"   ⚙️ Encoding Final Master...")
-    if not run_cmd(cmd_encode):
-        return False
+        audio = ["-map", "0:a:0?", "-c:a", "aac", "-b:a", AUDIO_BITRATE]
+
+    args = {}
+    for i, fmt in enumerate(targets):
+        args[fmt] = ["-map", f"[out{i}]", *(audio[:2] if with_audio else []),
+                     *VIDEO_CODEC_ARGS, *video_rate_args(bitrates.get(fmt, default_rate)),
+                     *(audio[2:] if with_audio else ["-an"])]
+    return args
+
+def stream_copy_check(meta, fmt):
+    """
+    Le master peut-il être publié tel quel pour `fmt` (remux -c:v copy) ?
+    Retourne (True, "") ou (False, raison).
+    """
+    video = (meta or {}).get("video")
+    if not config.STREAM_COPY or not video:
+        return False, "disabled" if not config.STREAM_COPY else "no probe"
+    w, h = config.FORMAT_SIZES[fmt]
+    hi = config.BITRATE_BOUNDS.get(fmt, (0, config.DEFAULT_BITRATE))[1]
+    bitrate = video["bit_rate"] or meta.get("bit_rate") or 0
+    checks = [
+        (video["codec"] in config.STREAM_COPY_CODECS, f"codec {video['codec']}"),
+        (video["profile"] in config.STREAM_COPY_PROFILES, f"profile {video['profile']}"),
+        ((video["width"], video["height"]) == (w, h), f"size {video['width']}x{video['height']}"),
+        (video["rotation"] == 0, f"rotation {video['rotation']}"),
+        (video["sar"] in ("1:1", "0:1", "N/A", None), f"SAR {video['sar']}"),
+        (video["pix_fmt"] in config.STREAM_COPY_PIX_FMTS, f"pix_fmt {video['pix_fmt']}"),
+        (0 < bitrate <= hi * 1000 * config.STREAM_COPY_BITRATE_TOLERANCE, f"bitrate {bitrate // 1000}k"),
+    ]
+    for ok, reason in checks:
+        if not ok:
+            return False, reason
+    return True, ""
+
+def remux_copy(job, fmt):
+    """Fast path : vidéo du master copiée telle quelle + audio propre (ou audio d'origine réencodé)."""
+    target_file = job["formats_dir"] / f"{fmt}.mp4"
+    cmd = [config.FFMPEG, "-y", "-i", str(job["video_path"])]
+    if job.get("clean_audio"):
+        cmd.extend(["-i", str(job["clean_audio"]), "-map", "0:v:0", "-map", "1:a", "-c:v", "copy", "-c:a", "copy"])
+    else:
+        cmd.extend(["-map", "0:v:0", "-map", "0:a:0?", "-c:v", "copy", "-c:a", "aac", "-b:a", AUDIO_BITRATE])
+    cmd.extend(["-movflags", "+faststart", str(target_file)])
+    logging.info(f"   ⚡ Stream copy ({fmt}): master already matches, no video re-encode")
+    if not run_cmd(cmd, duration=(job.get("video_meta") or {}).get("duration"), cancel=job["cancel"], label=f"remux {fmt}"):
+        return None
+    return target_file
+
+def encode_chunked(job, targets, graph, chunks, asset_plan=None):
+    """
+    Encode chaque segment dans son propre ffmpeg (en parallèle, cœurs répartis),
+    puis recolle les segments de chaque format sans ré-encodage (concat demuxer) et ajoute l'audio.
+    asset_plan : visuels produits par le même décodage ([va] du graphe), fenêtre par fenêtre.
+    """
+    chunk_dir = job["work_dir"] # Scratch réservé par run_stage (scratch_bytes)
+    # Budget de threads de l'admission (sinon toute la machine), réparti entre les segments
+    threads = max(1, (job.get("threads") or os.cpu_count() or 1) // len(chunks))
+    out_args = encode_output_args(job, targets, with_audio=False)
+    stop = threading.Event() # Un segment en échec arrête les autres
+
+    @metrics_v2.bind
+    def encode_chunk(idx):
+        start, end = chunks[idx]
+        cmd = [config.FFMPEG, "-y", *thread_args(threads), "-ss", str(start)]
+        if end is not None:
+            cmd.extend(["-t", str(round(end - start, 6))])
+        asset_graph, asset_out = "", []
+        if asset_plan:
+            asset_graph, asset_out = assets_v2.branches("[va]", asset_plan, chunk_dir / "assets", start, end, idx)
+            asset_graph = ";" + asset_graph
+        cmd.extend(["-i", str(job["video_path"]), "-filter_complex", graph + asset_graph])
+        for fmt in targets:
+            cmd.extend([*out_args[fmt], "-threads", str(threads), str(chunk_dir / f"{fmt}_{idx:03d}.mp4")])
+        cmd.extend(asset_out)
+        duration = (end if end is not None else job["video_meta"]["duration"]) - start
+        ok = run_cmd(cmd, duration=duration, cancel=(job["cancel"], stop), label=f"encode {idx + 1}/{len(chunks)}")
+        if not ok:
+            stop.set()
+        return ok
+
+    logging.info(f"   🧩 Chunked encode: {len(chunks)} segments x {threads} threads")
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        if not all(pool.map(encode_chunk, range(len(chunks)))):
+            return None
+
+    encoded = {}
+    for fmt in targets:
+        list_file = chunk_dir / f"{fmt}.txt"
+        list_file.write_text("".join(f"file '{chunk_dir / f'{fmt}_{i:03d}.mp4'}'\n" for i in range(len(chunks))))
+        target_file = job["formats_dir"] / f"{fmt}.mp4"
+        cmd = [config.FFMPEG, "-y", "-f", "concat", "-safe", "0", "-i", str(list_file)]
+        if job.get("clean_audio"):
+            cmd.extend(["-i", str(job["clean_audio"]), "-map", "0:v", "-map", "1:a", "-c", "copy"])
+        else:
+            cmd.extend(["-i", str(job["video_path"]), "-map", "0:v", "-map", "1:a:0?",
+                        "-c:v", "copy", "-c:a", "aac", "-b:a", AUDIO_BITRATE])
+        cmd.append(str(target_file))
+        if not run_cmd(cmd, cancel=job["cancel"], label=f"concat {fmt}"):
+            return None
+        encoded[fmt] = target_file
+    return encoded
+
+def stage_encode(job):
+    """5. ENCODING (un seul décodage, une sortie par format ; par segments en parallèle pour les masters longs)"""
+    video_path = job["video_path"]
+    detected_format = job.get("native_format", "16x9")
+
+    # Formats à produire : tous ceux activés (multi-output) ou seulement le natif
+    targets = [detected_format]
+    if config.MULTI_FORMAT_ENCODE:
+        targets += [f for f in job.get("formats", config.FORMATS) if f != detected_format]
+
+    # Fast path : format natif déjà conforme (codec, profil, dimensions, SAR, pix_fmt, débit)
+    encoded = {}
+    copy_ok, reason = stream_copy_check(probe_v2.probe(video_path), detected_format)
+    if copy_ok:
+        target_file = remux_copy(job, detected_format)
+        if target_file:
+            encoded[detected_format] = target_file
+            targets = targets[1:]
+    elif config.STREAM_COPY:
+        logging.info(f"   🔁 Re-encode needed ({reason})")
+    # Visuels (posters, preview, sprites) : sorties supplémentaires du même décodage
+    duration = (job.get("video_meta") or {}).get("duration") or 0
+    asset_plan = assets_v2.plan(duration) if assets_v2.enabled(job) and duration > 0 else None
+    asset_dir = job["work_dir"] / "assets"
+    asset_dir.mkdir(parents=True, exist_ok=True)
+    job["assets"] = assets_v2.empty()
+
+    if not targets:
+        job["encoded"] = encoded
+        if asset_plan:
+            # Tout a été copié sans décodage : un décodage dédié aux visuels
+            asset_graph, asset_out = assets_v2.branches("[0:v]", asset_plan, asset_dir)
+            cmd = [config.FFMPEG, "-y", *thread_args(job.get("threads")), "-i", str(video_path),
+                   "-filter_complex", asset_graph, *asset_out]
+            if run_cmd(cmd, duration=duration, cancel=job["cancel"], label="assets"):
+                job["assets"] = assets_v2.collect(asset_dir, asset_plan, [0.0], duration, job["out_dir"] / "assets")
+        return True
+
+    # Graphe : décodage unique -> split -> scale/pad/crop par format (+ [va] pour les visuels)
+    labels = [f"[v{i}]" for i in range(len(targets))] + (["[va]"] if asset_plan else [])
+    graph = [f"[0:v]split={len(labels)}" + "".join(labels)]
+    for i, fmt in enumerate(targets):
+        graph.append(f"[v{i}]{format_filter(fmt, fmt == detected_format)}[out{i}]")
+    graph = ";".join(graph)
+
+    chunks = plan_chunks(video_path, duration)
+    logging.info(f"   ⚙️ Encoding Final Masters ({', '.join(targets)}{' + assets' if asset_plan else ''})...")
+    if len(chunks) > 1:
+        chunked = encode_chunked(job, targets, graph, chunks, asset_plan)
+        if not chunked:
+            return False
+        job["encoded"] = {**encoded, **chunked}
+    else:
+        # Construction de la commande finale (Video Source + Clean Audio Source)
+        cmd_encode = [config.FFMPEG, "-y", *thread_args(job.get("threads")), "-i", str(video_path)]
+        if job.get("clean_audio"):
+            cmd_encode.extend(["-i", str(job["clean_audio"])])
+        asset_graph, asset_out = assets_v2.branches("[va]", asset_plan, asset_dir) if asset_plan else ("", [])
+        cmd_encode.extend(["-filter_complex", graph + (";" + asset_graph if asset_graph else "")])
 
-    # 4. UPLOAD BUNNY STREAM
-    # ----------------------
+        for fmt, args in encode_output_args(job, targets).items():
+            target_file = job["formats_dir"] / f"{fmt}.mp4"
+            cmd_encode.extend([*args, *output_threads(job.get("threads")), str(target_file)])
+            encoded[fmt] = target_file
+        cmd_encode.extend(asset_out)
+
+        if not run_cmd(cmd_encode, duration=duration or None, cancel=job["cancel"], label="encode"):
+            return False
+        job["encoded"] = encoded
+
+    if asset_plan:
+        job["assets"] = assets_v2.collect(
+            asset_dir, asset_plan, [start for start, _ in chunks], duration, job["out_dir"] / "assets"
+        )
+    return True
+
+def stage_upload(job):
+    """6. UPLOAD BUNNY STREAM (TUS résumable, offsets sauvegardés dans status.json)"""
     import re
-    clean_title = re.sub(r'_v\d+$', '', project_id)
-    bunny_title = f"{clean_title} ({detected_format})"
-    
-    guid = bunny_get_or_create(bunny_title, API_KEY, LIB_ID)
-    if guid:
-        try:
-            url = f"https://video.bunnycdn.com/library/{LIB_ID}/videos/{guid}"
-            headers = {
-                "AccessKey": API_KEY,
-                "Content-Type": "application/octet-stream" # FIX CRITIQUE V2
-            }
-            with open(target_file, "rb") as f:
-                logging.info(f"   ☁️ Uploading to Bunny ({detected_format})...")
-                u_resp = requests.put(url, headers=headers, data=f)
-                
-            if u_resp.ok:
-                final_url = f"{PULL_ZONE}/{guid}/play_720p.mp4"
-                result_data["bunny_urls"][detected_format] = final_url
-                logging.info(f"   ✅ Published: {final_url}")
-            else:
-                logging.error(f"   ❌ Upload failed: {u_resp.status_code} - {u_resp.text}")
-                return False 
-        except Exception as e:
-            logging.error(f"   ❌ Upload network error: {e}")
+    clean_title = re.sub(r'_v\d+$', '', job["project_id"])
+    uploads = job["status"].setdefault("uploads", {})
+
+    def save_progress():
+        save_status(job["prod_dir"], job["status"])
+
+    for fmt, target_file in job.get("encoded", {}).items():
+        bunny_title = f"{clean_title} ({fmt})"
+
+        # Reprise : on réutilise la vidéo Bunny de l'upload interrompu (même librairie seulement)
+        previous = uploads.get(fmt, {})
+        guid = previous.get("guid") if previous.get("lib_id") == str(job["lib_id"]) else None
+        guid = guid or bunny_get_or_create(bunny_title, job["api_key"], job["lib_id"])
+        if not guid:
+            # Étape en échec (pas enregistrée dans le DAG) : le format manquant sera retenté au prochain passage
+            logging.error(f"   ❌ No Bunny video for {fmt}: upload stage failed")
             return False
 
-    # 5. CLEANUP & FINISH
-    # -------------------
-    try:
-        shutil.rmtree(tmp_dir) # On vire les wav temporaires
-    except: pass
+        logging.info(f"   ☁️ Uploading to Bunny ({fmt})...")
+        state = uploads.setdefault(fmt, {})
+        if not uploader_v2.upload_file(target_file, job["lib_id"], job["api_key"], guid,
+                                       title=bunny_title, state=state, save_state=save_progress,
+                                       cancel=job["cancel"]):
+            return False
+
+        final_url = f"{job['pull_zone']}/{guid}/play_720p.mp4"
+        job["bunny_urls"][fmt] = final_url
+        logging.info(f"   ✅ Published: {final_url}")
+
+    # Visuels sur Bunny Storage : un échec ne bloque pas la publication (le site garde la vignette Bunny)
+    asset_urls = assets_v2.upload(job, previous=job["status"].get("assets"))
+    if asset_urls is not None:
+        job["status"]["assets"] = asset_urls
+    return True
+
+def finalize_job(job):
+    """7. CLEANUP & FINISH"""
+    result_data = job["result_data"]
+    result_data["bunny_urls"] = job["bunny_urls"] # Peut venir d'un upload sauté (restauré)
+    result_data["assets"] = job["status"].get("assets") or {} # Posters / preview / sprites (Bunny Storage)
+    scratch_v2.release(job) # On vire les fichiers temporaires
 
-    # Status marker
-    with open(prod_dir / "status.json", "w") as f:
-        json.dump(result_data, f, indent=2)
+    # Status marker (job terminé : plus de flag in_progress)
+    status = {k: v for k, v in job["status"].items() if k != "in_progress"}
+    save_status(job["prod_dir"], {**result_data, **status})
 
-    # Global Updates
+    # Global Updates (en mode node, c'est le coordinateur qui publie au retour de /done)
+    if result_data["bunny_urls"] and job.get("node"):
+        return True
     if result_data["bunny_urls"]:
-        update_db(result_data)
-        update_inventory_excel(result_data)
+        with metrics_v2.measure(job, "db") as outcome:
+            update_db(result_data)
+            inventory_ledger.record(result_data, job["timings"])
+            outcome["ok"] = True
         return True
     
     return False
+
+# Ordre d'exécution des étapes (utilisé tel quel par scheduler_v2)
+STAGES = [
+    ("audio", stage_audio),
+    ("captions", stage_captions),
+    ("probe", stage_probe),
+    ("analysis", stage_analysis),
+    ("encode", stage_encode),
+    ("upload", stage_upload),
+]
+
+# DAG : étapes amont dont dépend chaque étape (leur empreinte entre dans la sienne)
+STAGE_INPUTS = {
+    "audio": [],
+    "captions": ["audio"],
+    "probe": [],
+    "analysis": ["probe"],
+    "encode": ["audio", "probe", "analysis"],
+    "upload": ["encode"],
+}
+
+# Sorties gardées dans status.json pour pouvoir sauter l'étape (et celles qui sont des fichiers)
+STAGE_OUTPUTS = {
+    "audio": ["clean_audio"],
+    "captions": ["captions"],
+    "probe": ["native_format", "video_meta"],
+    "analysis": ["bitrates"],
+    "encode": ["encoded", "assets"],
+    "upload": ["bunny_urls"],
+}
+PATH_OUTPUTS = {"clean_audio", "captions", "encoded", "assets"}
+
+def stage_config(job, name):
+    """Clés de config qui influencent le résultat d'une étape."""
+    if name == "audio":
+        return {"graph": AUDIO_GRAPH, "bitrate": AUDIO_BITRATE}
+    if name == "captions":
+        captions = {"model": config.WHISPER_MODEL, "mode": config.TRANSCRIBE_MODE}
+        if config.TRANSCRIBE_MODE == "vad":
+            captions["vad"] = [config.TRANSCRIBE_CHUNK_SECONDS, config.VAD_FRAME_MS, config.VAD_THRESHOLD_DBFS,
+                               config.VAD_MIN_SILENCE, config.VAD_MIN_SPEECH, config.VAD_PAD, config.VAD_DROP_GAP]
+        return captions
+    if name == "probe":
+        return {"fields": ["width", "height", "duration", "fps", "rotation", "codec", "audio_layout"]}
+    if name == "analysis":
+        return {
+            "windows": [config.ANALYSIS_WINDOWS, config.ANALYSIS_WINDOW_SECONDS, config.ANALYSIS_WIDTH],
+            "test": [config.ANALYSIS_CRF, config.ANALYSIS_PRESET],
+            "scale": [config.ANALYSIS_SCALE_EXPONENT, config.ANALYSIS_QUALITY_FACTOR],
+            "bounds": config.BITRATE_BOUNDS,
+            "sizes": config.FORMAT_SIZES
+        }
+    if name == "encode":
+        return {
+            "formats": job["formats"],
+            "sizes": config.FORMAT_SIZES,
+            "multi": config.MULTI_FORMAT_ENCODE,
+            "video": VIDEO_CODEC_ARGS,
+            "default_bitrate": config.DEFAULT_BITRATE,
+            "chunks": [config.ENCODE_CHUNKS, config.ENCODE_CHUNK_MIN_SECONDS],
+            "assets": assets_v2.enabled(job) and [
+                config.POSTER_COUNT, config.POSTER_WIDTH, config.PREVIEW_SECONDS, config.PREVIEW_AT,
+                config.PREVIEW_WIDTH, config.PREVIEW_FPS, config.PREVIEW_CRF,
+                config.SPRITE_INTERVAL, config.SPRITE_WIDTH, config.SPRITE_COLUMNS, config.SPRITE_ROWS
+            ],
+            "stream_copy": [config.STREAM_COPY, sorted(config.STREAM_COPY_CODECS), sorted(config.STREAM_COPY_PROFILES),
+                            sorted(config.STREAM_COPY_PIX_FMTS), config.STREAM_COPY_BITRATE_TOLERANCE]
+        }
+    if name == "upload":
+        return {
+            "lib_id": job["lib_id"],
+            "api_key": hashlib.sha256(job["api_key"].encode()).hexdigest(),
+            "pull_zone": job["pull_zone"]
+        }
+    return {}
+
+def scratch_bytes(job, name):
+    """
+    Octets de fichiers intermédiaires (estimés) qu'une étape écrira dans le scratch.
+    Seul l'encodage en écrit : audio et analyse passent par des pipes, la piste audio propre est une sortie gardée.
+    """
+    duration = (job.get("video_meta") or {}).get("duration") or 0
+    if name != "encode":
+        return 0
+    nbytes = assets_v2.scratch_bytes(duration) if assets_v2.enabled(job) and duration > 0 else 0
+    if config.ENCODE_CHUNKS > 1 and duration >= config.ENCODE_CHUNK_MIN_SECONDS:
+        # Encodage par segments : tous les segments de tous les formats avant concaténation
+        targets = job["formats"] if config.MULTI_FORMAT_ENCODE else [job.get("native_format", "16x9")]
+        bitrates = job.get("bitrates") or {}
+        kbps = sum(bitrates.get(fmt, {}).get("maxrate", config.DEFAULT_BITRATE) for fmt in targets)
+        nbytes += kbps * 1000 / 8 * duration
+    return int(nbytes * config.SCRATCH_MARGIN)
+
+def run_stage(job, name, fn):
+    """
+    Exécute une étape en mesurant sa durée (job["timings"]).
+    L'étape est sautée si son empreinte (entrées + config) n'a pas changé depuis le dernier succès.
+    """
+    if job["cancel"].is_set():
+        logging.warning(f"   🛑 Stage {name} not started: job cancelled")
+        return False
+
+    t = time.time()
+    fp = dag_v2.stage_fingerprint(job, name, STAGE_INPUTS[name], stage_config(job, name))
+
+    if name not in job["force"] and dag_v2.restore(job, name, fp, STAGE_OUTPUTS[name], PATH_OUTPUTS):
+        logging.info(f"   ⏭️ Stage {name} unchanged, skipped")
+        job["stage_fps"][name] = fp
+        job["skipped"].append(name)
+        job["timings"][name] = 0.0
+        metrics_v2.observe(name, {"skipped": True})
+        return True
+
+    # Admission (mémoire / CPU / disque) puis mesure de l'étape et de ses process enfants (logs/metrics.jsonl)
+    with admission_v2.admit(job, name) as granted:
+        if not granted:
+            job["timings"][name] = round(time.time() - t, 2)
+            return False
+        # Fichiers intermédiaires : place réservée dans le scratch, dossier supprimé en fin d'étape
+        with scratch_v2.reserve(job, name, scratch_bytes(job, name)) as work_dir, \
+                metrics_v2.measure(job, name) as outcome:
+            job["work_dir"] = work_dir
+            try:
+                ok = fn(job)
+            except Exception as e:
+                logging.error(f"   ❌ Stage {name} crashed: {e}")
+                ok = False
+            outcome["ok"] = ok
+
+    if ok:
+        produced = dag_v2.record(job, name, fp, STAGE_OUTPUTS[name])
+        # Une étape en fallback (ex: audio non nettoyé) change l'empreinte aval
+        job["stage_fps"][name] = fp if produced else f"missing:{fp}"
+        save_status(job["prod_dir"], job["status"])
+    job["timings"][name] = round(time.time() - t, 2)
+    return ok
+
+def process_video(project_id, prod_dir, video_path, is_private, force=()):
+    """Pipeline complet V3: Audio Clean -> AI Subs -> Probe -> Analysis -> Encode -> Upload (séquentiel, sans scheduler)."""
+    job = prepare_job(project_id, prod_dir, video_path, is_private, force=force)
+    for name, fn in STAGES:
+        if not run_stage(job, name, fn):
+            return False
+    success = finalize_job(job)
+    # Hors watcher : on publie le JSON tout de suite
+    catalog_publish.export_and_publish()
+    return success
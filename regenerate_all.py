@@ -1,62 +1,55 @@
 #!/usr/bin/env python3
 """
-Script pour régénérer tous les formats vidéos (après correction du bug d'aspect ratio)
-et les ré-uploader.
+Script pour relancer le pipeline V3 sur tous les projets de production/.
+
+Chaque étape (audio, captions, probe, analysis, encode, upload) n'est rejouée que si ses
+entrées ou sa config ont changé. --force permet de rejouer des étapes précises
+quand même (ex: après une correction du bug d'aspect ratio : --force encode,upload).
 """
-import shutil
-import json
+import sys
+import argparse
 import logging
 from pathlib import Path
-from process import process, load_json, save_json
+
+sys.path.insert(0, str(Path(__file__).parent / "pipeline_v2"))
+import config
+from worker_v2 import process_video, find_master_video
 
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
-def regenerate_project(project_path):
-    p = Path(project_path)
-    if not p.is_dir() or not (p / "config.json").exists():
+def regenerate_project(project_dir, is_private, force=()):
+    p = Path(project_dir)
+    video_master = find_master_video(p)
+    if not video_master:
         return
 
     print(f"♻️  Régénération de : {p.name}")
-    
-    # 1. Nettoyer les fichiers générés (formats)
-    formats_dir = p / "output" / "formats"
-    if formats_dir.exists():
-        shutil.rmtree(formats_dir)
-        formats_dir.mkdir(parents=True)
-        print("   ✅ Dossier formats vidé")
-
-    # 2. Reset Status
-    status_file = p / "status.json"
-    status = load_json(status_file, {})
-    
-    # On supprime les entrées qui empêchent le retraitement
-    if "formats" in status:
-        del status["formats"]
-    if "bunny_urls" in status:
-        del status["bunny_urls"]
-        
-    save_json(status_file, status)
-    print("   ✅ Status réinitialisé")
-
-    # 3. Relancer le process
     print("   ▶️  Lancement du traitement...")
     try:
-        process(str(p))
-        print("   ✅ Traitement terminé avec succès")
+        if process_video(p.name, p, video_master, is_private, force=force):
+            print("   ✅ Traitement terminé avec succès")
+        else:
+            print("   ❌ Échec du traitement")
     except Exception as e:
         print(f"   ❌ Erreur durant le traitement: {e}")
 
 def main():
-    root = Path(__file__).parent / "production"
-    
+    parser = argparse.ArgumentParser(description="Re-run the pipeline on every production project")
+    parser.add_argument("--force", default="", help="Comma separated stages to re-run anyway (audio,captions,probe,analysis,encode,upload)")
+    args = parser.parse_args()
+    force = [s for s in args.force.split(",") if s]
+
     # Lister les projets
-    projects = [d for d in root.iterdir() if d.is_dir() and not d.name.startswith(".")]
+    projects = []
+    for area, is_private in [(config.PRODUCTION_PUBLIC, False), (config.PRODUCTION_PRIVATE, True)]:
+        if area.exists():
+            projects += [(d, is_private) for d in area.iterdir() if d.is_dir() and not d.name.startswith(".")]
     
     print(f"🚀 Début de la régénération massive ({len(projects)} projets)")
     
-    for proj in projects:
-        regenerate_project(proj)
+    for proj, is_private in projects:
+        regenerate_project(proj, is_private, force)
 
     print("\n🏁 Tout est terminé !")
 
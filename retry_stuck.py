@@ -1,56 +1,63 @@
 #!/usr/bin/env python3
-import os
-import json
-import subprocess
+"""
+Relance des projets coincés, d'après la file de jobs du pipeline (pipeline_v2/job_queue.py).
+
+Coincé = échec définitif ("failed"), ou "running" alors que son worker a disparu :
+process local mort (watcher tué sans redémarrage) ou bail expiré (node distant).
+Un job dont on ne peut pas vérifier le worker n'est coincé qu'après --stale-hours,
+plus long que la plus longue commande ffmpeg autorisée (FFMPEG_TIMEOUT). Les
+jobs sont remis en file : le watcher les reprend dans l'ordre de priorité.
+
+Usage :
+    python retry_stuck.py                # Liste + remise en file
+    python retry_stuck.py --dry-run      # Liste seulement
+"""
 import sys
+import time
+import argparse
 from pathlib import Path
 
-PROD = Path("production")
-
-def get_status(folder):
-    s_file = folder / "status.json"
-    if not s_file.exists():
-        return None
-    try:
-        return json.loads(s_file.read_text())
-    except:
-        return None
-
-def is_stuck(folder):
-    st = get_status(folder)
-    # If status is None or Empty dict, it failed at startup
-    if st is None or st == {}:
-        return True
-    return False
-
-print("🔍 Recherche des projets coincés...")
-stuck_list = []
-for item in PROD.iterdir():
-    if item.is_dir() and not item.name.startswith("."):
-        if is_stuck(item):
-            print(f"   ⚠️  Coincé : {item.name}")
-            stuck_list.append(item)
-
-if not stuck_list:
-    print("✅ Aucun projet coincé détecté.")
-    sys.exit(0)
-
-print(f"\n🚀 Relance de {len(stuck_list)} projets...")
-
-for folder in stuck_list:
-    print(f"\n---------------------------------------------")
-    print(f"▶️  Traitement de : {folder.name}")
-    print(f"---------------------------------------------")
-    
-    # Run process.py
-    # We use the same python that runs this script
-    cmd = [sys.executable, "process.py", str(folder)]
-    
-    ret = subprocess.call(cmd)
-    
-    if ret == 0:
-        print(f"✅ Succès pour {folder.name}")
-    else:
-        print(f"❌ Échec pour {folder.name} (Code {ret})")
-
-print("\n✨ Terminé.")
+sys.path.insert(0, str(Path(__file__).parent / "pipeline_v2"))
+import config
+import job_queue
+
+def is_stale(job, stale_before):
+    alive = job_queue.worker_alive(job)
+    if alive is None: # Worker invérifiable : on se fie à l'âge du job
+        return (job["started_at"] or 0) < stale_before
+    return not alive
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-queue failed or stale pipeline jobs")
+    parser.add_argument("--dry-run", action="store_true", help="List stuck jobs without re-queuing them")
+    parser.add_argument("--stale-hours", type=float, default=config.FFMPEG_TIMEOUT / 3600 + 6,
+                        help="A running job whose worker cannot be checked is stuck after this long")
+    args = parser.parse_args()
+
+    print("🔍 Recherche des projets coincés...")
+    stale_before = time.time() - args.stale_hours * 3600
+    stuck_list = job_queue.jobs("failed") + [
+        j for j in job_queue.jobs("running") if is_stale(j, stale_before)
+    ]
+
+    if not stuck_list:
+        print(f"✅ Aucun projet coincé détecté. {job_queue.counts()}")
+        return 0
+
+    for job in stuck_list:
+        print(f"   ⚠️  Coincé : {job['project_id']} ({job['state']}, {job['attempts']} tentative(s))"
+              f"{' - ' + job['last_error'] if job['last_error'] else ''}")
+
+    if args.dry_run:
+        return 0
+
+    # Un job "running" encore actif n'est pas touché par retry() : on le repasse d'abord en file
+    stale = [j["project_id"] for j in stuck_list if j["state"] == "running"]
+    if stale:
+        job_queue.recover(stale)
+    n = job_queue.retry([j["project_id"] for j in stuck_list])
+    print(f"\n🚀 {n} projet(s) remis en file, le watcher va les relancer.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,9 +4,13 @@ import requests
 import re
 from pathlib import Path
 
-# Configuration (identiques aux autres scripts)
-API_KEY = "7b43d33b-576e-4890-8fb1dae4d73d-9663-4f27"
-LIB_ID = "581630"
+# Client Bunny partagé (identifiants dans pipeline_v2/config.py / .env)
+sys.path.insert(0, str(Path(__file__).parent / "pipeline_v2"))
+import bunny_client
+from bunny_client import BunnyClient
+from bunny_index import get_index
+
+CLIENT = BunnyClient.for_library(is_private=False)
 PROD_DIR = Path(__file__).parent / "production"
 
 if not PROD_DIR.exists():
@@ -21,20 +25,19 @@ def get_local_projects():
     return projects
 
 def get_bunny_videos():
-    # On récupère tout (jusqu'à 1000 vidéos)
-    url = f"https://video.bunnycdn.com/library/{LIB_ID}/videos?itemsPerPage=1000"
-    headers = {"AccessKey": API_KEY}
-    resp = requests.get(url, headers=headers)
-    if resp.status_code != 200:
-        print(f"❌ Erreur API Bunny: {resp.status_code}")
+    # Index local : seules les vidéos plus récentes que la dernière synchro sont relues
+    index = get_index(client=CLIENT)
+    try:
+        index.sync(full="--full-sync" in sys.argv)
+    except requests.RequestException as e:
+        print(f"❌ Erreur API Bunny: {e}")
         return []
-    return resp.json().get("items", [])
+    return index.all()
 
 def delete_video(guid, title):
-    url = f"https://video.bunnycdn.com/library/{LIB_ID}/videos/{guid}"
-    headers = {"AccessKey": API_KEY}
-    resp = requests.delete(url, headers=headers)
+    resp = CLIENT.delete_video(guid)
     if resp.status_code == 200:
+        get_index(client=CLIENT).remove(guid)
         print(f"✅ Supprimé: {title}")
     else:
         print(f"❌ Erreur suppression {title}: {resp.status_code}")
@@ -95,6 +98,7 @@ def main():
         for guid, title, pid in to_delete:
             delete_video(guid, title)
         print("🧹 Nettoyage terminé.")
+        bunny_client.log_metrics()
     else:
         print("❌ Opération annulée.")
 
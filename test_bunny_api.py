@@ -1,30 +1,26 @@
 #!/usr/bin/env python3
 """Test de l'API Bunny pour voir les vidéos disponibles"""
-import os
-import requests
-from dotenv import load_dotenv
+import sys
+import time
+from pathlib import Path
 
-load_dotenv()
+# Client Bunny partagé (identifiants dans pipeline_v2/config.py / .env)
+sys.path.insert(0, str(Path(__file__).parent / "pipeline_v2"))
+from bunny_client import BunnyClient
 
-library_id = os.getenv("BUNNY_LIBRARY_ID")
-access_key = os.getenv("BUNNY_ACCESS_KEY")
+client = BunnyClient.for_library(is_private=False)
+library_id = client.lib_id
+access_key = client.api_key
 
 print(f"🔍 Test API Bunny Stream")
 print(f"   Library ID: {library_id}")
 print(f"   Access Key: {'*' * 20}{access_key[-8:] if access_key else 'None'}")
 print()
 
-url = f"https://video.bunnycdn.com/library/{library_id}/videos?itemsPerPage=50&orderBy=date"
+t = time.time()
+response = client.request("GET", params={"itemsPerPage": 50, "orderBy": "date"})
 
-response = requests.get(
-    url,
-    headers={
-        "AccessKey": access_key,
-        "accept": "application/json"
-    }
-)
-
-print(f"Status: {response.status_code}")
+print(f"Status: {response.status_code} ({time.time() - t:.2f}s)")
 
 if response.ok:
     data = response.json()
@@ -0,0 +1,19 @@
+"""
+Les modules de pipeline_v2 s'importent à plat (`import config`) : le dossier est ajouté au path.
+La file de jobs de chaque test est une base SQLite neuve dans tmp_path.
+"""
+import sys
+import threading
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "pipeline_v2"))
+
+import config
+import job_queue
+
+@pytest.fixture(autouse=True)
+def queue_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "JOB_QUEUE_DB", tmp_path / "job_queue.sqlite")
+    monkeypatch.setattr(job_queue, "_local", threading.local())  # Connexion du thread vers la nouvelle base
+    return config.JOB_QUEUE_DB
@@ -0,0 +1,19 @@
+import pytest
+import config
+
+pytest.importorskip("requests")  # assets_v2 importe le client Bunny
+import assets_v2
+
+def test_branches_only_cover_their_window(tmp_path):
+    plan = assets_v2.plan(100)
+    _, first = assets_v2.branches("[va]", plan, tmp_path, 0.0, 50.0, idx=0)
+    _, second = assets_v2.branches("[va]", plan, tmp_path, 50.0, None, idx=1)
+    posters = [o for o in first + second if "poster_" in o]
+    assert len(posters) == config.POSTER_COUNT
+    assert ("preview.mp4" in " ".join(first)) != ("preview.mp4" in " ".join(second))
+    assert "thumb_000_" in " ".join(first) and "thumb_001_" in " ".join(second)
+
+def test_plan_preview_fits_short_master():
+    plan = assets_v2.plan(2)
+    assert plan["preview"] == (0.0, 2)
+    assert all(0 < t < 2 for t in plan["posters"])
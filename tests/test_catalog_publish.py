@@ -0,0 +1,47 @@
+import threading
+import pytest
+import config
+
+pytest.importorskip("requests")  # catalog_publish importe le client Bunny
+import bunny_index
+import catalog_publish
+import catalog_store
+
+class _Index:
+    def __init__(self, videos):
+        self.videos = videos
+
+    def sync_if_stale(self):
+        pass
+
+    def all(self):
+        return list(self.videos)
+
+def _video(guid, title):
+    return {"guid": guid, "title": title, "dateUploaded": "2026-01-01T00:00:00"}
+
+@pytest.fixture(autouse=True)
+def catalog_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CATALOG_DB", tmp_path / "catalog.sqlite")
+    monkeypatch.setattr(config, "DB_FILE", tmp_path / "showcase_v2.json")
+    monkeypatch.setattr(catalog_store, "_local", threading.local())
+
+def test_backfill_skips_versioned_pipeline_project(monkeypatch):
+    # Projet "demo_v2" du pipeline : ses vidéos Bunny s'appellent "demo (16x9)" / "demo (9x16)"
+    catalog_store.upsert({"id": "demo_v2", "updated_at": "2026-01-02", "bunny_urls": {
+        "16x9": f"{config.PULL_ZONE_PUBLIC}/guid-a/play_720p.mp4",
+        "9x16": f"{config.PULL_ZONE_PUBLIC}/guid-b/play_720p.mp4",
+    }})
+    public = [_video("guid-a", "demo (16x9)"), _video("guid-b", "demo (9x16)"), _video("guid-c", "manual (1x1)")]
+    monkeypatch.setattr(bunny_index, "get_index", lambda is_private: _Index([] if is_private else public))
+
+    assert catalog_publish.backfill() == 1
+    ids = {p["id"] for p in catalog_store.all_projects()}
+    assert ids == {"demo_v2", "manual"}
+    assert catalog_store.get("manual")["source"] == "bunny"
+
+def test_backfill_removes_entries_gone_from_bunny(monkeypatch):
+    catalog_store.upsert({"id": "old", "source": "bunny", "bunny_urls": {"16x9": "https://x/guid-z/play_720p.mp4"}})
+    monkeypatch.setattr(bunny_index, "get_index", lambda is_private: _Index([]))
+    catalog_publish.backfill()
+    assert catalog_store.get("old") is None
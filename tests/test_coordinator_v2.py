@@ -0,0 +1,42 @@
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import pytest
+import config
+
+pytest.importorskip("requests")  # coordinator_v2 importe le client HTTP des nodes
+import coordinator_v2
+
+def _status(server, token=None):
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}/status")
+    if token is not None:
+        request.add_header(coordinator_v2.TOKEN_HEADER, token)
+    try:
+        return urllib.request.urlopen(request, timeout=5).status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def test_token_required_when_configured(monkeypatch):
+    monkeypatch.setattr(config, "COORDINATOR_TOKEN", "secret")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), coordinator_v2._Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert _status(server) == 403
+        assert _status(server, "") == 403
+        assert _status(server, "wrong") == 403
+        assert _status(server, "secret") == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_no_token_refuses_network_bind(monkeypatch):
+    monkeypatch.setattr(config, "COORDINATOR_TOKEN", "")
+    monkeypatch.setattr(config, "COORDINATOR_ADDRESS", ("0.0.0.0", 0))
+    monkeypatch.setattr(coordinator_v2, "setup_logging", lambda *a: None)
+    assert coordinator_v2.serve() == 1
+
+def test_loopback_addresses():
+    assert coordinator_v2.is_loopback("127.0.0.1") and coordinator_v2.is_loopback("::1")
+    assert coordinator_v2.is_loopback("localhost")
+    assert not coordinator_v2.is_loopback("0.0.0.0") and not coordinator_v2.is_loopback("192.168.1.20")
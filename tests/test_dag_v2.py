@@ -0,0 +1,46 @@
+import dag_v2
+
+def _job(tmp_path, fps=None):
+    master = tmp_path / "master.mov"
+    if not master.exists():
+        master.write_bytes(b"x" * 4096)
+    return {"status": {"master": dag_v2.master_fingerprint(master)}, "stage_fps": fps or {}}
+
+def test_master_fingerprint_reuses_cached_hash(tmp_path):
+    master = tmp_path / "master.mov"
+    master.write_bytes(b"x" * 4096)
+    first = dag_v2.master_fingerprint(master)
+    assert dag_v2.master_fingerprint(master, {**first, "hash": "cached"})["hash"] == "cached"
+    master.write_bytes(b"y" * 8192)
+    assert dag_v2.master_fingerprint(master, first)["hash"] != first["hash"]
+
+def test_stage_fingerprint_follows_upstream_and_config(tmp_path):
+    job = _job(tmp_path, {"audio": "a1"})
+    base = dag_v2.stage_fingerprint(job, "captions", ["audio"], {"model": "small"})
+    assert base == dag_v2.stage_fingerprint(job, "captions", ["audio"], {"model": "small"})
+    assert base != dag_v2.stage_fingerprint(job, "captions", ["audio"], {"model": "medium"})
+    job["stage_fps"]["audio"] = "a2"
+    assert base != dag_v2.stage_fingerprint(job, "captions", ["audio"], {"model": "small"})
+
+def test_record_then_restore(tmp_path):
+    job = _job(tmp_path)
+    out = tmp_path / "audio.wav"
+    out.write_bytes(b"")
+    job.update({"audio_path": out, "lufs": -16})
+    assert dag_v2.record(job, "audio", "fp1", ["audio_path", "lufs"])
+
+    fresh = {"status": job["status"]}
+    assert not dag_v2.restore(fresh, "audio", "fp2", ["audio_path", "lufs"], {"audio_path"})
+    assert dag_v2.restore(fresh, "audio", "fp1", ["audio_path", "lufs"], {"audio_path"})
+    assert fresh["audio_path"] == out and fresh["lufs"] == -16
+
+    # Sortie disparue : l'étape est relancée
+    out.unlink()
+    assert not dag_v2.restore({"status": job["status"]}, "audio", "fp1", ["audio_path", "lufs"], {"audio_path"})
+
+def test_record_skips_missing_output(tmp_path):
+    job = _job(tmp_path)
+    job["status"]["stages"] = {"audio": {"fingerprint": "old"}}
+    job["audio_path"] = None
+    assert not dag_v2.record(job, "audio", "fp1", ["audio_path"])
+    assert "audio" not in job["status"]["stages"]
@@ -0,0 +1,90 @@
+import time
+import job_queue
+
+def _master(tmp_path, name):
+    prod_dir = tmp_path / "prod" / name
+    prod_dir.mkdir(parents=True)
+    video = prod_dir / "master.mov"
+    video.write_bytes(b"\0" * 1024)
+    return prod_dir, video
+
+def test_claim_serves_priority_then_age(tmp_path):
+    job_queue.enqueue(*_master(tmp_path, "public"), is_private=False)
+    job_queue.enqueue(*_master(tmp_path, "private"), is_private=True)
+    rows = job_queue.claim(2, worker="w1")
+    assert [r["project_id"] for r in rows] == ["private", "public"]
+    assert all(r["state"] == "running" and r["attempts"] == 1 and r["worker"] == "w1" for r in rows)
+    assert job_queue.claim(1) == []
+
+def test_claim_defaults_to_local_worker(tmp_path):
+    job_queue.enqueue(*_master(tmp_path, "demo"), is_private=False)
+    (row,) = job_queue.claim()
+    assert row["worker"] == job_queue.local_worker()
+    assert row["lease_until"] is None
+    assert job_queue.worker_alive(row) is True
+
+def test_enqueue_ignores_active_project(tmp_path):
+    prod_dir, video = _master(tmp_path, "demo")
+    assert job_queue.enqueue(prod_dir, video, False)
+    assert not job_queue.enqueue(prod_dir, video, False)
+    job_queue.claim(worker="w1")
+    assert not job_queue.enqueue(prod_dir, video, False)
+
+def test_mark_failed_retries_then_gives_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue.config, "QUEUE_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(job_queue.config, "QUEUE_RETRY_DELAY", 0)
+    prod_dir, video = _master(tmp_path, "demo")
+    job_queue.enqueue(prod_dir, video, False)
+    job_queue.claim()
+    assert job_queue.mark_failed("demo", "first") == "queued"
+    job_queue.claim()
+    assert job_queue.mark_failed("demo", "second") == "failed"
+    assert job_queue.is_blocked("demo", video)
+
+def test_recover_requeues_interrupted_jobs(tmp_path):
+    job_queue.enqueue(*_master(tmp_path, "demo"), is_private=False)
+    job_queue.claim()
+    assert job_queue.recover() == 1
+    job = job_queue.get("demo")
+    assert job["state"] == "queued" and job["attempts"] == 1
+
+def test_heartbeat_rejects_other_worker(tmp_path):
+    job_queue.enqueue(*_master(tmp_path, "demo"), is_private=False)
+    job_queue.claim(worker="w1", lease_s=60)
+    assert not job_queue.heartbeat("demo", "w2")
+    assert job_queue.heartbeat("demo", "w1", stage="encode")
+    assert job_queue.get("demo")["stage"] == "encode"
+
+def test_expired_lease_is_requeued_and_late_result_ignored(tmp_path):
+    job_queue.enqueue(*_master(tmp_path, "demo"), is_private=False)
+    job_queue.claim(worker="w1", lease_s=0.01)
+    time.sleep(0.02)
+    assert job_queue.worker_alive(job_queue.get("demo")) is False
+    assert job_queue.expire_leases() == ["demo"]
+
+    job = job_queue.get("demo")
+    assert job["state"] == "queued" and job["worker"] is None and job["last_error"] == "lease expired"
+    # Le worker d'origine revient trop tard : ni heartbeat ni résultat
+    assert not job_queue.heartbeat("demo", "w1")
+    assert not job_queue.mark_done("demo", worker="w1")
+    assert job_queue.mark_failed("demo", "boom", worker="w1") is None
+
+    (again,) = job_queue.claim(worker="w2", lease_s=60)
+    assert again["attempts"] == 2
+    assert job_queue.mark_done("demo", worker="w2")
+    assert job_queue.get("demo")["state"] == "done"
+
+def test_recover_leaves_leased_jobs_to_expire_leases(tmp_path):
+    job_queue.enqueue(*_master(tmp_path, "local"), is_private=False)
+    job_queue.enqueue(*_master(tmp_path, "remote"), is_private=False)
+    job_queue.claim(1)
+    job_queue.claim(1, worker="node-1", lease_s=60)
+    assert job_queue.recover() == 1
+    assert job_queue.get("remote")["state"] == "running"
+    # retry_stuck.py : les projets nommés repartent, bail ou pas
+    assert job_queue.recover(["remote"]) == 1
+    assert job_queue.counts()["queued"] == 2
+
+def test_worker_alive_unknown_for_remote_worker_without_lease():
+    assert job_queue.worker_alive({"lease_until": None, "worker": "other-host.invalid-123"}) is None
+    assert job_queue.worker_alive({"lease_until": None, "worker": None}) is None
@@ -0,0 +1,54 @@
+import pytest
+import config
+
+requests = pytest.importorskip("requests")  # uploader_v2 parle TUS via le client Bunny
+import bunny_client
+import uploader_v2
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+class _Session:
+    def __init__(self):
+        self.patched = []
+
+    def patch(self, url, headers=None, data=None, timeout=None):
+        self.patched.append(url)
+        if url.endswith("/expired"):
+            return _Response(410)
+        return _Response(204, {"Upload-Offset": str(int(headers["Upload-Offset"]) + len(data))})
+
+def test_expired_upload_is_restarted(tmp_path, monkeypatch):
+    master = tmp_path / "master_16x9.mp4"
+    master.write_bytes(b"x" * 1000)
+    session = _Session()
+    created = []
+
+    def request(method, url=None, headers=None, **kwargs):
+        assert method == "POST"
+        created.append(headers["Upload-Length"])
+        return _Response(201, {"Location": "/tus/fresh"})
+
+    monkeypatch.setattr(bunny_client, "session", lambda: session)
+    monkeypatch.setattr(bunny_client, "request", request)
+    monkeypatch.setattr(config, "UPLOAD_CHUNK_SIZE", 400)
+    monkeypatch.setattr(config, "UPLOAD_MAX_RETRIES", 3)
+
+    stat = master.stat()
+    state = {
+        "lib_id": "1", "guid": "g", "size": stat.st_size, "mtime": int(stat.st_mtime), "concat": False,
+        "parts": [{"url": "https://video.bunnycdn.com/tus/expired", "start": 0, "length": 1000, "offset": 400}],
+    }
+    saves = []
+    assert uploader_v2.upload_file(master, "1", "key", "g", title="demo", state=state, save_state=lambda: saves.append(1))
+
+    assert created == ["1000"]
+    assert state["done"] and state["parts"][0]["url"].endswith("/tus/fresh")
+    assert state["parts"][0]["offset"] == 1000
+    assert session.patched[0].endswith("/expired") and all(u.endswith("/fresh") for u in session.patched[1:])
@@ -0,0 +1,23 @@
+import pytest
+import vad_v2
+
+def test_speech_regions_merges_short_pauses_and_pads():
+    frame_ms = 100
+    # 1 s de parole, 0.2 s de pause (comblée), 1 s de parole, 3 s de silence, un bruit de 0.1 s (ignoré)
+    levels = [-20] * 10 + [-60] * 2 + [-20] * 10 + [-60] * 30 + [-20] + [-60] * 10
+    assert vad_v2.speech_regions(levels, frame_ms) == [(0.0, pytest.approx(2.4))]
+
+def test_quietest_cut_in_last_quarter():
+    levels = [-20] * 100
+    levels[80] = -70
+    levels[10] = -90  # Hors du dernier quart : ignoré
+    assert vad_v2._quietest_cut(levels, 0.0, 10.0, 0.1) == pytest.approx(8.0)
+
+def test_speech_chunks_split_long_speech():
+    np = pytest.importorskip("numpy")
+    t = np.arange(vad_v2.SAMPLE_RATE * 70) / vad_v2.SAMPLE_RATE
+    pcm = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16).tobytes()
+    chunks = vad_v2.speech_chunks(pcm, max_chunk=30)
+    assert chunks[0][0] == 0.0 and chunks[-1][1] == pytest.approx(70.0)
+    assert all(e - s <= 30 for s, e in chunks)
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
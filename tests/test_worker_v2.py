@@ -0,0 +1,17 @@
+import pytest
+import config
+
+pytest.importorskip("requests")  # worker_v2 importe le client Bunny
+import probe_v2
+import worker_v2
+
+def test_plan_chunks_cut_on_keyframes_relative_to_start(monkeypatch):
+    monkeypatch.setattr(config, "ENCODE_CHUNKS", 4)
+    monkeypatch.setattr(config, "ENCODE_CHUNK_MIN_SECONDS", 10)
+    monkeypatch.setattr(probe_v2, "probe", lambda path: {"start_time": 10.0})
+    monkeypatch.setattr(probe_v2, "keyframes", lambda path: [10.0 + 2 * i for i in range(60)])
+    assert worker_v2.plan_chunks("master.mov", 120) == [(0.0, 30.0), (30.0, 60.0), (60.0, 90.0), (90.0, None)]
+
+def test_plan_chunks_single_for_short_master(monkeypatch):
+    monkeypatch.setattr(config, "ENCODE_CHUNK_MIN_SECONDS", 600)
+    assert worker_v2.plan_chunks("master.mov", 120) == [(0.0, None)]
@@ -4,39 +4,41 @@ Script pour uploader les formats existants vers Bunny Stream
 sans avoir à retraiter les vidéos.
 """
 import json
+import sys
 import time
-import requests
 from pathlib import Path
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
+# Upload TUS résumable partagé avec le pipeline V2
+sys.path.insert(0, str(Path(__file__).parent / "pipeline_v2"))
+import config as pipeline_config
+import uploader_v2
+from bunny_client import BunnyClient
 
 def log_event(f, p):
     import datetime
     p["timestamp"] = datetime.datetime.utcnow().isoformat() + "Z"
     with f.open("a") as fh: fh.write(json.dumps(p) + "\n")
 
-def bunny_stream_upload(file_path, stream_cfg, log, title=None):
-    """Upload vers Bunny Stream"""
+def bunny_stream_upload(file_path, stream_cfg, log, title=None, state=None, save_state=None):
+    """Upload vers Bunny Stream (TUS résumable : `state` garde la progression entre deux lancements)"""
     if not stream_cfg: return None
+    state = {} if state is None else state
     try:
-        headers = {"AccessKey": stream_cfg["access_key"], "Content-Type": "application/json"}
-        # 1. Créer l'entrée vidéo
+        client = BunnyClient(stream_cfg["library_id"], stream_cfg["access_key"])
         video_title = title if title else file_path.name
-        create_url = f"https://video.bunnycdn.com/library/{stream_cfg['library_id']}/videos"
-        resp = requests.post(create_url, headers=headers, json={"title": video_title})
-        resp.raise_for_status()
-        video_id = resp.json()["guid"]
+
+        # 1. Créer l'entrée vidéo (sauf reprise d'un upload interrompu)
+        video_id = state.get("guid")
+        if not video_id:
+            video_id = client.create_video(video_title)["guid"]
 
         # 2. Upload du fichier
-        upload_url = f"https://video.bunnycdn.com/library/{stream_cfg['library_id']}/videos/{video_id}"
-        with open(file_path, "rb") as f:
-            t = time.time()
-            resp = requests.put(upload_url, headers={"AccessKey": stream_cfg["access_key"]}, data=f)
-            resp.raise_for_status()
-            dur = round(time.time() - t, 2)
-            log_event(log, {"step": "bunny_stream_upload", "video_id": video_id, "title": video_title, "status": "ok", "dur": dur})
+        t = time.time()
+        if not uploader_v2.upload_file(file_path, stream_cfg["library_id"], stream_cfg["access_key"], video_id,
+                                       title=video_title, state=state, save_state=save_state):
+            raise RuntimeError("TUS upload failed")
+        dur = round(time.time() - t, 2)
+        log_event(log, {"step": "bunny_stream_upload", "video_id": video_id, "title": video_title, "status": "ok", "dur": dur})
 
         # Retourne l'URL de lecture
         return f"https://iframe.mediadelivery.net/play/{stream_cfg['library_id']}/{video_id}"
@@ -68,10 +70,11 @@ def upload_project_formats(project_folder):
     
     # Préparer la config Bunny Stream
     stream_cfg = config.get("bunny_stream", {})
-    if os.getenv("BUNNY_LIBRARY_ID"):
-        stream_cfg["library_id"] = os.getenv("BUNNY_LIBRARY_ID")
-    if os.getenv("BUNNY_ACCESS_KEY"):
-        stream_cfg["access_key"] = os.getenv("BUNNY_ACCESS_KEY")
+    # Librairie du projet si elle est configurée, sinon identifiants centralisés (pipeline_v2/config.py, surchargés par .env)
+    if not stream_cfg.get("library_id"):
+        stream_cfg["library_id"] = pipeline_config.LIB_PUBLIC
+    if not stream_cfg.get("access_key"):
+        stream_cfg["access_key"] = pipeline_config.API_KEY_PUBLIC
     
     if not stream_cfg.get("library_id") or not stream_cfg.get("access_key"):
         print(f"❌ Config Bunny Stream manquante pour {project.name}")
@@ -100,6 +103,11 @@ def upload_project_formats(project_folder):
     # Initialiser bunny_urls dans le status
     if "bunny_urls" not in status:
         status["bunny_urls"] = {}
+    uploads = status.setdefault("uploads", {})
+
+    def save_status():
+        with open(status_file, "w") as f:
+            json.dump(status, f, indent=2)
     
     # Upload chaque format
     for format_file in format_files:
@@ -115,7 +123,8 @@ def upload_project_formats(project_folder):
         
         # Upload vers Bunny Stream
         title = f"{project_id} ({format_name})"
-        url = bunny_stream_upload(format_file, stream_cfg, log_file, title=title)
+        url = bunny_stream_upload(format_file, stream_cfg, log_file, title=title,
+                                  state=uploads.setdefault(format_name, {}), save_state=save_status)
         
         if url:
             status["bunny_urls"][format_name] = url
@@ -124,8 +133,7 @@ def upload_project_formats(project_folder):
             print(f"❌ Échec")
     
     # Sauvegarder le status mis à jour
-    with open(status_file, "w") as f:
-        json.dump(status, f, indent=2)
+    save_status()
     
     print(f"   💾 Status sauvegardé")
     
@@ -166,7 +174,7 @@ def main():
     
     print(f"🚀 Upload des formats vers Bunny Stream")
     print(f"   Projets trouvés: {len(projects)}")
-    print(f"   Library ID: {os.getenv('BUNNY_LIBRARY_ID')}")
+    print(f"   Library ID: {pipeline_config.LIB_PUBLIC}")
     
     for project in projects:
         try: